@@ -4,9 +4,32 @@ import os
 from datetime import datetime, timedelta
 import time
 
+LOG_DIR = 'data/logs'
+STATS_DIR = 'data/stats'
+QUOTES_DIR = 'data/quotes'
+
+# Append-only store of every stats update; the files below are rollups of it,
+# updated incrementally so a run never rereads the history
+EVENTS_FILE = os.path.join(STATS_DIR, 'events.log')
+STATS_FILE = os.path.join(STATS_DIR, 'repository_stats.json')  # last STATS_DAYS days
+TOTALS_FILE = os.path.join(STATS_DIR, 'totals.json')            # all-time aggregates
+STATS_DAYS = 30
+DAY_METRICS = ('lines_added', 'lines_removed', 'files_changed')
+
+# Dates of the existing activity logs, oldest first, so cleanup needs no directory scan
+LOG_INDEX_FILE = os.path.join(LOG_DIR, 'index.json')
+
+QUOTES_FILE = os.path.join(QUOTES_DIR, 'daily_quotes.txt')
+# Quote -> when it was last used, so picking one needs no reread of daily_quotes.txt
+QUOTE_INDEX_FILE = os.path.join(QUOTES_DIR, 'quote_index.json')
+
+# Events older than the stats window are folded into one base record once the
+# events file has doubled since the last compaction
+COMPACT_MIN_BYTES = 64 * 1024
+
 def ensure_directories():
     """Create necessary directories for storing activity data"""
-    directories = ['data', 'data/logs', 'data/stats', 'data/quotes']
+    directories = ['data', LOG_DIR, STATS_DIR, QUOTES_DIR]
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
 
@@ -19,7 +42,7 @@ def load_config():
         'config/activity_config.json',          # From root directory
         '.github/config/activity_config.json'   # From root directory
     ]
-    
+
     for config_path in possible_paths:
         try:
             with open(config_path, 'r') as f:
@@ -29,19 +52,34 @@ def load_config():
         except json.JSONDecodeError:
             print(f"Invalid JSON in config file: {config_path}")
             continue
-    
+
     print(f"Config file not found in any of these locations: {possible_paths}")
     return {}
 
-def update_daily_log():
+def read_json(path, default):
+    """Load a JSON file, or return default if it is missing or unreadable"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def write_json(path, data):
+    """Replace a JSON file atomically, so an interrupted run never leaves it half written"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def update_daily_log(now=None):
     """Update daily activity log with current timestamp and random activity"""
-    log_dir = 'data/logs'
-    today = datetime.now().strftime('%Y-%m-%d')
-    log_file = os.path.join(log_dir, f'activity_{today}.log')
-    
+    now = now or datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    log_file = os.path.join(LOG_DIR, f'activity_{today}.log')
+
     activities = [
         "Code review and optimization",
-        "Bug fixes and improvements", 
+        "Bug fixes and improvements",
         "Documentation updates",
         "Performance enhancements",
         "Feature implementation",
@@ -51,59 +89,164 @@ def update_daily_log():
         "Dependency management",
         "Build system improvements"
     ]
-    
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
     activity = random.choice(activities)
-    
+
     log_entry = f"[{timestamp}] {activity}\n"
-    
+
+    is_new = not os.path.exists(log_file)
     with open(log_file, 'a') as f:
         f.write(log_entry)
-    
+    if is_new:
+        index = load_log_index()
+        if not index or index[-1] < today:
+            index.append(today)
+        elif today not in index:
+            index = sorted(index + [today])
+        write_json(LOG_INDEX_FILE, index)
+
     print(f"Updated daily log: {activity}")
 
-def update_stats():
+def apply_event(stats, totals, event):
+    """Fold one stats event into the daily stats and the totals"""
+    day = event['date']
+    previous = stats.get(day, {})
+    if not previous:
+        totals['days'] = totals.get('days', 0) + 1
+        totals.setdefault('first_day', day)
+    # A day's metrics are those of its latest update; totals follow by the difference
+    for metric in DAY_METRICS:
+        totals[metric] = totals.get(metric, 0) + event[metric] - previous.get(metric, 0)
+    totals['commits'] = totals.get('commits', 0) + 1
+    totals['events'] = totals.get('events', 0) + 1
+    totals['last_day'] = max(totals.get('last_day', day), day)
+    stats[day] = {
+        'commits': previous.get('commits', 0) + 1,
+        **{metric: event[metric] for metric in DAY_METRICS},
+        'last_updated': event['ts'],
+    }
+
+def prune_stats(stats, now):
+    """Keep only last STATS_DAYS days of stats"""
+    cutoff_date = (now - timedelta(days=STATS_DAYS)).strftime('%Y-%m-%d')
+    return {k: v for k, v in stats.items() if k >= cutoff_date}
+
+def rebuild_rollups(now=None):
+    """Recompute the daily stats and totals from the events file in one pass"""
+    now = now or datetime.now()
+    stats, totals = {}, {}
+    if os.path.exists(EVENTS_FILE):
+        with open(EVENTS_FILE, 'r') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut off by an interrupted run
+                if event.get('type') == 'base':
+                    totals = dict(event['totals'])
+                    stats = dict(event['stats'])
+                else:
+                    apply_event(stats, totals, event)
+    stats = prune_stats(stats, now)
+    totals['compacted_bytes'] = os.path.getsize(EVENTS_FILE) if os.path.exists(EVENTS_FILE) else 0
+    write_json(STATS_FILE, stats)
+    write_json(TOTALS_FILE, totals)
+    return stats, totals
+
+def load_rollups(now):
+    """The daily stats and totals; rebuilt from the events if either is missing or unreadable"""
+    stats = read_json(STATS_FILE, None)
+    totals = read_json(TOTALS_FILE, None)
+    if stats is not None and totals is not None:
+        return stats, totals
+    if stats and not os.path.exists(EVENTS_FILE):
+        # Stats written before the events file existed: they become its base record
+        totals = {}
+        for day in sorted(stats):
+            for metric in DAY_METRICS:
+                totals[metric] = totals.get(metric, 0) + stats[day].get(metric, 0)
+            totals['commits'] = totals.get('commits', 0) + stats[day].get('commits', 0)
+            totals['days'] = totals.get('days', 0) + 1
+            totals.setdefault('first_day', day)
+            totals['last_day'] = day
+        totals['events'] = totals['commits']
+        base = {'type': 'base', 'totals': totals, 'stats': stats}
+        with open(EVENTS_FILE, 'w') as f:
+            f.write(json.dumps(base, separators=(',', ':')) + '\n')
+    return rebuild_rollups(now)
+
+def compact_events(totals, now):
+    """Fold events older than the stats window into a single base record, in one pass over the file"""
+    cutoff_date = (now - timedelta(days=STATS_DAYS)).strftime('%Y-%m-%d')
+    base_stats, base_totals = {}, {}
+    tmp_path = EVENTS_FILE + '.tmp'
+    with open(EVENTS_FILE, 'r') as src, open(tmp_path + '.recent', 'w') as recent:
+        for line in src:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get('type') == 'base':
+                base_stats, base_totals = dict(event['stats']), dict(event['totals'])
+            elif event['date'] < cutoff_date:
+                apply_event(base_stats, base_totals, event)
+            else:
+                recent.write(line)
+    base = {'type': 'base', 'totals': base_totals, 'stats': prune_stats(base_stats, now)}
+    with open(tmp_path, 'w') as dst, open(tmp_path + '.recent', 'r') as recent:
+        dst.write(json.dumps(base, separators=(',', ':')) + '\n')
+        for line in recent:
+            dst.write(line)
+    os.remove(tmp_path + '.recent')
+    os.replace(tmp_path, EVENTS_FILE)
+    totals['compacted_bytes'] = os.path.getsize(EVENTS_FILE)
+
+def update_stats(now=None):
     """Update statistics file with random metrics"""
-    stats_dir = 'data/stats'
-    stats_file = os.path.join(stats_dir, 'repository_stats.json')
-    
-    # Load existing stats or create new ones
-    if os.path.exists(stats_file):
-        try:
-            with open(stats_file, 'r') as f:
-                stats = json.load(f)
-        except:
-            stats = {}
-    else:
-        stats = {}
-    
-    # Update random metrics
-    today = datetime.now().strftime('%Y-%m-%d')
-    if today not in stats:
-        stats[today] = {}
-    
-    stats[today].update({
-        'commits': stats[today].get('commits', 0) + 1,
+    now = now or datetime.now()
+    event = {
+        'date': now.strftime('%Y-%m-%d'),
+        'ts': now.isoformat(),
         'lines_added': random.randint(5, 50),
         'lines_removed': random.randint(1, 20),
         'files_changed': random.randint(1, 5),
-        'last_updated': datetime.now().isoformat()
-    })
-    
-    # Keep only last 30 days of stats
-    cutoff_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-    stats = {k: v for k, v in stats.items() if k >= cutoff_date}
-    
-    with open(stats_file, 'w') as f:
-        json.dump(stats, f, indent=2)
-    
-    print(f"Updated stats: {stats[today]['commits']} commits today")
-
-def update_quote_file():
+    }
+
+    stats, totals = load_rollups(now)
+
+    with open(EVENTS_FILE, 'a') as f:
+        f.write(json.dumps(event, separators=(',', ':')) + '\n')
+    apply_event(stats, totals, event)
+    stats = prune_stats(stats, now)
+
+    size = os.path.getsize(EVENTS_FILE)
+    if size >= COMPACT_MIN_BYTES and size >= 2 * totals.get('compacted_bytes', 0):
+        compact_events(totals, now)
+
+    write_json(STATS_FILE, stats)
+    write_json(TOTALS_FILE, totals)
+
+    print(f"Updated stats: {stats[event['date']]['commits']} commits today, {totals['commits']} in total")
+
+def load_quote_index():
+    """Quote -> last time it was used; built from daily_quotes.txt the first time"""
+    index = read_json(QUOTE_INDEX_FILE, None)
+    if index is not None:
+        return index
+    index = {}
+    if os.path.exists(QUOTES_FILE):
+        with open(QUOTES_FILE, 'r') as f:
+            for line in f:
+                if line.startswith('[') and '] ' in line:
+                    timestamp, quote = line[1:].rstrip('\n').split('] ', 1)
+                    index[quote] = max(index.get(quote, ''), timestamp)
+    return index
+
+def update_quote_file(now=None):
     """Update quote file with random inspirational quotes"""
-    quotes_dir = 'data/quotes'
-    quotes_file = os.path.join(quotes_dir, 'daily_quotes.txt')
-    
+    now = now or datetime.now()
+
     quotes = [
         "The best way to predict the future is to implement it. - Alan Kay",
         "Code is like humor. When you have to explain it, it's bad. - Cory House",
@@ -121,60 +264,72 @@ def update_quote_file():
         "Simplicity is the ultimate sophistication. - Leonardo da Vinci",
         "The only constant in the technology industry is change. - Marc Benioff"
     ]
-    
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    quote = random.choice(quotes)
-    
+
+    timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+    # No repeats of recent quotes: pick among the third used longest ago (or never)
+    index = load_quote_index()
+    least_recent = sorted(quotes, key=lambda q: index.get(q, ''))[:max(1, len(quotes) // 3)]
+    quote = random.choice(least_recent)
+
     quote_entry = f"[{timestamp}] {quote}\n"
-    
-    with open(quotes_file, 'a') as f:
+
+    with open(QUOTES_FILE, 'a') as f:
         f.write(quote_entry)
-    
+    index[quote] = timestamp
+    write_json(QUOTE_INDEX_FILE, index)
+
     print(f"Updated quotes: {quote.split(' - ')[0]}")
 
+def load_log_index():
+    """Dates of the activity logs, oldest first; built from the directory the first time"""
+    index = read_json(LOG_INDEX_FILE, None)
+    if index is not None:
+        return index
+    dates = []
+    if os.path.exists(LOG_DIR):
+        for filename in os.listdir(LOG_DIR):
+            if filename.startswith('activity_') and filename.endswith('.log'):
+                date_str = filename.replace('activity_', '').replace('.log', '')
+                try:
+                    datetime.strptime(date_str, '%Y-%m-%d')
+                except ValueError:
+                    continue
+                dates.append(date_str)
+    return sorted(dates)
+
 def cleanup_old_logs(config):
     """Clean up old log entries based on configuration"""
     maintenance = config.get('maintenance', {})
     if not maintenance.get('cleanup_old_logs', True):
         return
-    
+
     max_entries = maintenance.get('max_log_entries', 365)
-    log_dir = 'data/logs'
-    
-    if not os.path.exists(log_dir):
+
+    if not os.path.exists(LOG_DIR):
+        return
+
+    index = load_log_index()
+    if len(index) <= max_entries and os.path.exists(LOG_INDEX_FILE):
         return
-    
-    # Get all log files and sort by date
-    log_files = []
-    for filename in os.listdir(log_dir):
-        if filename.startswith('activity_') and filename.endswith('.log'):
-            try:
-                date_str = filename.replace('activity_', '').replace('.log', '')
-                date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                log_files.append((date_obj, filename))
-            except:
-                continue
-    
-    log_files.sort(reverse=True)  # Newest first
-    
-    # Remove old files beyond max_entries
-    if len(log_files) > max_entries:
-        for _, filename in log_files[max_entries:]:
-            filepath = os.path.join(log_dir, filename)
-            try:
-                os.remove(filepath)
-                print(f"Cleaned up old log: {filename}")
-            except:
-                pass
+
+    # Remove the oldest files beyond max_entries
+    for date_str in index[:max(0, len(index) - max_entries)]:
+        filename = f'activity_{date_str}.log'
+        try:
+            os.remove(os.path.join(LOG_DIR, filename))
+            print(f"Cleaned up old log: {filename}")
+        except OSError:
+            pass
+    write_json(LOG_INDEX_FILE, index[-max_entries:] if max_entries > 0 else [])
 
 def main():
     ensure_directories()
     config = load_config()
-    
+
     if not config.get("enabled", True):
         print("Auto-commit activity is disabled in config.")
         return
-    
+
     # Random chance to skip this run (to achieve 4-26 commits from 12 scheduled runs)
     # This gives us roughly 30-70% execution rate = 3.6-8.4 commits per day
     # With max_changes_per_run = 3, we can reach 26 commits on active days
@@ -182,14 +337,14 @@ def main():
     if skip_chance < 0.40:  # 40% chance to skip
         print("Randomly skipping this run to maintain natural variance.")
         return
-    
+
     update_types = config.get("update_types", ["log", "stats", "quote"])
     max_changes = config.get("max_changes_per_run", 3)  # Reduced for more realistic commits
-    
+
     # Randomly select which updates to perform (but at least one)
-    selected_updates = random.sample(update_types, 
+    selected_updates = random.sample(update_types,
                                    min(random.randint(1, max_changes), len(update_types)))
-    
+
     for update_type in selected_updates:
         if update_type == "log":
             update_daily_log()
@@ -197,11 +352,11 @@ def main():
             update_stats()
         elif update_type == "quote":
             update_quote_file()
-    
+
     # Cleanup old logs
     cleanup_old_logs(config)
-    
+
     print(f"Activity update completed. Performed: {', '.join(selected_updates)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
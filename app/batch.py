@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import base64
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Set
+
+from app.models import run_mcq_model, run_mcq_with_ocr, set_generation_concurrency
+from app.threads import WORKERS_ENV, pin_current_thread
+from app.ocr import image_to_text_lines, parse_mcq_from_lines, preprocess_remove_watermark
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+class BatchItem(NamedTuple):
+	item_id: str
+	image_path: Optional[str] = None
+	question: Optional[str] = None
+	options: Optional[List[str]] = None
+
+
+def load_items(source: str) -> List[BatchItem]:
+	"""A folder of screenshots, or a CSV with a question column and option columns A, B, C, ..."""
+	if os.path.isdir(source):
+		items = []
+		for root, _dirs, files in os.walk(source):
+			for name in sorted(files):
+				if name.lower().endswith(IMAGE_EXTENSIONS):
+					path = os.path.join(root, name)
+					items.append(BatchItem(os.path.relpath(path, source), image_path=path))
+		return sorted(items)
+	items = []
+	with open(source, newline="", encoding="utf-8") as f:
+		for n, row in enumerate(csv.DictReader(f), start=1):
+			options = [row[c] for c in "ABCDEFGH" if row.get(c, "").strip()]
+			items.append(BatchItem(row.get("id") or f"row-{n}", question=row["question"], options=options))
+	return items
+
+
+def load_checkpoint(out_path: str) -> Set[str]:
+	"""Ids already solved in a previous run; failed items are retried"""
+	done: Set[str] = set()
+	if not os.path.exists(out_path):
+		return done
+	with open(out_path, encoding="utf-8") as f:
+		for line in f:
+			try:
+				record = json.loads(line)
+			except json.JSONDecodeError:
+				continue  # a line cut off by the interruption
+			if "error" not in record:
+				done.add(record["id"])
+	return done
+
+
+def ocr_file(path: str, remove_watermark: bool) -> List[str]:
+	"""Runs in an OCR worker process; each process loads its own PaddleOCR once"""
+	with open(path, "rb") as f:
+		image_b64 = base64.b64encode(f.read()).decode("utf-8")
+	if remove_watermark:
+		try:
+			image_b64 = preprocess_remove_watermark(image_b64)
+		except Exception:
+			pass
+	return image_to_text_lines(image_b64)
+
+
+async def run_batch(items: List[BatchItem], out_path: str, ocr_processes: int, concurrency: int,
+					remove_watermark: bool) -> None:
+	done = load_checkpoint(out_path)
+	todo = [item for item in items if item.item_id not in done]
+	print(f"{len(items)} items, {len(items) - len(todo)} already done, {len(todo)} to solve")
+	set_generation_concurrency(concurrency)
+	loop = asyncio.get_running_loop()
+	# OCR results wait here for a free model slot; the bound keeps OCR only
+	# slightly ahead of generation instead of OCRing the whole folder first
+	parsed: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+	ocr_slots = asyncio.Semaphore(ocr_processes * 2)
+	counts = {"solved": 0, "failed": 0}
+	started = time.monotonic()
+	# OCR processes split the cores between them (app/threads.py reads this in each one)
+	os.environ[WORKERS_ENV] = str(ocr_processes)
+	pool = None
+	if any(i.image_path for i in todo):
+		pool = ProcessPoolExecutor(ocr_processes, initializer=pin_current_thread)
+
+	async def ocr_one(item: BatchItem) -> None:
+		if item.image_path is None:
+			await parsed.put((item, item.question, item.options, None))
+			return
+		async with ocr_slots:
+			try:
+				lines = await loop.run_in_executor(pool, ocr_file, item.image_path, remove_watermark)
+				question, options = parse_mcq_from_lines(lines)
+				await parsed.put((item, question, options, None))
+			except Exception as e:
+				await parsed.put((item, None, None, e))
+
+	async def ocr_stage() -> None:
+		await asyncio.gather(*(ocr_one(item) for item in todo))
+		for _ in range(concurrency):
+			await parsed.put(None)
+
+	async def generation_worker(out) -> None:
+		while True:
+			entry = await parsed.get()
+			if entry is None:
+				return
+			item, question, options, error = entry
+			record = {"id": item.item_id, "question": question, "options": options}
+			if error is None:
+				try:
+					if item.image_path is None:  # typed CSV rows are sent as written
+						response = await run_mcq_model(question, options)
+					else:
+						response = await run_mcq_with_ocr(question, options)
+					record.update(answer=response.answer, explanation=response.explanation,
+								  model=response.model_name)
+				except Exception as e:
+					error = e
+			if error is not None:
+				record["error"] = f"{type(error).__name__}: {error}"
+				counts["failed"] += 1
+			else:
+				counts["solved"] += 1
+			out.write(json.dumps(record) + "\n")
+			out.flush()
+
+	try:
+		with open(out_path, "a", encoding="utf-8") as out:
+			await asyncio.gather(ocr_stage(), *(generation_worker(out) for _ in range(concurrency)))
+	finally:
+		if pool is not None:
+			pool.shutdown(cancel_futures=True)
+	elapsed = time.monotonic() - started
+	print(f"solved {counts['solved']}, failed {counts['failed']} in {elapsed:.1f}s")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Solve a folder of screenshots or a CSV of questions offline")
+	parser.add_argument("source", help="Folder of images, or CSV with question,A,B,C,... columns")
+	parser.add_argument("output", help="JSONL results file; re-running resumes from it")
+	parser.add_argument("--ocr-processes", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+	parser.add_argument("--concurrency", type=int, default=2, help="Model requests in flight")
+	parser.add_argument("--remove-watermark", action="store_true")
+	args = parser.parse_args()
+	asyncio.run(run_batch(load_items(args.source), args.output, args.ocr_processes, args.concurrency,
+						  args.remove_watermark))
+
+
+if __name__ == "__main__":
+	main()
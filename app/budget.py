@@ -0,0 +1,135 @@
+import math
+import re
+from collections import Counter
+from typing import List, NamedTuple
+
+from app.ocr_engines import TextBox
+
+
+# Lines that are exam/app UI rather than question text. A bare "10:30", "3/4"
+# or "25%" may be an option value, so timers, counters and percentages only
+# count when labelled.
+_CHROME_RES = [re.compile(p, re.IGNORECASE) for p in (
+	r"^time\s*(left|remaining)\s*:?\s*\d{1,2}:\d{2}(:\d{2})?$",  # "Time left: 10:30"
+	r"^\d{1,2}:\d{2}(:\d{2})?\s*(left|remaining)$",  # "10:30 remaining"
+	r"^(question|q|page)\s*\.?\s*\d+\s*(of|/)\s*\d+$",  # "Question 3 of 20", "Page 3/20"
+	r"^(next|previous|prev|back|submit|skip|finish|save( (&|and) next)?|mark for review( (&|and) next)?"
+	r"|clear( response)?|review|bookmark|report|end test|pause|resume|menu|home|close|ok|cancel)$",
+	r"^(marks?|score|points?)\s*:?\s*[-+]?\d+(\.\d+)?(\s*/\s*\d+)?$",  # "Marks: 4"
+	r"^(https?://|www\.)\S+$",  # URLs
+	r"^(battery|progress)\s*:?\s*\d{1,3}\s*%$",
+)]
+
+# A line repeated this many times on one page is a tiled watermark, unless it
+# is an option ("A) True" recurs on a page of true/false questions)
+_WATERMARK_REPEATS = 3
+_OPTION_RE = re.compile(r"^\(?[a-h]([\).:]|$)")
+_MARKER_RE = re.compile(r"^\(?[a-h][\).:]?$")  # an option letter on its own, its value in the next box
+
+# Table and frame borders: box-drawing glyphs, or a rule of one repeated
+# character. Other symbol-only text ("&&", "||", "<=", "+") can be an option.
+_BORDER_RE = re.compile(r"^[\u2500-\u259f\s]+$|^([-_=~.*#|+])(\s*\1){2,}$")
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# A capped question keeps at least this many tokens, however little budget is left
+MIN_QUESTION_TOKENS = 32
+
+
+def estimate_tokens(text: str) -> int:
+	"""Rough Llama-tokenizer count: a token per short word or symbol, one per ~4 chars of longer words"""
+	return sum(max(1, math.ceil(len(t) / 4)) for t in _TOKEN_RE.findall(text))
+
+
+def _norm(text: str) -> str:
+	return " ".join(text.lower().split())
+
+
+def clean_boxes(boxes: List[TextBox], min_confidence: float) -> List[TextBox]:
+	"""Drop low-confidence boxes, UI chrome, tiled watermark text and borders from OCR output"""
+	counts = Counter(_norm(b.text) for b in boxes)
+	kept = []
+	for box in boxes:
+		norm = _norm(box.text)
+		if not norm or box.confidence < min_confidence:
+			continue
+		if counts[norm] >= _WATERMARK_REPEATS and not _OPTION_RE.match(norm):
+			continue
+		if any(r.match(norm) for r in _CHROME_RES):
+			continue
+		if _BORDER_RE.match(norm) and not (kept and _MARKER_RE.match(_norm(kept[-1].text))):
+			continue
+		kept.append(box)
+	return kept
+
+
+def _dedupe_line(line: str, max_n: int) -> str:
+	indent = line[:len(line) - len(line.lstrip())]
+	out: List[str] = []
+	for word in line.split():
+		out.append(word)
+		for n in range(1, max_n + 1):
+			if (len(out) >= 2 * n and out[-n:] == out[-2 * n:-n]
+					and any(w.isalpha() and len(w) >= 3 for w in out[-n:])):
+				del out[-n:]
+				break
+	return indent + " ".join(out)
+
+
+def dedupe_fragments(text: str, max_n: int = 8) -> str:
+	"""Collapse immediately repeated word runs ("Sample Sample Sample", "Page 1 Page 1").
+
+	Only runs containing a real word are collapsed; repeated numbers and
+	symbols ("1 1 2 3 5", "0 0 1") are content. Works line by line and keeps
+	line breaks and indentation, which code and tables depend on.
+	"""
+	return "\n".join(_dedupe_line(line, max_n) for line in text.split("\n"))
+
+
+def _cap(text: str, tokens: int) -> str:
+	"""Shorten text to about `tokens`, keeping its start and, mostly, its end (where the ask usually is).
+
+	Whitespace between the kept words, line breaks included, is left as it was.
+	"""
+	if tokens <= 0 or estimate_tokens(text) <= tokens:
+		return text
+	lead = text[:len(text) - len(text.lstrip())]
+	pieces = re.findall(r"\S+\s*", text)  # each word with the whitespace after it
+	head_budget, tail_budget = tokens // 3, tokens - tokens // 3
+	start, end = 0, len(pieces)
+	used = 0
+	while end > start and used + estimate_tokens(pieces[end - 1]) <= tail_budget:
+		end -= 1
+		used += estimate_tokens(pieces[end])
+	used = 0
+	while start < end and used + estimate_tokens(pieces[start]) <= head_budget:
+		used += estimate_tokens(pieces[start])
+		start += 1
+	return lead + "".join(pieces[:start]).rstrip() + " ... " + "".join(pieces[end:]).rstrip()
+
+
+class Compacted(NamedTuple):
+	question: str
+	options: List[str]
+	tokens_saved: int
+
+
+def compact_mcq(question: str, options: List[str], budget: int, fixed_tokens: int) -> Compacted:
+	"""Dedupe the question and options and cap them so the whole prompt fits in budget tokens.
+
+	For OCR text only; typed questions are sent as written. fixed_tokens is
+	what the prompt template itself costs. Options are capped first (each to
+	a fair share), since a runaway option is usually OCR spill; the question
+	gets whatever is left, but at least MIN_QUESTION_TOKENS. budget <= 0
+	only dedupes.
+	"""
+	before = estimate_tokens(question) + sum(estimate_tokens(o) for o in options)
+	question = dedupe_fragments(question)
+	options = [dedupe_fragments(o) for o in options]
+	if budget > 0:
+		room = max(budget - fixed_tokens, 32)
+		option_cap = max(room // (2 * max(len(options), 1)), 8)
+		options = [_cap(o, option_cap) for o in options]
+		question = _cap(question, max(room - sum(estimate_tokens(o) for o in options), MIN_QUESTION_TOKENS))
+	after = estimate_tokens(question) + sum(estimate_tokens(o) for o in options)
+	return Compacted(question, options, max(0, before - after))
@@ -1,12 +1,124 @@
-from typing import Dict, List, Literal
+import os
+from typing import Dict, List, Literal, Union
 from pydantic import BaseModel
 
+from app.store import get_store
+
+
+# Deployment profile: 'full' serves everything, 'text' serves only text
+# questions and never imports the OCR stack (PaddleOCR, OpenCV, numpy).
+PROFILE = os.environ.get("HELPERAI_PROFILE", "full")
+
+
+def ocr_available() -> bool:
+	return PROFILE != "text"
+
 
 class RuntimeConfig(BaseModel):
 	# Single model configuration - deepseek-r1:70b-llama-distill-q4_K_M only
 	model: str = 'deepseek-r1:70b-llama-distill-q4_K_M'
 	keep_alive: str = '0'  # '0' unload asap, or durations like '10m'
-	
+	# Several models on one Ollama host: per-model keep_alive overrides, and a
+	# memory budget (0 = unmanaged) within which least recently used models are
+	# unloaded to make room and, after model_preload_idle_seconds without
+	# generations, the next likely model is preloaded. Up to model_batch_max
+	# queued requests for the model in use run before another model's.
+	model_keep_alive: Dict[str, str] = {}
+	model_memory_budget_gb: float = 0
+	model_preload_idle_seconds: float = 60
+	model_batch_max: int = 4
+	# Generation settings: overrides of OLLAMA_GEN_OPTIONS (e.g. {"num_predict": 96})
+	# and the MCQ prompt template ('default' or 'concise'); pick them with app.eval
+	gen_options: Dict[str, Union[int, float]] = {}
+	mcq_prompt: str = 'default'
+
+	# Shared cache lifetimes (seconds); 0 disables the cache
+	answer_cache_ttl: int = 3600
+	ocr_cache_ttl: int = 3600
+
+	# Question bank: answer near-duplicate MCQs (same option set, same numbers
+	# and negation words, similarity >= qbank_threshold) from stored answers.
+	# Model answers are stored unverified and only used when
+	# qbank_trust_model_answers is set.
+	qbank_enabled: bool = True
+	qbank_threshold: float = 0.8
+	qbank_trust_model_answers: bool = False
+
+	# Time budget for a request (OCR + generation), in seconds. Clients may ask
+	# for less with an X-Request-Timeout header; async jobs get job_timeout_seconds.
+	request_timeout_seconds: float = 120.0
+	job_timeout_seconds: float = 600.0
+	# Retries for backend connection errors, and the per-backend circuit breaker.
+	# Connection errors and 5xx responses count as failures; a timeout only
+	# counts if the backend had breaker_timeout_seconds to answer.
+	generation_retries: int = 2
+	breaker_failure_threshold: int = 5
+	breaker_reset_seconds: float = 30.0
+	breaker_timeout_seconds: float = 60.0
+
+	# Uploads larger than this are rejected with 413; images are downscaled to
+	# at most ocr_max_side pixels while decoding
+	max_upload_bytes: int = 10 * 1024 * 1024
+	ocr_max_side: int = 2048
+
+	# Requests sent to the model backend at the same time (per worker)
+	max_concurrent_generations: int = 1
+	# OCR boxes below ocr_min_confidence, UI chrome (timers, "Next", counters)
+	# and tiled watermark text are dropped; repeated fragments are collapsed and
+	# the MCQ prompt is capped at about prompt_token_budget tokens (0 = no cap)
+	ocr_min_confidence: float = 0.5
+	prompt_token_budget: int = 768
+
+	# Screenshots holding several numbered questions are split and each
+	# question is solved separately, question_concurrency at a time
+	max_questions_per_image: int = 10
+	question_concurrency: int = 2
+
+	# Threads running OCR (per worker); they share one engine instance
+	ocr_workers: int = 1
+	# OCR engine: 'paddle' (PaddleOCR) or 'onnx' (PP-OCR models exported to ONNX
+	# in ocr_onnx_model_dir, run by ONNX Runtime); ocr_threads caps the engine's
+	# intra-op CPU threads (0 = from the thread budget)
+	ocr_engine: Literal['paddle', 'onnx'] = 'paddle'
+	ocr_onnx_model_dir: str = os.path.join('models', 'ocr')
+	ocr_threads: int = 0
+	# Split the cores between worker processes and their OCR threads and size
+	# the OCR, OpenCV and BLAS thread pools to match (see app/threads.py);
+	# optionally pin each worker's OCR threads to its own cores. Applied when a
+	# process first loads OCR.
+	thread_budget: bool = True
+	pin_ocr_cores: bool = False
+
+	# Per-client limits, per worker: a token bucket per client IP of
+	# client_burst requests refilled at client_rate_per_minute (0 disables), and
+	# fair-queuing weights for the OCR and model slots per client (X-Session-Id,
+	# else IP; default 1)
+	client_rate_per_minute: float = 30.0
+	client_burst: int = 10
+	client_weights: Dict[str, float] = {}
+
+	# Recycle a worker (finish its work, exit, let uvicorn start a fresh one)
+	# once its RSS passes worker_max_rss_mb or it has run worker_max_ocr_runs
+	# OCRs; 0 disables. Only with several workers (app.launcher).
+	worker_max_rss_mb: int = 3072
+	worker_max_ocr_runs: int = 0
+
+	# Every solved question is appended to $HELPERAI_RESULT_LOG (data/results.jsonl)
+	# with its question hash, options, answer, stage timings and cache hits;
+	# rotated at result_log_max_mb, keeping result_log_backups old files.
+	# result_log_questions also logs the question text (needed to pre-warm the cache).
+	result_log: bool = True
+	result_log_questions: bool = False
+	result_log_max_mb: int = 64
+	result_log_backups: int = 5
+
+	# Async jobs: how many run at once per worker, and how long finished ones are kept
+	job_concurrency: int = 1
+	job_retention_seconds: int = 3600
+	# Hosts a job's final status may be POSTed to (?webhook=URL on submission);
+	# '*' allows any host, empty disables webhooks
+	job_webhook_hosts: List[str] = []
+
 	# Allow field names starting with 'model_' (e.g., model_name)
 	model_config = {
 		"protected_namespaces": ()
@@ -14,15 +126,29 @@ class RuntimeConfig(BaseModel):
 
 
 _config = RuntimeConfig()
+_config_version = 0
+_config_stamp: object = object()
 
 
 def get_config() -> RuntimeConfig:
+	# Pick up changes made by other worker processes; the store is only
+	# queried when its config stamp has changed
+	global _config, _config_version, _config_stamp
+	store = get_store()
+	stamp = store.config_stamp()
+	if stamp != _config_stamp:
+		_config_stamp = stamp
+		stored = store.load_config(_config_version)
+		if stored is not None:
+			_config_version, values = stored
+			_config = RuntimeConfig.model_validate(values)
 	return _config
 
 
 def update_config(new_cfg: Dict) -> RuntimeConfig:
-	global _config
-	_config = _config.model_copy(update=new_cfg)
+	global _config, _config_version
+	_config = get_config().model_copy(update=new_cfg)
+	# Only values that differ from the defaults are stored, so a changed
+	# default in the code still applies after a restart
+	_config_version = get_store().save_config(_config.model_dump(exclude_defaults=True))
 	return _config
-
-
@@ -0,0 +1,155 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Deque, Dict, List, Optional
+
+from app import metrics
+
+
+# Debug endpoints are only served when this token is set, and callers must send it
+DEBUG_TOKEN = os.environ.get("HELPERAI_DEBUG_TOKEN", "")
+
+PROFILE_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 60
+
+# Stage and start time of the tasks that called track_task/set_stage
+_task_info: "weakref.WeakKeyDictionary[asyncio.Task, List]" = weakref.WeakKeyDictionary()
+
+
+def track_task(task: asyncio.Task, stage: str) -> None:
+	_task_info[task] = [time.monotonic(), stage]
+
+
+def set_stage(stage: str) -> None:
+	"""Record what the current task is doing, for /debug/tasks"""
+	try:
+		task = asyncio.current_task()
+	except RuntimeError:
+		return
+	if task is None:
+		return
+	info = _task_info.get(task)
+	if info is None:
+		_task_info[task] = [time.monotonic(), stage]
+	else:
+		info[1] = stage
+
+
+def task_listing() -> List[Dict]:
+	now = time.monotonic()
+	tasks = []
+	for task in asyncio.all_tasks():
+		info = _task_info.get(task)
+		coro = task.get_coro()
+		tasks.append({
+			"name": task.get_name(),
+			"coroutine": getattr(coro, "__qualname__", repr(coro)),
+			"stage": info[1] if info else None,
+			"age_seconds": round(now - info[0], 3) if info else None,
+		})
+	tasks.sort(key=lambda t: -(t["age_seconds"] or 0))
+	return tasks
+
+
+def _frame_stack(frame) -> List[str]:
+	stack = []
+	while frame is not None:
+		code = frame.f_code
+		stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+		frame = frame.f_back
+	stack.reverse()
+	return stack
+
+
+def sample_stacks(seconds: float, interval: float = PROFILE_INTERVAL) -> str:
+	"""Sample every thread's stack for `seconds`; returns collapsed stacks.
+
+	Output is one "thread;frame;frame... count" line per distinct stack, the
+	format flamegraph.pl and speedscope read. Blocking; run it in a thread.
+	"""
+	me = threading.get_ident()
+	counts: Dict[str, int] = collections.Counter()
+	end = time.monotonic() + seconds
+	while time.monotonic() < end:
+		names = {t.ident: t.name for t in threading.enumerate()}
+		for ident, frame in sys._current_frames().items():
+			if ident == me:
+				continue
+			stack = [names.get(ident, f"thread-{ident}")] + _frame_stack(frame)
+			counts[";".join(stack)] += 1
+		time.sleep(interval)
+	return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+
+
+class LoopLagMonitor:
+	"""Watches the event loop from a side thread.
+
+	Every interval it schedules a no-op on the loop; if the loop does not run
+	it within threshold seconds, something is blocking it, and the loop
+	thread's stack is captured to show what.
+	"""
+
+	def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = 0.1, threshold: float = 0.1):
+		self.loop = loop
+		self.interval = interval
+		self.threshold = threshold
+		self.max_lag = 0.0
+		self.blocked: Deque[Dict] = collections.deque(maxlen=20)
+		self._loop_thread = threading.get_ident()
+		self._stop = threading.Event()
+
+	def start(self) -> None:
+		threading.Thread(target=self._run, name="loop-lag-monitor", daemon=True).start()
+
+	def stop(self) -> None:
+		self._stop.set()
+
+	def _run(self) -> None:
+		while not self._stop.is_set():
+			serviced = threading.Event()
+			sent = time.monotonic()
+			try:
+				self.loop.call_soon_threadsafe(serviced.set)
+			except RuntimeError:
+				return  # loop closed
+			stack = None
+			if not serviced.wait(self.threshold):
+				frame = sys._current_frames().get(self._loop_thread)
+				stack = _frame_stack(frame) if frame is not None else []
+				while not serviced.wait(0.5):
+					if self._stop.is_set():
+						return
+			lag = time.monotonic() - sent
+			self.max_lag = max(self.max_lag, lag)
+			metrics.set_gauge("loop_lag_max_ms", round(self.max_lag * 1000, 1))
+			if stack is not None:
+				metrics.incr("loop_blocked")
+				self.blocked.append({"at": time.time(), "lag_ms": round(lag * 1000, 1), "stack": stack})
+			self._stop.wait(self.interval)
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def start_loop_monitor() -> LoopLagMonitor:
+	"""Start watching the running loop; call from inside it"""
+	global _monitor
+	if _monitor is None:
+		_monitor = LoopLagMonitor(asyncio.get_running_loop())
+		_monitor.start()
+	return _monitor
+
+
+def loop_report() -> Dict:
+	if _monitor is None:
+		return {"running": False}
+	return {
+		"running": True,
+		"max_lag_ms": round(_monitor.max_lag * 1000, 1),
+		"threshold_ms": _monitor.threshold * 1000,
+		"blocked": list(_monitor.blocked),
+	}
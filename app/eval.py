@@ -0,0 +1,288 @@
+"""Accuracy versus latency of generation settings, on a labeled question set.
+
+Every combination of --models, --prompts and --grid runs the whole dataset
+through the real pipeline (prompt building, compaction, parsing), against
+Ollama or a deterministic local stub. Prints one row per setting with its
+accuracy, p50/p95 latency and mean tokens generated; '*' marks the settings
+no other setting beats on both accuracy and p95.
+
+Dataset: JSONL with {"question", "options" (MCQ only), "answer"} per line;
+MCQ answers are letters, freeform answers are compared case-insensitively.
+
+Usage: python -m app.eval questions.jsonl --grid num_predict=96,160 temperature=0,0.2 \
+	--prompts default,concise [--models a,b] [--backend stub] [--out results.jsonl]
+"""
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import itertools
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional, Union
+
+
+class EvalItem(NamedTuple):
+	question: str
+	options: Optional[List[str]]
+	answer: str
+
+
+class Setting(NamedTuple):
+	model: str
+	prompt: str
+	gen_options: Dict[str, Union[int, float]]
+
+	def label(self) -> str:
+		opts = " ".join(f"{k}={v:g}" for k, v in sorted(self.gen_options.items()))
+		return f"{self.model} {self.prompt} {opts}".strip()
+
+
+# Token counts of the generation running in the current item's task
+_usage: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("eval_usage", default=None)
+
+
+def load_dataset(path: str) -> List[EvalItem]:
+	items = []
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			if line.strip():
+				row = json.loads(line)
+				items.append(EvalItem(row["question"], row.get("options") or None, str(row["answer"]).strip()))
+	return items
+
+
+def parse_grid(specs: List[str]) -> List[Dict[str, Union[int, float]]]:
+	"""["num_predict=96,160", "temperature=0,0.2"] -> every combination of the values"""
+	axes = []
+	for spec in specs:
+		name, _, values = spec.partition("=")
+		axes.append([(name.strip(), json.loads(v)) for v in values.split(",") if v.strip()])
+	return [dict(combo) for combo in itertools.product(*axes)]
+
+
+def is_correct(item: EvalItem, answer: str) -> bool:
+	if item.options:
+		return answer.strip().upper() == item.answer.upper()
+	return " ".join(answer.lower().split()) == " ".join(item.answer.lower().split())
+
+
+def percentile(values: List[float], q: float) -> float:
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def pareto(rows: List[Dict]) -> None:
+	"""Mark rows that no other row beats on accuracy and p95 (and ties on neither)"""
+	for row in rows:
+		row["pareto"] = not any(
+			other["accuracy"] >= row["accuracy"] and other["p95_s"] <= row["p95_s"]
+			and (other["accuracy"] > row["accuracy"] or other["p95_s"] < row["p95_s"])
+			for other in rows
+		)
+
+
+class StubBackend:
+	"""Deterministic stand-in for Ollama that knows the labels.
+
+	It gets an item right when a hash of (model, question) falls under
+	`skill` (less with temperature), answers in the order the prompt's format
+	asks for, padded with explanation and steps, and stops at num_predict
+	tokens, so a short budget cuts the answer off behind a long explanation.
+	Latency follows the prompt and completion sizes.
+	"""
+
+	EXPLANATION_TOKENS = 60
+	STEPS_TOKENS = 150
+
+	def __init__(self, items: List[EvalItem], skill: float = 0.8, prefill_tps: float = 4000.0,
+				 decode_tps: float = 400.0):
+		self.items = items
+		self.skill = skill
+		self.prefill_tps = prefill_tps
+		self.decode_tps = decode_tps
+
+	def _item(self, prompt: str) -> Optional[EvalItem]:
+		# Compaction may cut the middle of a long question, never its start
+		for item in self.items:
+			if item.question[:40] in prompt:
+				return item
+		return None
+
+	def _answer(self, item: Optional[EvalItem], model: str, temperature: float) -> str:
+		if item is None:
+			return "unknown"
+		digest = hashlib.sha256(f"{model}\n{item.question}".encode("utf-8")).digest()
+		if digest[0] / 256 < self.skill - 0.25 * temperature:
+			return item.answer
+		if item.options:
+			letters = [chr(ord("A") + i) for i in range(len(item.options))]
+			return letters[(letters.index(item.answer.upper()) + 1) % len(letters)] if item.answer.upper() in letters else "A"
+		return "unknown"
+
+	async def generate(self, payload: dict, deadline) -> dict:
+		from app.budget import estimate_tokens
+		from app.models import OLLAMA_GEN_OPTIONS
+		prompt = payload["prompt"]
+		options = {**OLLAMA_GEN_OPTIONS, **payload.get("options", {})}
+		answer = self._answer(self._item(prompt), payload["model"], options["temperature"])
+		sections = {
+			"EXPLANATION": ("explanation " * self.EXPLANATION_TOKENS).strip(),
+			"ANSWER": answer,
+			"STEPS": ("step " * self.STEPS_TOKENS).strip(),
+			"THOUGHT PROCESS": ("step " * self.STEPS_TOKENS).strip(),
+		}
+		# The sections the prompt's format asks for, in its order
+		asked = sorted((m.start(), m.group(1)) for m in re.finditer(r"^(EXPLANATION|ANSWER|STEPS|THOUGHT PROCESS):", prompt, re.MULTILINE))
+		words = " \n".join(f"{name}: {sections[name]}" for _pos, name in asked).split(" ")
+		completion = words[:int(options["num_predict"])]
+		prompt_tokens = estimate_tokens(prompt)
+		prefill = prompt_tokens / self.prefill_tps
+		decode = len(completion) / self.decode_tps
+		await asyncio.sleep(min(prefill + decode, deadline.remaining()))
+		return {
+			"response": " ".join(completion),
+			"prompt_eval_count": prompt_tokens,
+			"prompt_eval_duration": int(prefill * 1e9),
+			"eval_count": len(completion),
+		}
+
+
+class RecordingBackend:
+	"""Passes generations through and records their token counts for the current item"""
+
+	def __init__(self, inner):
+		self.inner = inner
+
+	async def generate(self, payload: dict, deadline) -> dict:
+		if self.inner is None:
+			from app.models import _post_generate
+			data = await _post_generate(payload, deadline)
+		else:
+			data = await self.inner.generate(payload, deadline)
+		usage = _usage.get()
+		if usage is not None:
+			usage["completion_tokens"] += data.get("eval_count") or 0
+			usage["prompt_tokens"] += data.get("prompt_eval_count") or 0
+		return data
+
+
+async def run_item(item: EvalItem, timeout: float) -> Dict:
+	from app import pipeline
+	from app.resilience import Deadline
+	usage = {"completion_tokens": 0, "prompt_tokens": 0}
+	_usage.set(usage)
+	started = time.perf_counter()
+	try:
+		if item.options:
+			result = await pipeline.solve_text(item.question, item.options, Deadline(timeout))
+		else:
+			result = await pipeline.solve_freeform(item.question, Deadline(timeout))
+		answer, error = result["final_answer"], None
+	except Exception as e:
+		answer, error = "", f"{type(e).__name__}: {e}"
+	return {
+		"question": item.question,
+		"expected": item.answer,
+		"answer": answer,
+		"correct": error is None and is_correct(item, answer),
+		"error": error,
+		"seconds": time.perf_counter() - started,
+		**usage,
+	}
+
+
+async def run_setting(setting: Setting, items: List[EvalItem], concurrency: int, timeout: float) -> List[Dict]:
+	from app.config import update_config
+	update_config({"model": setting.model, "mcq_prompt": setting.prompt, "gen_options": setting.gen_options})
+	slots = asyncio.Semaphore(concurrency)
+
+	async def one(item: EvalItem) -> Dict:
+		async with slots:
+			return await run_item(item, timeout)
+
+	return await asyncio.gather(*(one(item) for item in items))
+
+
+async def run_eval(items: List[EvalItem], settings: List[Setting], backend, concurrency: int,
+				   timeout: float, out_path: Optional[str]) -> List[Dict]:
+	from app.config import update_config
+	from app.models import set_generation_backend, set_generation_concurrency
+	# Every item must reach the model: no cached answers, no question bank; and
+	# eval traffic stays out of the result log
+	update_config({"answer_cache_ttl": 0, "qbank_enabled": False, "client_rate_per_minute": 0,
+				   "result_log": False})
+	set_generation_concurrency(concurrency)
+	set_generation_backend(RecordingBackend(backend))
+	rows = []
+	out = open(out_path, "w", encoding="utf-8") if out_path else None
+	try:
+		for setting in settings:
+			results = await run_setting(setting, items, concurrency, timeout)
+			seconds = [r["seconds"] for r in results]
+			rows.append({
+				"setting": setting.label(),
+				"accuracy": sum(r["correct"] for r in results) / len(results),
+				"errors": sum(r["error"] is not None for r in results),
+				"p50_s": statistics.median(seconds),
+				"p95_s": percentile(seconds, 0.95),
+				"completion_tokens": statistics.mean(r["completion_tokens"] for r in results),
+				"prompt_tokens": statistics.mean(r["prompt_tokens"] for r in results),
+			})
+			print(f"  {setting.label()}: {rows[-1]['accuracy']:.0%} in p95 {rows[-1]['p95_s']:.2f}s")
+			if out is not None:
+				for result in results:
+					out.write(json.dumps({"setting": setting._asdict(), **result}) + "\n")
+	finally:
+		if out is not None:
+			out.close()
+		set_generation_backend(None)
+	pareto(rows)
+	return rows
+
+
+def print_table(rows: List[Dict]) -> None:
+	width = max(len(r["setting"]) for r in rows)
+	print(f"\n  {'setting':{width}s} {'accuracy':>8s} {'p50 s':>7s} {'p95 s':>7s} {'gen tok':>8s} {'prompt tok':>10s} {'errors':>6s}")
+	for row in sorted(rows, key=lambda r: (r["p95_s"], -r["accuracy"])):
+		print(f"{'*' if row['pareto'] else ' '} {row['setting']:{width}s} {row['accuracy']:8.1%} {row['p50_s']:7.2f}"
+			  f" {row['p95_s']:7.2f} {row['completion_tokens']:8.1f} {row['prompt_tokens']:10.1f} {row['errors']:6d}")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Accuracy versus latency of generation settings")
+	parser.add_argument("dataset", help="JSONL of {question, options, answer}")
+	parser.add_argument("--grid", nargs="*", default=[], help="Generation options to sweep, e.g. num_predict=96,160")
+	parser.add_argument("--models", help="Comma-separated models (default: the configured model)")
+	parser.add_argument("--prompts", default="default", help="Comma-separated MCQ prompt variants")
+	parser.add_argument("--backend", choices=("ollama", "stub"), default="ollama")
+	parser.add_argument("--stub-skill", type=float, default=0.8, help="Share of items the stub gets right")
+	parser.add_argument("--concurrency", type=int, default=1, help="Model requests in flight")
+	parser.add_argument("--timeout", type=float, default=120.0, help="Seconds per item")
+	parser.add_argument("--out", help="Write per-item results to this JSONL file")
+	args = parser.parse_args()
+	# A private store: the eval changes the runtime config, which a running server would pick up
+	os.environ["HELPERAI_STORE"] = os.path.join(tempfile.mkdtemp(), "eval_store.sqlite3")
+	from app.config import get_config
+	from app.models import MCQ_PROMPTS
+
+	items = load_dataset(args.dataset)
+	prompts = args.prompts.split(",")
+	unknown = [p for p in prompts if p not in MCQ_PROMPTS]
+	if unknown:
+		parser.error(f"unknown prompt variant(s) {unknown}; choose from {sorted(MCQ_PROMPTS)}")
+	models = args.models.split(",") if args.models else [get_config().model]
+	settings = [Setting(model, prompt, options)
+				for model in models for prompt in prompts for options in parse_grid(args.grid)]
+	backend = StubBackend(items, args.stub_skill) if args.backend == "stub" else None
+	print(f"{len(items)} items x {len(settings)} settings on {args.backend}")
+	rows = asyncio.run(run_eval(items, settings, backend, args.concurrency, args.timeout, args.out))
+	print_table(rows)
+
+
+if __name__ == "__main__":
+	main()
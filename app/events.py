@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+from app.store import get_store
+
+
+# Per-subscriber buffer; a client that falls this far behind loses its oldest events
+QUEUE_SIZE = 32
+# How often each worker picks up events published by other workers (seconds)
+_POLL_INTERVAL = 0.25
+# Idle SSE connections get a comment line this often so proxies keep them open
+KEEPALIVE_SECONDS = 15.0
+# Events older than this are purged from the shared store (seconds), at most
+# once per _PURGE_INTERVAL, on publish so it happens with or without subscribers
+_EVENT_RETENTION = 300.0
+_PURGE_INTERVAL = 60.0
+
+
+class EventHub:
+	"""Registry of server-sent-event subscribers, keyed by session id.
+
+	Events are delivered straight to subscribers in this worker and also
+	appended to the shared store, from which the other workers relay them to
+	their own subscribers. A session of None means "every session".
+	"""
+
+	def __init__(self):
+		self._sessions: Dict[str, Set[asyncio.Queue]] = {}
+		self._subscribers = 0
+		self._relay_task: Optional[asyncio.Task] = None
+		self._last_event_id = 0
+		self._last_purge = 0.0
+		self._pid = os.getpid()
+
+	def subscriber_count(self) -> int:
+		return self._subscribers
+
+	def subscribe(self, session: str) -> asyncio.Queue:
+		queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+		self._sessions.setdefault(session, set()).add(queue)
+		self._subscribers += 1
+		if self._relay_task is None or self._relay_task.done():
+			# Events published while nobody here was subscribed are stale; skip them
+			self._last_event_id = get_store().event_last_id()
+			self._relay_task = asyncio.create_task(self._relay())
+		return queue
+
+	def unsubscribe(self, session: str, queue: asyncio.Queue) -> None:
+		queues = self._sessions.get(session)
+		if queues is None or queue not in queues:
+			return
+		queues.discard(queue)
+		self._subscribers -= 1
+		if not queues:
+			del self._sessions[session]
+
+	def _deliver(self, session: Optional[str], message: Dict) -> int:
+		if session is None:
+			targets = [q for queues in self._sessions.values() for q in queues]
+		else:
+			targets = list(self._sessions.get(session, ()))
+		for queue in targets:
+			if queue.full():
+				queue.get_nowait()
+			queue.put_nowait(message)
+		return len(targets)
+
+	def publish(self, session: Optional[str], event: str, data: Dict) -> int:
+		"""Push an event to a session (or to everyone); returns local deliveries"""
+		message = {"event": event, "data": data}
+		store = get_store()
+		store.event_append(session, self._pid, event, data)
+		now = time.time()
+		if now - self._last_purge > _PURGE_INTERVAL:
+			self._last_purge = now
+			store.events_purge(now - _EVENT_RETENTION)
+		return self._deliver(session, message)
+
+	async def _relay(self) -> None:
+		store = get_store()
+		while self._subscribers:
+			for event_id, session, origin_pid, event, data in store.events_since(self._last_event_id):
+				self._last_event_id = event_id
+				if origin_pid != self._pid:
+					self._deliver(session, {"event": event, "data": data})
+			await asyncio.sleep(_POLL_INTERVAL)
+
+	async def stream(self, session: str) -> AsyncIterator[str]:
+		"""SSE-formatted stream for one subscriber; ends when the client disconnects"""
+		queue = self.subscribe(session)
+		try:
+			yield "retry: 3000\n\n"
+			while True:
+				try:
+					message = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+				except asyncio.TimeoutError:
+					yield ": keepalive\n\n"
+					continue
+				yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+		finally:
+			self.unsubscribe(session, queue)
+
+
+_hub_singleton: Optional[EventHub] = None
+
+
+def get_hub() -> EventHub:
+	global _hub_singleton
+	if _hub_singleton is None:
+		_hub_singleton = EventHub()
+	return _hub_singleton
@@ -0,0 +1,204 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from app.config import get_config
+from app import metrics
+
+
+# Client (session id or IP) the current request is served for; tasks started
+# by the request, including queued jobs, inherit it
+current_client: contextvars.ContextVar[str] = contextvars.ContextVar("current_client", default="local")
+
+# Idle clients are forgotten once there are more than this many
+_MAX_TRACKED_CLIENTS = 10000
+
+
+class RateLimited(Exception):
+	"""The client has used up its request tokens."""
+
+	def __init__(self, retry_after: float):
+		super().__init__("Too many requests; slow down")
+		self.retry_after = retry_after
+
+
+class ClientUsage:
+	"""Per-client counters (per worker), for sizing quotas"""
+
+	def __init__(self):
+		self._usage: Dict[str, Dict[str, float]] = {}
+
+	def add(self, client: str, name: str, amount: float = 1) -> None:
+		counters = self._usage.setdefault(client, {})
+		counters[name] = counters.get(name, 0) + amount
+
+	def snapshot(self) -> Dict[str, Dict[str, float]]:
+		return {client: dict(counters) for client, counters in self._usage.items()}
+
+
+class TokenBucket:
+	"""Token buckets (per client IP): client_burst tokens, refilled at client_rate_per_minute"""
+
+	def __init__(self):
+		self._buckets: Dict[str, List[float]] = {}  # client -> [tokens, last refill]
+
+	def take(self, client: str) -> None:
+		cfg = get_config()
+		if cfg.client_rate_per_minute <= 0:
+			return
+		now = time.monotonic()
+		rate = cfg.client_rate_per_minute / 60.0
+		if len(self._buckets) > _MAX_TRACKED_CLIENTS:
+			# A bucket idle long enough to be full again holds no state worth keeping
+			full_after = cfg.client_burst / rate
+			self._buckets = {c: b for c, b in self._buckets.items() if now - b[1] < full_after}
+		bucket = self._buckets.setdefault(client, [float(cfg.client_burst), now])
+		bucket[0] = min(float(cfg.client_burst), bucket[0] + (now - bucket[1]) * rate)
+		bucket[1] = now
+		if bucket[0] < 1.0:
+			metrics.incr("rate_limited")
+			raise RateLimited((1.0 - bucket[0]) / rate)
+		bucket[0] -= 1.0
+
+
+class FairSemaphore:
+	"""Semaphore that hands free slots to waiting clients in weighted fair order.
+
+	Start-time fair queuing: each grant advances the client's virtual time by
+	1 / weight and the waiting client with the smallest virtual time goes next,
+	so one client with many queued requests cannot starve the others.
+
+	Waiters may name a group (the model they need): up to batch_limit grants
+	in a row go to waiters of the group granted last, if any are queued,
+	before fair order picks from everyone again.
+	"""
+
+	def __init__(self, name: str, capacity: int, batch_limit: int = 1):
+		self.name = name
+		self.capacity = capacity
+		self.batch_limit = batch_limit
+		self._in_use = 0
+		self._waiters: Dict[str, Deque[Tuple[asyncio.Future, Optional[Hashable]]]] = {}
+		self._vtime: Dict[str, float] = {}
+		self._clock = 0.0
+		self._group: Optional[Hashable] = None
+		self._streak = 0
+
+	def _start_time(self, client: str) -> float:
+		return max(self._vtime.get(client, 0.0), self._clock)
+
+	def _grant(self, client: str, group: Optional[Hashable]) -> None:
+		if group == self._group:
+			self._streak += 1
+		else:
+			self._group, self._streak = group, 1
+		start = self._start_time(client)
+		self._clock = start
+		self._vtime[client] = start + 1.0 / max(get_config().client_weights.get(client, 1.0), 0.01)
+		self._in_use += 1
+		if len(self._vtime) > _MAX_TRACKED_CLIENTS:
+			self._vtime = {c: v for c, v in self._vtime.items() if v > self._clock or c in self._waiters}
+
+	def _next_client(self) -> str:
+		if self._streak < self.batch_limit:
+			same = [c for c, queue in self._waiters.items() if queue[0][1] == self._group]
+			if same:
+				return min(same, key=self._start_time)
+		return min(self._waiters, key=self._start_time)
+
+	def busy(self) -> bool:
+		return self._in_use > 0 or bool(self._waiters)
+
+	async def acquire(self, group: Optional[Hashable] = None) -> None:
+		client = current_client.get()
+		if self._in_use < self.capacity and not self._waiters:
+			self._grant(client, group)
+			return
+		waiter = asyncio.get_running_loop().create_future()
+		entry = (waiter, group)
+		self._waiters.setdefault(client, deque()).append(entry)
+		metrics.incr(f"{self.name}_queued")
+		try:
+			await waiter
+		except asyncio.CancelledError:
+			if waiter.done() and not waiter.cancelled():
+				self.release()  # the slot was granted just as we were cancelled
+			else:
+				queue = self._waiters.get(client)
+				if queue is not None and entry in queue:
+					queue.remove(entry)
+					if not queue:
+						del self._waiters[client]
+			raise
+		finally:
+			metrics.incr(f"{self.name}_queued", -1)
+
+	def release(self) -> None:
+		self._in_use -= 1
+		while self._in_use < self.capacity and self._waiters:
+			client = self._next_client()
+			queue = self._waiters[client]
+			waiter, group = queue.popleft()
+			if not queue:
+				del self._waiters[client]
+			if waiter.done():
+				continue
+			self._grant(client, group)
+			waiter.set_result(None)
+
+
+class InFlight:
+	"""Collapses identical submissions from one client while the first is still running.
+
+	Every caller awaits the same task; it is cancelled only when all of them
+	have gone away.
+	"""
+
+	def __init__(self):
+		self._entries: Dict[Hashable, List] = {}  # key -> [task, callers]
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def running(self, key: Hashable) -> bool:
+		return key in self._entries
+
+	async def run(self, key: Hashable, factory: Callable[[], Awaitable], discard: Optional[Callable[[], None]] = None):
+		"""Await factory() for key, or join the call already running for it (then discard() is called)"""
+		entry = self._entries.get(key)
+		if entry is None:
+			task = asyncio.ensure_future(factory())
+			entry = self._entries[key] = [task, 0]
+			task.add_done_callback(lambda _t: self._entries.pop(key, None) if self._entries.get(key) is entry else None)
+		else:
+			metrics.incr("duplicates_collapsed")
+			get_usage().add(key[0] if isinstance(key, tuple) else str(key), "duplicates_collapsed")
+			if discard is not None:
+				discard()
+		entry[1] += 1
+		try:
+			return await asyncio.shield(entry[0])
+		finally:
+			entry[1] -= 1
+			if entry[1] == 0 and not entry[0].done():
+				entry[0].cancel()
+				await asyncio.wait({entry[0]})
+
+
+_usage = ClientUsage()
+_limiter = TokenBucket()
+_inflight = InFlight()
+
+
+def get_usage() -> ClientUsage:
+	return _usage
+
+
+def get_limiter() -> TokenBucket:
+	return _limiter
+
+
+def get_inflight() -> InFlight:
+	return _inflight
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import get_config
+from app.store import get_store
+from app import metrics
+from app.events import get_hub
+from app.debug import track_task
+
+
+logger = logging.getLogger(__name__)
+
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+# How often a running job checks for cancellation requested by another worker,
+# and how often a long-poll on another worker's job re-reads the store (seconds)
+_CANCEL_CHECK_INTERVAL = 0.5
+_POLL_INTERVAL = 0.25
+# How long a cancel call waits for the job to report that it has stopped
+_CANCEL_SETTLE_TIMEOUT = 2.0
+# Webhook deliveries: attempts, seconds before the first retry (doubling), and per-attempt timeout
+_WEBHOOK_ATTEMPTS = 4
+_WEBHOOK_BACKOFF = 1.0
+_WEBHOOK_TIMEOUT = 10.0
+
+
+def _key_digest(key: Hashable) -> str:
+	"""Store key of a job key (nested tuples of strings, numbers and bools)"""
+	return hashlib.sha256(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def webhook_allowed(url: str) -> bool:
+	"""Whether job results may be POSTed to url (an http(s) URL on a job_webhook_hosts host)"""
+	parts = urlsplit(url)
+	hosts = get_config().job_webhook_hosts
+	return parts.scheme in ("http", "https") and bool(parts.hostname) and ("*" in hosts or parts.hostname in hosts)
+
+
+async def _deliver_webhook(url: str, job: Dict) -> None:
+	from app.schemas import JobStatus
+	body = JobStatus.model_validate(job).model_dump()
+	delay = _WEBHOOK_BACKOFF
+	last_error = ""
+	for attempt in range(1, _WEBHOOK_ATTEMPTS + 1):
+		try:
+			async with httpx.AsyncClient(timeout=_WEBHOOK_TIMEOUT) as client:
+				resp = await client.post(url, json=body)
+			if resp.status_code < 500:
+				metrics.incr("webhooks_sent" if resp.is_success else "webhooks_failed")
+				return
+			last_error = f"HTTP {resp.status_code}"
+		except httpx.HTTPError as e:
+			last_error = f"{type(e).__name__}: {e}"
+		if attempt < _WEBHOOK_ATTEMPTS:
+			await asyncio.sleep(delay)
+			delay *= 2
+	metrics.incr("webhooks_failed")
+	logger.warning("Webhook for job %s failed after %d attempts (%s)", job["job_id"], _WEBHOOK_ATTEMPTS, last_error)
+
+
+class JobManager:
+	"""Runs long model requests in the background with their state kept in the shared store.
+
+	Jobs are executed by the worker that accepted them, at most job_concurrency
+	at a time; any worker can report on or cancel them. A job submitted with
+	a webhook URL has its final status POSTed there when it finishes.
+	"""
+
+	def __init__(self, concurrency: int):
+		self._slots = asyncio.Semaphore(concurrency)
+		self._tasks: Dict[str, asyncio.Task] = {}
+		self._done_events: Dict[str, asyncio.Event] = {}
+		self._sessions: Dict[str, str] = {}
+		self._webhooks: Dict[str, str] = {}
+		self._deliveries: Set[asyncio.Task] = set()
+		self._recover_orphans()
+
+	def _recover_orphans(self) -> None:
+		# Jobs left unfinished by a worker that no longer exists can never complete
+		import psutil
+		store = get_store()
+		for pid in store.job_unfinished_owners():
+			if pid != os.getpid() and not psutil.pid_exists(pid):
+				store.job_fail_owned_by(pid, "Worker exited before the job finished")
+
+	def active_count(self) -> int:
+		"""Jobs of this worker that are queued or running"""
+		return len(self._tasks)
+
+	def active(self, key: Hashable) -> Optional[str]:
+		"""Id of the unfinished, not cancelled job submitted with this key on any worker, if any"""
+		store = get_store()
+		job_id = store.job_key_get(_key_digest(key))
+		if job_id is None:
+			return None
+		job = store.job_get(job_id)
+		if job is None or job["status"] in FINISHED_STATES or job["cancel_requested"]:
+			return None
+		return job_id
+
+	def submit(self, kind: str, runner: Callable[[], Awaitable[Dict]], session: Optional[str] = None,
+			   key: Optional[Hashable] = None, webhook: Optional[str] = None) -> str:
+		"""Queue a job; if session is given, its progress is pushed to that session's event stream.
+
+		A key (e.g. client plus question) makes the job findable with active(), from any worker, until it finishes.
+		"""
+		store = get_store()
+		store.job_purge(time.time() - get_config().job_retention_seconds)
+		job_id = uuid.uuid4().hex
+		store.job_create(job_id, kind)
+		if session:
+			self._sessions[job_id] = session
+		if webhook:
+			self._webhooks[job_id] = webhook
+		if key is not None:
+			store.job_key_set(_key_digest(key), job_id)
+		self._done_events[job_id] = asyncio.Event()
+		self._tasks[job_id] = asyncio.create_task(self._run(job_id, runner, key), name=f"job-{job_id}")
+		track_task(self._tasks[job_id], f"{kind} job queued")
+		return job_id
+
+	def _set_status(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+		get_store().job_update(job_id, status, result=result, error=error)
+		session = self._sessions.get(job_id)
+		if session is not None:
+			get_hub().publish(session, "job", {"job_id": job_id, "status": status, "result": result, "error": error})
+
+	async def _run(self, job_id: str, runner: Callable[[], Awaitable[Dict]], key: Optional[Hashable]) -> None:
+		store = get_store()
+		try:
+			async with self._slots:
+				if store.job_get(job_id)["cancel_requested"]:
+					raise asyncio.CancelledError()
+				self._set_status(job_id, "running")
+				work = asyncio.ensure_future(runner())
+				track_task(work, "job running")
+				try:
+					while not work.done():
+						await asyncio.wait({work}, timeout=_CANCEL_CHECK_INTERVAL)
+						if not work.done() and store.job_get(job_id)["cancel_requested"]:
+							work.cancel()
+					result = work.result()
+				except asyncio.CancelledError:
+					work.cancel()
+					raise
+				self._set_status(job_id, "done", result=result)
+		except asyncio.CancelledError:
+			metrics.incr("jobs_cancelled")
+			self._set_status(job_id, "cancelled")
+		except Exception as e:
+			self._set_status(job_id, "failed", error=f"{type(e).__name__}: {e}")
+		finally:
+			self._tasks.pop(job_id, None)
+			self._sessions.pop(job_id, None)
+			webhook = self._webhooks.pop(job_id, None)
+			if webhook is not None:
+				delivery = asyncio.create_task(_deliver_webhook(webhook, store.job_get(job_id)))
+				self._deliveries.add(delivery)
+				delivery.add_done_callback(self._deliveries.discard)
+				track_task(delivery, "job webhook")
+			if key is not None:
+				store.job_key_delete(_key_digest(key), job_id)
+			event = self._done_events.pop(job_id, None)
+			if event is not None:
+				event.set()
+
+	def get(self, job_id: str) -> Optional[Dict]:
+		return get_store().job_get(job_id)
+
+	async def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+		"""Long-poll: return once the job has finished or timeout seconds have passed"""
+		deadline = time.monotonic() + timeout
+		event = self._done_events.get(job_id)
+		if event is not None:
+			try:
+				await asyncio.wait_for(event.wait(), timeout)
+			except asyncio.TimeoutError:
+				pass
+			return self.get(job_id)
+		job = self.get(job_id)
+		while job is not None and job["status"] not in FINISHED_STATES and time.monotonic() < deadline:
+			await asyncio.sleep(_POLL_INTERVAL)
+			job = self.get(job_id)
+		return job
+
+	async def cancel(self, job_id: str) -> Optional[Dict]:
+		"""Cancel a job; a running model request is aborted, which frees the backend"""
+		job = self.get(job_id)
+		if job is None or job["status"] in FINISHED_STATES:
+			return job
+		get_store().job_request_cancel(job_id)
+		task = self._tasks.get(job_id)
+		if task is not None:
+			task.cancel()
+		return await self.wait(job_id, _CANCEL_SETTLE_TIMEOUT)
+
+
+_jobs_singleton: Optional[JobManager] = None
+
+
+def get_jobs() -> JobManager:
+	global _jobs_singleton
+	if _jobs_singleton is None:
+		_jobs_singleton = JobManager(get_config().job_concurrency)
+	return _jobs_singleton
@@ -0,0 +1,49 @@
+import argparse
+import os
+
+import psutil
+import uvicorn
+
+from app.threads import WORKERS_ENV, available_cores
+
+
+# Rough resident memory per uvicorn worker (GB): the API process itself plus
+# one PaddleOCR instance, which every worker loads lazily on its first image.
+WORKER_BASE_GB = 0.25
+OCR_WORKER_GB = 1.5
+
+
+def recommended_workers(reserve_gb: float = 2.0, with_ocr: bool = True) -> int:
+	"""Size the worker count to the cores we may use and the memory left after reserve_gb."""
+	per_worker_gb = WORKER_BASE_GB + (OCR_WORKER_GB if with_ocr else 0.0)
+	available_gb = psutil.virtual_memory().available / (1024**3) - reserve_gb
+	by_memory = int(available_gb // per_worker_gb)
+	return max(1, min(available_cores(), by_memory))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Run HelperAI with multiple uvicorn workers")
+	parser.add_argument("--host", default="0.0.0.0")
+	parser.add_argument("--port", type=int, default=8000)
+	parser.add_argument("--workers", type=int, default=0, help="0 = size to cores and memory")
+	parser.add_argument("--reserve-gb", type=float, default=2.0,
+						help="Memory to leave free for the OS and other processes")
+	parser.add_argument("--profile", choices=["full", "text"], default="full",
+						help="'text' serves only text questions and never loads PaddleOCR")
+	args = parser.parse_args()
+
+	# Workers inherit the environment, so this selects their profile too
+	os.environ["HELPERAI_PROFILE"] = args.profile
+	with_ocr = args.profile != "text"
+	per_worker_gb = WORKER_BASE_GB + (OCR_WORKER_GB if with_ocr else 0.0)
+	workers = args.workers or recommended_workers(args.reserve_gb, with_ocr)
+	# Lets each worker size its OCR thread pools to its share of the cores
+	os.environ[WORKERS_ENV] = str(workers)
+	print(f"Starting {workers} '{args.profile}' worker(s) on {args.host}:{args.port} "
+		  f"({available_cores()} cores, ~{per_worker_gb:.2f} GB per worker)")
+	# A recycled worker stops on SIGTERM; don't let open event streams hold it forever
+	uvicorn.run("app.main:app", host=args.host, port=args.port, workers=workers, timeout_graceful_shutdown=10)
+
+
+if __name__ == "__main__":
+	main()
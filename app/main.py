@@ -1,22 +1,41 @@
 import asyncio
-import base64
-from typing import Optional
+import io
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
 
-from fastapi import FastAPI, UploadFile, File, Form, Body
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import ValidationError
 import socket
-import qrcode
-import psutil
 
-from app.schemas import MCQRequest, FreeformRequest, MCQResponse, FreeformResponse
-from app.models import run_mcq_model, run_freeform_model, run_mcq_with_ocr
-from app.config import get_config
-from app.ocr import image_to_text_lines, parse_mcq_from_lines, preprocess_remove_watermark
+from app.schemas import MCQRequest, FreeformRequest, JobStatus, BankEntryRequest
+from app.config import RuntimeConfig, get_config, update_config, ocr_available, PROFILE
+from app.pipeline import parse_image, solve_text, solve_image, solve_freeform
+from app.segment import QuestionSegment
+from app.jobs import get_jobs, webhook_allowed
+from app.qbank import get_bank
+from app.events import get_hub
+from app import metrics, debug
+from app.static import StaticAsset
+from app.uploads import UploadLimitMiddleware, spool_upload
+from app.resilience import Deadline, DeadlineExceeded, BackendUnavailable, breaker_states
+from app.threads import current_budget
+from app.watchdog import all_workers, get_watchdog, start_watchdog
+from app.fairness import RateLimited, current_client, get_inflight, get_limiter, get_usage
+from app.resultlog import close_result_log
+from app.residency import get_residency
+from app.models import generation_busy
 
 
+# Module loggers (app.*) print next to uvicorn's own log lines; uvicorn only configures its own loggers
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(name)s - %(message)s")
+
 app = FastAPI(title="HelperAI - DeepSeek R1 MCQ Solver")
 
+app.add_middleware(UploadLimitMiddleware)
 app.add_middleware(
 	CORSMiddleware,
 	allow_origins=["*"],
@@ -26,6 +45,18 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def start_monitors():
+	debug.start_loop_monitor()
+	start_watchdog(busy=lambda: get_jobs().active_count() + len(get_inflight()))
+	get_residency().start_preloader(busy=generation_busy)
+
+
+@app.on_event("shutdown")
+async def flush_result_log():
+	await asyncio.to_thread(close_result_log)
+
+
 INDEX_HTML = """
 <!doctype html>
 <html>
@@ -50,7 +81,12 @@ INDEX_HTML = """
   </style>
   <script>
     let ocrTimer = null;
-    let autoRefreshTimer = null;
+    const sessionId = localStorage.getItem('helperaiSession') || (() => {
+      const id = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : String(Math.random()).slice(2);
+      localStorage.setItem('helperaiSession', id);
+      return id;
+    })();
+    let eventSource = null;
     
     async function submitText(event) {
       event.preventDefault();
@@ -58,7 +94,7 @@ INDEX_HTML = """
       const opts = Array.from(document.querySelectorAll('.opt')).map(i => i.value).filter(x => x.trim().length);
       const resBox = document.getElementById('result');
       resBox.textContent = 'Running...';
-      const resp = await fetch('/api/answer_text', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({question: q, options: opts})});
+      const resp = await fetch('/api/answer_text', {method:'POST', headers:{'Content-Type':'application/json', 'X-Session-Id': sessionId}, body: JSON.stringify({question: q, options: opts})});
       const data = await resp.json();
       resBox.textContent = JSON.stringify(data, null, 2);
       if (data && data.final_answer) { markCorrectInputs(data.final_answer); }
@@ -72,7 +108,7 @@ INDEX_HTML = """
       fd.append('image', file);
       const resBox = document.getElementById('result');
       resBox.textContent = 'Uploading and running OCR...';
-      const resp = await fetch('/api/answer_image', {method:'POST', body: fd});
+      const resp = await fetch('/api/answer_image', {method:'POST', headers:{'X-Session-Id': sessionId}, body: fd});
       const data = await resp.json();
       resBox.textContent = JSON.stringify(data, null, 2);
       if (data && data.final_answer) { markCorrectInputs(data.final_answer); }
@@ -85,7 +121,7 @@ INDEX_HTML = """
       ocrTimer = setTimeout(() => {
         const fd = new FormData();
         fd.append('image', file);
-        fetch('/api/answer_image', {method:'POST', body: fd}).then(r => r.json()).then(data => {
+        fetch('/api/answer_image', {method:'POST', headers:{'X-Session-Id': sessionId}, body: fd}).then(r => r.json()).then(data => {
           document.getElementById('result').textContent = JSON.stringify(data, null, 2);
           if (data && data.final_answer) { markCorrectInputs(data.final_answer); }
         });
@@ -97,7 +133,7 @@ INDEX_HTML = """
       const q = document.getElementById('freeq').value;
       const out = document.getElementById('freeout');
       out.textContent = 'Running...';
-      const resp = await fetch('/api/answer_freeform', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({question: q})});
+      const resp = await fetch('/api/answer_freeform', {method:'POST', headers:{'Content-Type':'application/json', 'X-Session-Id': sessionId}, body: JSON.stringify({question: q})});
       out.textContent = JSON.stringify(await resp.json(), null, 2);
     }
 
@@ -113,20 +149,32 @@ INDEX_HTML = """
       });
     }
 
-    function startAutoRefresh() {
-      if (autoRefreshTimer) clearInterval(autoRefreshTimer);
-      autoRefreshTimer = setInterval(() => {
-        location.reload();
-      }, 45000); // 45 seconds as per requirement
-      document.getElementById('autoRefreshStatus').textContent = 'Auto-refresh enabled (45s)';
+    function startLiveUpdates() {
+      if (eventSource) eventSource.close();
+      // Results and status changes are pushed by the server; no page reloads
+      eventSource = new EventSource('/api/events?session=' + encodeURIComponent(sessionId));
+      eventSource.addEventListener('result', e => {
+        const msg = JSON.parse(e.data);
+        if (msg.kind === 'freeform') {
+          document.getElementById('freeout').textContent = JSON.stringify(msg.result, null, 2);
+          return;
+        }
+        document.getElementById('result').textContent = JSON.stringify(msg.result, null, 2);
+        const final = msg.result.final_answer || (msg.result.result || {}).final_answer;
+        if (final) { markCorrectInputs(final); }
+      });
+      eventSource.addEventListener('status', e => {
+        document.getElementById('serverStatus').textContent = JSON.stringify(JSON.parse(e.data));
+      });
+      document.getElementById('liveStatus').textContent = 'Live updates enabled';
     }
 
-    function stopAutoRefresh() {
-      if (autoRefreshTimer) {
-        clearInterval(autoRefreshTimer);
-        autoRefreshTimer = null;
+    function stopLiveUpdates() {
+      if (eventSource) {
+        eventSource.close();
+        eventSource = null;
       }
-      document.getElementById('autoRefreshStatus').textContent = 'Auto-refresh disabled';
+      document.getElementById('liveStatus').textContent = 'Live updates disabled';
     }
   </script>
 </head>
@@ -137,9 +185,10 @@ INDEX_HTML = """
     
     <div class="status">
       <strong>Model:</strong> deepseek-r1:70b-llama-distill-q4_K_M<br>
-      <strong>Auto-refresh:</strong> <span id="autoRefreshStatus">Disabled</span><br>
-      <button class="btn" onclick="startAutoRefresh()">Enable Auto-refresh</button>
-      <button class="btn" onclick="stopAutoRefresh()">Disable Auto-refresh</button>
+      <strong>Live updates:</strong> <span id="liveStatus">Disabled</span><br>
+      <span id="serverStatus" class="muted"></span><br>
+      <button class="btn" onclick="startLiveUpdates()">Enable Live Updates</button>
+      <button class="btn" onclick="stopLiveUpdates()">Disable Live Updates</button>
     </div>
 
     <div class="row">
@@ -188,68 +237,349 @@ INDEX_HTML = """
 """
 
 
+INDEX_PAGE = StaticAsset(INDEX_HTML.encode("utf-8"), "text/html; charset=utf-8")
+
+
 @app.get("/", response_class=HTMLResponse)
-async def index() -> str:
-	return INDEX_HTML
+async def index(request: Request) -> Response:
+	return INDEX_PAGE.response(request)
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+	metrics.incr("deadlines_exceeded")
+	return JSONResponse({"error": str(exc)}, status_code=504)
+
+
+@app.exception_handler(BackendUnavailable)
+async def backend_unavailable_handler(request: Request, exc: BackendUnavailable):
+	metrics.incr("breaker_rejections")
+	return JSONResponse({"error": str(exc)}, status_code=503)
+
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+	return JSONResponse({"error": str(exc)}, status_code=429,
+						headers={"Retry-After": str(max(1, round(exc.retry_after)))})
+
+
+def _request_deadline(request: Request) -> Deadline:
+	"""Deadline for this request: the configured budget, or less if the client asks via X-Request-Timeout"""
+	budget = get_config().request_timeout_seconds
+	try:
+		budget = min(budget, float(request.headers.get("x-request-timeout", budget)))
+	except ValueError:
+		pass
+	return Deadline(budget)
+
+
+def _job_deadline() -> Deadline:
+	return Deadline(get_config().job_timeout_seconds)
+
+
+# How often a waiting request checks whether its client is still connected (seconds)
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+def _require_ocr() -> None:
+	if not ocr_available():
+		raise HTTPException(status_code=503, detail="Image questions are disabled in the text-only profile")
+
+
+def _session(request: Request) -> Optional[str]:
+	return request.headers.get("x-session-id") or None
+
+
+def _client_ip(request: Request) -> str:
+	return request.client.host if request.client else "unknown"
+
+
+def _client(request: Request) -> str:
+	"""Who the request counts against for fair queuing and usage: its session, else its IP"""
+	client = _session(request) or _client_ip(request)
+	current_client.set(client)
+	return client
+
+
+def _take_token(request: Request, client: str, discard=None) -> None:
+	"""Spend a rate-limit token of the request's IP.
+
+	Sessions are chosen by the client, so rotating X-Session-Id must not get a fresh bucket.
+	"""
+	try:
+		get_limiter().take(_client_ip(request))
+	except RateLimited:
+		get_usage().add(client, "rate_limited")
+		if discard is not None:
+			discard()
+		raise
+
+
+def _refuse_if_draining(discard=None) -> None:
+	watchdog = get_watchdog()
+	if watchdog is not None and watchdog.draining:
+		# Being recycled: let the client retry, most likely on another worker
+		if discard is not None:
+			discard()
+		raise HTTPException(status_code=503, detail="Worker is restarting; retry", headers={"Retry-After": "1"})
+
+
+async def _admit(request: Request, kind: str, key, factory, discard=None):
+	"""Rate-limit a submission, or join the identical one this client already has in flight"""
+	_refuse_if_draining(discard)
+	client = _client(request)
+	flight_key = (client, kind, key)
+	if not get_inflight().running(flight_key):
+		_take_token(request, client, discard)
+	get_usage().add(client, "requests")
+	return await get_inflight().run(flight_key, factory, discard)
+
+
+def _submit_job(request: Request, kind: str, key, runner, discard=None, webhook: Optional[str] = None) -> JSONResponse:
+	"""Queue a job, or return the identical one this client already has queued or running"""
+	_refuse_if_draining(discard)
+	if webhook is not None and not webhook_allowed(webhook):
+		if discard is not None:
+			discard()
+		raise HTTPException(status_code=400, detail="Webhook URL is not allowed (see job_webhook_hosts)")
+	client = _client(request)
+	jobs = get_jobs()
+	job_id = jobs.active((client, kind, key))
+	if job_id is None:
+		_take_token(request, client, discard)
+		job_id = jobs.submit(kind, runner, session=_session(request), key=(client, kind, key), webhook=webhook)
+	else:
+		metrics.incr("duplicates_collapsed")
+		get_usage().add(client, "duplicates_collapsed")
+		if discard is not None:
+			discard()
+	get_usage().add(client, "requests")
+	return _job_response(jobs.get(job_id))
+
+
+async def _until_disconnect(request: Request, kind: str, coro) -> Response:
+	"""Await coro, cancelling it (and the model/OCR work it started) if the client goes away.
+
+	The result is also pushed to the caller's session event stream, if it has one.
+	"""
+	work = asyncio.ensure_future(coro)
+	debug.track_task(work, f"{kind} request")
+	try:
+		while True:
+			done, _ = await asyncio.wait({work}, timeout=DISCONNECT_POLL_INTERVAL)
+			if done:
+				result = work.result()
+				session = _session(request)
+				if session is not None:
+					get_hub().publish(session, "result", {"kind": kind, "result": result})
+				return JSONResponse(result)
+			if await request.is_disconnected():
+				work.cancel()
+				await asyncio.wait({work})
+				metrics.incr("requests_cancelled")
+				# Nobody is listening; 499 is the conventional "client closed request" code
+				return Response(status_code=499)
+	finally:
+		if not work.done():
+			work.cancel()
 
 
 @app.post("/api/answer_text")
-async def answer_text(req: MCQRequest):
+async def answer_text(req: MCQRequest, request: Request):
 	"""Handle text-based MCQ questions"""
-	response = await run_mcq_model(req.question, req.options)
-	return JSONResponse(MCQResponse(
-		final_answer=response.answer,
-		explanation=response.explanation,
-		confidence=response.confidence,
-		model=response.model_name,
-		per_model=[response]
-	).model_dump())
+	return await _until_disconnect(request, "text", _admit(
+		request, "text", (req.question, tuple(req.options)),
+		lambda: solve_text(req.question, req.options, _request_deadline(request))))
 
 
 @app.post("/api/answer_image")
-async def answer_image(image: UploadFile = File(...), remove_watermark: Optional[bool] = Form(False)):
+async def answer_image(request: Request, image: UploadFile = File(...), remove_watermark: Optional[bool] = Form(False)):
 	"""Handle image uploads - OCR to text then process with model"""
-	data = await image.read()
-	image_b64 = base64.b64encode(data).decode("utf-8")
-	
-	# Preprocess image to remove watermarks if requested
-	if remove_watermark:
+	_require_ocr()
+	upload, digest = await spool_upload(image)
+	deadline = _request_deadline(request)
+
+	async def run():
+		# The upload belongs to the shared task: a duplicate request may still be waiting on it
 		try:
-			image_b64 = preprocess_remove_watermark(image_b64)
-		except Exception:
-			pass
-	
-	# Extract text using OCR
-	lines = image_to_text_lines(image_b64)
-	question, options = parse_mcq_from_lines(lines)
-	
-	# Run the model with OCR-extracted text
-	response = await run_mcq_with_ocr(question, options)
-	
-	return JSONResponse({
-		"question": question,
-		"options": options,
-		"result": MCQResponse(
-			final_answer=response.answer,
-			explanation=response.explanation,
-			confidence=response.confidence,
-			model=response.model_name,
-			per_model=[response]
-		).model_dump()
-	})
+			return await solve_image(upload, digest, bool(remove_watermark), deadline)
+		finally:
+			upload.close()
+
+	return await _until_disconnect(request, "image", _admit(
+		request, "image", (digest, bool(remove_watermark)), run, discard=upload.close))
+
+
+def _speculate(request: Request, segment: QuestionSegment) -> Optional[str]:
+	"""Start answering an OCR-parsed question before the user has confirmed its text.
+
+	The job is keyed like a /api/jobs/text submission from the same client, so
+	submitting the unchanged text joins it instead of generating twice. It runs
+	on the OCR path (compacted prompt) and costs a rate-limit token like any
+	other generation; without one, the question is returned with no job.
+	"""
+	if not segment.question or not segment.options or not 2 <= len(segment.options) <= 12:
+		return None  # not a valid text request; the user has to fix it first
+	question, options = segment.question, segment.options
+	client = _client(request)
+	key = (client, "text", (question, tuple(options)))
+	jobs = get_jobs()
+	job_id = jobs.active(key)
+	if job_id is None:
+		try:
+			_take_token(request, client)
+		except RateLimited:
+			return None
+		job_id = jobs.submit("text", lambda: solve_text(question, options, _job_deadline(), ocr=True), key=key)
+		metrics.incr("speculative_jobs")
+	return job_id
+
+
+@app.post("/api/parse_image")
+async def parse_image_request(request: Request, image: UploadFile = File(...), remove_watermark: Optional[bool] = Form(False)):
+	"""Two-phase image flow: return the OCR-parsed questions as soon as OCR is done.
+
+	Each question comes with the id of a text job already answering it. If the
+	user confirms the text, POST it to /api/jobs/text (same X-Session-Id) to
+	get that same job back; if they edit it, that starts a new job, and the
+	speculative one should be cancelled with DELETE /api/jobs/{id}.
+	"""
+	_require_ocr()
+	upload, digest = await spool_upload(image)
+	deadline = _request_deadline(request)
+
+	async def run():
+		try:
+			segments = await parse_image(upload, digest, bool(remove_watermark), deadline)
+		finally:
+			upload.close()
+		questions = [{"number": s.number, "question": s.question, "options": s.options, "job_id": _speculate(request, s)}
+					 for s in segments]
+		return {"question": questions[0]["question"], "options": questions[0]["options"], "questions": questions}
+
+	return await _until_disconnect(request, "parse", _admit(
+		request, "parse", (digest, bool(remove_watermark)), run, discard=upload.close))
 
 
 @app.post("/api/answer_freeform")
-async def answer_freeform(req: FreeformRequest):
+async def answer_freeform(req: FreeformRequest, request: Request):
 	"""Handle freeform questions with detailed thought process"""
-	response = await run_freeform_model(req.question)
-	return JSONResponse(FreeformResponse(
-		final_answer=response.answer,
-		explanation=response.explanation,
-		thought_process=response.thought_process or "",
-		confidence=response.confidence,
-		model=response.model_name
-	).model_dump())
+	return await _until_disconnect(request, "freeform", _admit(
+		request, "freeform", req.question, lambda: solve_freeform(req.question, _request_deadline(request))))
+
+
+def _job_response(job: Optional[Dict]) -> JSONResponse:
+	if job is None:
+		return JSONResponse({"error": "Job not found"}, status_code=404)
+	return JSONResponse(JobStatus.model_validate(job).model_dump())
+
+
+@app.post("/api/jobs/text")
+async def submit_text_job(req: MCQRequest, request: Request, webhook: Optional[str] = Query(None)):
+	"""Queue a text MCQ question; returns a job id immediately"""
+	return _submit_job(request, "text", (req.question, tuple(req.options)),
+					   lambda: solve_text(req.question, req.options, _job_deadline()), webhook=webhook)
+
+
+@app.post("/api/jobs/image")
+async def submit_image_job(request: Request, image: UploadFile = File(...), remove_watermark: Optional[bool] = Form(False),
+						   webhook: Optional[str] = Query(None)):
+	"""Queue an image question (OCR + model); returns a job id immediately"""
+	_require_ocr()
+	upload, digest = await spool_upload(image)
+
+	async def run():
+		try:
+			return await solve_image(upload, digest, bool(remove_watermark), _job_deadline())
+		finally:
+			upload.close()
+
+	return _submit_job(request, "image", (digest, bool(remove_watermark)), run, discard=upload.close, webhook=webhook)
+
+
+@app.post("/api/jobs/freeform")
+async def submit_freeform_job(req: FreeformRequest, request: Request, webhook: Optional[str] = Query(None)):
+	"""Queue a freeform question; returns a job id immediately"""
+	return _submit_job(request, "freeform", req.question, lambda: solve_freeform(req.question, _job_deadline()),
+					   webhook=webhook)
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str, wait: float = Query(0.0, ge=0.0, le=60.0)):
+	"""Job status and result; with wait > 0 this long-polls until the job finishes"""
+	if wait > 0:
+		return _job_response(await get_jobs().wait(job_id, wait))
+	return _job_response(get_jobs().get(job_id))
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+	return _job_response(await get_jobs().cancel(job_id))
+
+
+@app.post("/api/bank")
+async def add_bank_entry(request: Request, req: BankEntryRequest):
+	"""Store a verified answer in the question bank.
+
+	Needs the debug token: verified entries are served as answers to every
+	client without going through the model.
+	"""
+	_require_debug(request)
+	entry_id = get_bank().add(req.question, req.options, req.answer, req.explanation, verified=True, source="api")
+	if entry_id is None:
+		return JSONResponse({"error": "Answer letter does not match an option"}, status_code=400)
+	return JSONResponse({"id": entry_id, "size": len(get_bank())})
+
+
+@app.get("/api/events")
+async def events(session: str = Query(..., min_length=1, max_length=128)):
+	"""Server-sent event stream of results, job progress and status changes for one session"""
+	return StreamingResponse(
+		get_hub().stream(session),
+		media_type="text/event-stream",
+		headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+	)
+
+
+def _require_debug(request: Request) -> None:
+	# 404 rather than 403 when disabled, so the endpoints are not advertised
+	if not debug.DEBUG_TOKEN:
+		raise HTTPException(status_code=404)
+	if request.headers.get("x-debug-token") != debug.DEBUG_TOKEN:
+		raise HTTPException(status_code=403, detail="Bad debug token")
+
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = Query(5.0, gt=0, le=debug.MAX_PROFILE_SECONDS)):
+	"""Sample all threads (event loop, OCR executor, ...) for N seconds; returns collapsed stacks for a flamegraph"""
+	_require_debug(request)
+	stacks = await asyncio.to_thread(debug.sample_stacks, seconds)
+	return PlainTextResponse(stacks)
+
+
+@app.get("/debug/tasks")
+async def debug_tasks(request: Request):
+	"""In-flight asyncio tasks with their stage and age, oldest first"""
+	_require_debug(request)
+	return JSONResponse({"tasks": debug.task_listing()})
+
+
+@app.get("/debug/loop")
+async def debug_loop(request: Request):
+	"""Event-loop lag and the stacks of recent calls that blocked it"""
+	_require_debug(request)
+	return JSONResponse(debug.loop_report())
+
+
+@app.get("/api/usage")
+async def usage(request: Request):
+	"""Per-client usage on this worker: requests, rate-limited, collapsed duplicates, OCR and model seconds.
+
+	Needs the debug token: the client keys are session ids, which are all
+	/api/events checks before streaming a session's results.
+	"""
+	_require_debug(request)
+	return JSONResponse({"worker_pid": os.getpid(), "clients": get_usage().snapshot()})
 
 
 @app.get("/config")
@@ -258,16 +588,44 @@ async def get_runtime_config():
 	return JSONResponse(cfg.model_dump())
 
 
+@app.post("/config")
+async def set_runtime_config(request: Request, new_cfg: Dict = Body(...)):
+	"""Update the runtime config; the change is shared with every worker process.
+
+	Needs the debug token: the config holds the rate limits, the webhook
+	allow-list and file paths.
+	"""
+	_require_debug(request)
+	unknown = sorted(set(new_cfg) - set(RuntimeConfig.model_fields))
+	if unknown:
+		return JSONResponse({"error": f"Unknown config fields: {', '.join(unknown)}"}, status_code=400)
+	try:
+		merged = RuntimeConfig.model_validate({**get_config().model_dump(), **new_cfg})
+	except ValidationError as e:
+		return JSONResponse({"error": str(e)}, status_code=400)
+	cfg = update_config(merged.model_dump())
+	get_hub().publish(None, "status", {"config": new_cfg})
+	return JSONResponse(cfg.model_dump())
+
+
 @app.get("/status")
 async def status():
-	vm = psutil.virtual_memory()
+	"""Served from the watchdog's background sample; nothing is measured per request"""
+	watchdog = get_watchdog()
+	sample = watchdog.snapshot() if watchdog is not None else {}
 	return JSONResponse({
-		"memory": {
-			"total_gb": round(vm.total / (1024**3), 2),
-			"used_gb": round(vm.used / (1024**3), 2),
-			"available_gb": round(vm.available / (1024**3), 2),
-			"percent": vm.percent,
-		},
+		"worker_pid": os.getpid(),
+		"profile": PROFILE,
+		"metrics": metrics.snapshot(),
+		"backends": breaker_states(),
+		"event_subscribers": get_hub().subscriber_count(),
+		"question_bank_size": len(get_bank()),
+		"thread_budget": current_budget(),
+		"models": get_residency().snapshot(),
+		"memory": sample.get("system"),
+		"worker": sample.get("worker"),
+		"workers": list((watchdog.workers() if watchdog is not None else all_workers()).values()),
+		"sampled_at": sample.get("sampled_at"),
 		"config": get_config().model_dump(),
 	})
 
@@ -290,6 +648,7 @@ MOBILE_HTML = """
     .opts { margin-top: 10px; }
     .opt { padding: 8px; border: 1px solid #e5e7eb; border-radius: 8px; margin-bottom:6px; }
     .opt.correct { background: #e6ffe6; border-color: #22c55e; }
+    .opt input { width: 85%; border: none; background: transparent; font-size: 1rem; }
     .muted { color:#666; font-size: 0.9rem; }
     .status { padding: 8px; border-radius: 6px; margin: 8px 0; background: #e3f2fd; border: 1px solid #2196f3; }
     .camera-controls { display: flex; flex-direction: column; gap: 10px; }
@@ -301,12 +660,23 @@ MOBILE_HTML = """
   </style>
   <script>
     let lastFile = null;
-    let autoRefreshTimer = null;
+    const sessionId = localStorage.getItem('helperaiSession') || (() => {
+      const id = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : String(Math.random()).slice(2);
+      localStorage.setItem('helperaiSession', id);
+      return id;
+    })();
+    let eventSource = null;
     
     function letters(n){ return Array.from({length:n}, (_,i)=>String.fromCharCode(65+i)); }
 
+    // Two-phase image flow: the questions parsed from the screenshot and the
+    // jobs answering them (started speculatively by /api/parse_image)
+    let parsed = [];
+    let currentJobs = [];
+
     function renderParsed(q, opts){
-      document.getElementById('parsedq').textContent = q || '';
+      document.getElementById('parsedq').value = q || '';
+      document.getElementById('reanswer').style.display = 'none';
       const cont = document.getElementById('opts');
       cont.innerHTML = '';
       if (!opts || !opts.length) return;
@@ -315,11 +685,27 @@ MOBILE_HTML = """
         const div = document.createElement('div');
         div.className = 'opt';
         div.id = 'opt_'+ls[i];
-        div.textContent = ls[i]+'. '+t;
+        const input = document.createElement('input');
+        input.type = 'text';
+        input.value = t;
+        input.oninput = markEdited;
+        div.append(ls[i]+'. ', input);
         cont.appendChild(div);
       });
     }
 
+    function editedText(){
+      return {
+        question: document.getElementById('parsedq').value.trim(),
+        options: Array.from(document.querySelectorAll('#opts input')).map(el => el.value.trim()).filter(Boolean),
+      };
+    }
+
+    function markEdited(){
+      // Fixing the OCR text: offer to answer the corrected question instead
+      document.getElementById('reanswer').style.display = parsed.length ? 'inline-block' : 'none';
+    }
+
     function markCorrect(finalCombo){
       const parts = String(finalCombo||'').replace(/\\s+/g,'').split('+').filter(Boolean);
       document.querySelectorAll('.opt').forEach(el=>el.classList.remove('correct'));
@@ -329,45 +715,171 @@ MOBILE_HTML = """
       });
     }
 
+    function showImageResult(data, keepParsed) {
+      const out = document.getElementById('out');
+      const explain = document.getElementById('explain');
+      // Autofill parsed, unless the user is looking at (and maybe editing) it already
+      if (!keepParsed) renderParsed(data.question, data.options);
+      // Mark correct
+      const result = data.result || {};
+      markCorrect(result.final_answer || '');
+      // Show explanation; a screenshot with several questions gets one answer per question
+      const questions = data.questions || [];
+      if (questions.length > 1) {
+        explain.textContent = questions.map((q, i) => (q.number || i + 1) + '. ' +
+          (q.result ? q.result.final_answer + ' - ' + (q.result.explanation || '') : (q.error || 'no answer'))).join('\\n\\n');
+      } else {
+        explain.textContent = result.explanation || '';
+      }
+      out.textContent = JSON.stringify(data, null, 2);
+    }
+
+    async function pollJob(jobId) {
+      const out = document.getElementById('out');
+      localStorage.setItem('helperaiJob', jobId);
+      while (true) {
+        let job;
+        try {
+          const resp = await fetch('/api/jobs/' + jobId + '?wait=25');
+          if (resp.status === 404) { localStorage.removeItem('helperaiJob'); return; }
+          job = await resp.json();
+        } catch (e) {
+          // Network dropped; the job keeps running server-side, retry shortly
+          out.textContent = 'Connection lost, retrying...';
+          await new Promise(r => setTimeout(r, 2000));
+          continue;
+        }
+        if (job.status === 'done') {
+          localStorage.removeItem('helperaiJob');
+          showImageResult(job.result || {});
+          return;
+        }
+        if (job.status === 'failed' || job.status === 'cancelled') {
+          localStorage.removeItem('helperaiJob');
+          out.textContent = 'Job ' + job.status + (job.error ? ': ' + job.error : '');
+          return;
+        }
+        out.textContent = 'Processing (' + job.status + ')...';
+      }
+    }
+
+    async function waitJob(jobId) {
+      while (true) {
+        try {
+          const resp = await fetch('/api/jobs/' + jobId + '?wait=25');
+          if (resp.status === 404) return { status: 'failed', error: 'Job not found' };
+          const job = await resp.json();
+          if (['done', 'failed', 'cancelled'].includes(job.status)) return job;
+        } catch (e) {
+          await new Promise(r => setTimeout(r, 2000));  // network dropped; the job keeps running
+        }
+      }
+    }
+
+    async function answerParsed() {
+      const jobIds = currentJobs;
+      document.getElementById('out').textContent = 'Answering...';
+      const jobs = await Promise.all(jobIds.map(id => id ? waitJob(id) :
+        Promise.resolve({ status: 'failed', error: 'question or options not recognized; edit them and answer again' })));
+      if (jobIds !== currentJobs) return;  // superseded by an edit
+      const questions = parsed.map((q, i) => Object.assign({}, q, jobs[i].status === 'done'
+        ? { result: jobs[i].result } : { error: 'Job ' + jobs[i].status + (jobs[i].error ? ': ' + jobs[i].error : '') }));
+      showImageResult({ question: questions[0].question, options: questions[0].options,
+                        result: questions[0].result, questions }, true);
+    }
+
+    async function submitEdited() {
+      const edited = editedText();
+      if (!edited.question || edited.options.length < 2) { alert('Enter the question and at least two options'); return; }
+      const out = document.getElementById('out');
+      // Unchanged text gets the speculative job back; edited text starts a new one
+      const resp = await fetch('/api/jobs/text', { method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-Session-Id': sessionId }, body: JSON.stringify(edited) });
+      const job = await resp.json();
+      if (!resp.ok) { out.textContent = job.error || job.detail || ('Error ' + resp.status); return; }
+      const previous = currentJobs[0];
+      if (previous && previous !== job.job_id) { await fetch('/api/jobs/' + previous, { method: 'DELETE' }); }
+      document.getElementById('reanswer').style.display = 'none';
+      parsed[0] = Object.assign({}, parsed[0], edited);
+      currentJobs = [job.job_id].concat(currentJobs.slice(1));
+      await answerParsed();
+    }
+
+    // Longest side sent to the server; OCR gains nothing from full camera resolution
+    const UPLOAD_MAX_SIDE = 1600;
+
+    async function compressImage(file) {
+      try {
+        const bitmap = await createImageBitmap(file);
+        const scale = Math.min(1, UPLOAD_MAX_SIDE / Math.max(bitmap.width, bitmap.height));
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.round(bitmap.width * scale);
+        canvas.height = Math.round(bitmap.height * scale);
+        canvas.getContext('2d').drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+        const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.85));
+        return (blob && blob.size < file.size) ? blob : file;
+      } catch (e) {
+        return file;  // browser cannot decode it; let the server try
+      }
+    }
+
     async function sendImage(evt) {
       if (evt) evt.preventDefault();
       const file = document.getElementById('img').files[0] || lastFile;
       if (!file) { alert('Pick an image'); return; }
       lastFile = file;
       const fd = new FormData();
-      fd.append('image', file);
+      fd.append('image', await compressImage(file), 'upload.jpg');
       const rmwm = document.getElementById('rmwm') ? document.getElementById('rmwm').checked : false;
       fd.append('remove_watermark', rmwm ? 'true' : 'false');
       const out = document.getElementById('out');
       const explain = document.getElementById('explain');
-      out.textContent = 'Processing...';
+      out.textContent = 'Reading the screenshot...';
       explain.textContent = '';
-      const resp = await fetch('/api/answer_image', { method: 'POST', body: fd });
+      const previous = localStorage.getItem('helperaiJob');
+      if (previous) { await fetch('/api/jobs/' + previous, { method: 'DELETE' }); }
+      // A new screenshot: the answers still running for the previous one are not wanted
+      const stale = currentJobs.filter(Boolean);
+      currentJobs = [];
+      await Promise.all(stale.map(id => fetch('/api/jobs/' + id, { method: 'DELETE' })));
+      // Phase 1 returns the parsed questions right after OCR; their answers are already being generated
+      const resp = await fetch('/api/parse_image', { method: 'POST', headers: { 'X-Session-Id': sessionId }, body: fd });
       const data = await resp.json();
-      // Autofill parsed
+      if (!resp.ok) { out.textContent = data.error || data.detail || ('Error ' + resp.status); return; }
+      parsed = data.questions.map(q => ({ number: q.number, question: q.question, options: q.options }));
+      currentJobs = data.questions.map(q => q.job_id);
       renderParsed(data.question, data.options);
-      // Mark correct
-      const result = data.result || {};
-      markCorrect(result.final_answer || '');
-      // Show explanation
-      explain.textContent = result.explanation || '';
-      out.textContent = JSON.stringify(data, null, 2);
+      await answerParsed();
     }
 
-    function startAutoRefresh(){
-      if (autoRefreshTimer) clearInterval(autoRefreshTimer);
-      autoRefreshTimer = setInterval(()=>{
-        location.reload();
-      }, 45000); // 45 seconds as per requirement
-      document.getElementById('autoRefreshStatus').textContent = 'Auto-refresh enabled (45s)';
+    function startLiveUpdates(){
+      if (eventSource) eventSource.close();
+      // Job progress and results are pushed by the server; no page reloads
+      eventSource = new EventSource('/api/events?session=' + encodeURIComponent(sessionId));
+      eventSource.addEventListener('job', e => {
+        const job = JSON.parse(e.data);
+        if (currentJobs.includes(job.job_id)) return;  // answered through the two-phase flow
+        if (job.status === 'done') {
+          if (job.result && job.result.questions) showImageResult(job.result);
+        }
+        else { document.getElementById('out').textContent = 'Job ' + job.status + (job.error ? ': ' + job.error : ''); }
+      });
+      eventSource.addEventListener('result', e => {
+        const msg = JSON.parse(e.data);
+        if (msg.kind === 'image') { showImageResult(msg.result); }
+      });
+      eventSource.addEventListener('status', e => {
+        document.getElementById('serverStatus').textContent = JSON.stringify(JSON.parse(e.data));
+      });
+      document.getElementById('liveStatus').textContent = 'Live updates enabled';
     }
 
-    function stopAutoRefresh(){
-      if (autoRefreshTimer) {
-        clearInterval(autoRefreshTimer);
-        autoRefreshTimer = null;
+    function stopLiveUpdates(){
+      if (eventSource) {
+        eventSource.close();
+        eventSource = null;
       }
-      document.getElementById('autoRefreshStatus').textContent = 'Auto-refresh disabled';
+      document.getElementById('liveStatus').textContent = 'Live updates disabled';
     }
 
     // Camera and image handling functions
@@ -411,6 +923,9 @@ MOBILE_HTML = """
 
     // Enhanced image input handling
     document.addEventListener('DOMContentLoaded', function() {
+      // Pick up a job that was still running when the page was reloaded
+      const pending = localStorage.getItem('helperaiJob');
+      if (pending) { pollJob(pending); }
       const imgInput = document.getElementById('img');
       imgInput.addEventListener('change', function(e) {
         const file = e.target.files[0];
@@ -430,9 +945,10 @@ MOBILE_HTML = """
     </div>
     
     <div class=\"auto-refresh\">
-      <strong>Auto-refresh:</strong> <span id=\"autoRefreshStatus\">Disabled</span><br>
-      <button class=\"btn\" onclick=\"startAutoRefresh()\">Enable Auto-refresh</button>
-      <button class=\"btn secondary\" onclick=\"stopAutoRefresh()\">Disable Auto-refresh</button>
+      <strong>Live updates:</strong> <span id=\"liveStatus\">Disabled</span><br>
+      <span id=\"serverStatus\" class=\"muted\"></span><br>
+      <button class=\"btn\" onclick=\"startLiveUpdates()\">Enable Live Updates</button>
+      <button class=\"btn secondary\" onclick=\"stopLiveUpdates()\">Disable Live Updates</button>
     </div>
   </div>
 
@@ -453,10 +969,11 @@ MOBILE_HTML = """
         <button class=\"btn success\" onclick=\"sendImage(event)\">Submit</button>
       </div>
     </div>
-    <div class=\"muted\">Parsed question (from OCR):</div>
-    <div id=\"parsedq\" class=\"opt\"></div>
+    <div class=\"muted\">Parsed question (from OCR; fix it if needed):</div>
+    <textarea id=\"parsedq\" class=\"opt\" rows=\"3\" style=\"width: 100%; box-sizing: border-box;\" oninput=\"markEdited()\"></textarea>
     <div class=\"muted\" style=\"margin-top:8px;\">Options:</div>
     <div id=\"opts\" class=\"opts\"></div>
+    <button id=\"reanswer\" class=\"btn\" style=\"display: none;\" onclick=\"submitEdited()\">Answer corrected question</button>
     <div class=\"muted\" style=\"margin-top:8px;\">Explanation:</div>
     <div id=\"explain\" class=\"opt\"></div>
     <h3>Raw Result</h3>
@@ -467,7 +984,20 @@ MOBILE_HTML = """
 """
 
 
+MOBILE_PAGE = StaticAsset(MOBILE_HTML.encode("utf-8"), "text/html; charset=utf-8")
+
+# The local IP is re-detected at most this often (seconds); the QR PNG is
+# rendered once per detected IP.
+LOCAL_IP_TTL = 10.0
+_local_ip_cache: Tuple[float, str] = (0.0, "")
+_qr_cache: Optional[Tuple[str, StaticAsset]] = None
+
+
 def _get_local_ip() -> str:
+	global _local_ip_cache
+	checked_at, ip = _local_ip_cache
+	if ip and time.monotonic() - checked_at < LOCAL_IP_TTL:
+		return ip
 	s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 	try:
 		s.connect(("8.8.8.8", 80))
@@ -476,22 +1006,24 @@ def _get_local_ip() -> str:
 		ip = "127.0.0.1"
 	finally:
 		s.close()
+	_local_ip_cache = (time.monotonic(), ip)
 	return ip
 
 
 @app.get("/mobile", response_class=HTMLResponse)
-async def mobile() -> str:
-	return MOBILE_HTML
+async def mobile(request: Request) -> Response:
+	return MOBILE_PAGE.response(request)
 
 
 @app.get("/qr")
-async def qr() -> Response:
+async def qr(request: Request) -> Response:
+	global _qr_cache
 	ip = _get_local_ip()
-	url = f"http://{ip}:8000/mobile"
-	img = qrcode.make(url)
-	import io
-	buf = io.BytesIO()
-	img.save(buf, format='PNG')
-	return Response(buf.getvalue(), media_type='image/png')
-
-
+	if _qr_cache is None or _qr_cache[0] != ip:
+		import qrcode
+		url = f"http://{ip}:8000/mobile"
+		img = qrcode.make(url)
+		buf = io.BytesIO()
+		img.save(buf, format='PNG')
+		_qr_cache = (ip, StaticAsset(buf.getvalue(), 'image/png'))
+	return _qr_cache[1].response(request)
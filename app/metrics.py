@@ -0,0 +1,22 @@
+import threading
+from typing import Dict
+
+
+# Per-worker counters and gauges, reported on /status
+_values: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def incr(name: str, amount: float = 1) -> None:
+	with _lock:
+		_values[name] = _values.get(name, 0) + amount
+
+
+def set_gauge(name: str, value: float) -> None:
+	with _lock:
+		_values[name] = value
+
+
+def snapshot() -> Dict[str, float]:
+	with _lock:
+		return dict(_values)
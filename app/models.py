@@ -1,13 +1,24 @@
 import asyncio
 import base64
+import hashlib
 import json
 import re
-from typing import List, Optional
+import time
+from typing import Callable, Dict, List, Optional, Protocol
 
 import httpx
 
 from app.schemas import ModelResponse, MCQResponse, FreeformResponse
 from app.config import get_config
+from app.store import get_store
+from app import metrics
+from app.debug import set_stage
+from app.fairness import FairSemaphore, current_client, get_usage
+from app.budget import Compacted, compact_mcq, estimate_tokens
+from app.qbank import get_bank
+from app.resultlog import note_cache, record_stage
+from app.residency import get_residency, keep_alive_for
+from app.resilience import BackendUnavailable, Deadline, DeadlineExceeded, backoff_delay, get_breaker
 
 
 OLLAMA_URL = "http://127.0.0.1:11434"
@@ -22,9 +33,12 @@ OLLAMA_GEN_OPTIONS = {
 }
 
 
-def _build_mcq_prompt(question: str, options: List[str]) -> str:
-	letters = [chr(ord("A") + i) for i in range(len(options))]
-	options_block = "\n".join(f"{letters[i]}. {opt}" for i, opt in enumerate(options))
+def _options_block(options: List[str]) -> str:
+	return "\n".join(f"{chr(ord('A') + i)}. {opt}" for i, opt in enumerate(options))
+
+
+def _mcq_prompt_default(question: str, options: List[str]) -> str:
+	options_block = _options_block(options)
 	return (
 		"You are an expert MCQ solver for mathematics, programming, and complex reasoning."
 		" Solve carefully and provide a clear explanation.\n\n"
@@ -42,10 +56,38 @@ def _build_mcq_prompt(question: str, options: List[str]) -> str:
 	)
 
 
+def _mcq_prompt_concise(question: str, options: List[str]) -> str:
+	"""Answer first and no steps: fewer prompt and generated tokens"""
+	return (
+		"You are an expert MCQ solver for mathematics, programming, and complex reasoning.\n\n"
+		f"Question: {question}\n\nOptions:\n{_options_block(options)}\n\n"
+		"Choose ONLY from the options by letter. Respond exactly as:\n"
+		"ANSWER: [single letter]\n"
+		"EXPLANATION: [one or two sentences]"
+	)
+
+
+# Selected with RuntimeConfig.mcq_prompt; compare them with app.eval
+MCQ_PROMPTS: Dict[str, Callable[[str, List[str]], str]] = {
+	"default": _mcq_prompt_default,
+	"concise": _mcq_prompt_concise,
+}
+
+
+def _build_mcq_prompt(question: str, options: List[str]) -> str:
+	return MCQ_PROMPTS.get(get_config().mcq_prompt, _mcq_prompt_default)(question, options)
+
+
+def _gen_options() -> dict:
+	"""OLLAMA_GEN_OPTIONS with the config's gen_options overrides applied"""
+	return {**OLLAMA_GEN_OPTIONS, **get_config().gen_options}
+
+
 def _build_freeform_prompt(question: str) -> str:
 	return (
 		"You are an expert problem-solver for mathematics and programming."
 		" Think carefully and show your complete thought process.\n\n"
+		f"Question: {question}\n\n"
 		"Format your response as:\n"
 		"EXPLANATION: [2-line explanation]\n"
 		"ANSWER: [your final answer]\n"
@@ -53,6 +95,10 @@ def _build_freeform_prompt(question: str) -> str:
 	)
 
 
+def _cache_key(*parts) -> str:
+	return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 def _parse_mcq_response(text: str) -> dict:
 	"""Parse the structured response from the model"""
 	result = {
@@ -69,6 +115,7 @@ def _parse_mcq_response(text: str) -> dict:
 	
 	# Extract answer
 	ans_match = re.search(r"ANSWER:\s*([A-D])", text, re.IGNORECASE)
+	result["answer_found"] = ans_match is not None
 	if ans_match:
 		result["answer"] = ans_match.group(1).upper()
 	
@@ -107,73 +154,257 @@ def _parse_freeform_response(text: str) -> dict:
 	return result
 
 
-async def run_mcq_model(question: str, options: List[str], timeout_seconds: float = 30.0) -> ModelResponse:
-	"""Run the deepseek-r1:70b-llama-distill-q4_K_M model for MCQ questions"""
+# Model slots are handed out fairly across clients (see app.fairness)
+_generation_slots: Optional[FairSemaphore] = None
+
+
+class GenerationBackend(Protocol):
+	"""Something that answers an Ollama /api/generate payload with an Ollama-style response dict"""
+
+	async def generate(self, payload: dict, deadline: Deadline) -> dict:
+		...
+
+
+# None = Ollama over HTTP (with retries and the circuit breaker)
+_backend: Optional[GenerationBackend] = None
+
+
+def set_generation_backend(backend: Optional[GenerationBackend]) -> None:
+	"""Replace the model backend for this process (e.g. the eval harness's stub)"""
+	global _backend
+	_backend = backend
+
+
+def set_generation_concurrency(limit: int) -> None:
+	"""Override max_concurrent_generations for this process only (e.g. the batch CLI)"""
+	global _generation_slots
+	_generation_slots = FairSemaphore("generation", limit, get_config().model_batch_max)
+
+
+def generation_busy() -> bool:
+	"""Whether generations are running or queued in this process"""
+	return _generation_slots is not None and _generation_slots.busy()
+
+
+async def _post_generate(payload: dict, deadline: Deadline) -> dict:
+	"""One POST to Ollama, retried with jittered backoff only when the connection could not be made"""
 	cfg = get_config()
-	prompt = _build_mcq_prompt(question, options)
+	breaker = get_breaker(OLLAMA_URL, cfg.breaker_failure_threshold, cfg.breaker_reset_seconds)
+	attempt = 0
+	while True:
+		trial = breaker.before_call()
+		started = time.monotonic()
+		try:
+			async with httpx.AsyncClient(timeout=deadline.remaining()) as client:
+				resp = await deadline.run(client.post(f"{OLLAMA_URL}/api/generate", json=payload), "generation")
+			if resp.status_code < 500:
+				breaker.record_success()
+			else:
+				breaker.record_failure()
+			resp.raise_for_status()
+			return resp.json()
+		except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+			breaker.record_failure()
+			delay = backoff_delay(attempt)
+			if attempt >= cfg.generation_retries or delay >= deadline.remaining():
+				raise BackendUnavailable(f"Could not connect to the model backend: {e}") from e
+			attempt += 1
+			metrics.incr("generation_retries")
+			await asyncio.sleep(delay)
+		except (httpx.TimeoutException, DeadlineExceeded):
+			# Running out of a short client deadline says nothing about the backend;
+			# only a backend that stayed silent for breaker_timeout_seconds counts
+			if time.monotonic() - started >= cfg.breaker_timeout_seconds:
+				breaker.record_failure()
+			else:
+				breaker.record_cancelled()
+			raise DeadlineExceeded("Deadline exceeded while waiting for the model") from None
+		except httpx.TransportError as e:
+			# The backend dropped the connection or broke the protocol mid-request (e.g. it crashed)
+			breaker.record_failure()
+			raise BackendUnavailable(f"Model backend failed during the request: {type(e).__name__}: {e}") from e
+		except asyncio.CancelledError:
+			breaker.record_cancelled()
+			raise
+		finally:
+			if trial:
+				breaker.end_trial()
+
+
+async def _generate(payload: dict, deadline: Deadline) -> dict:
+	"""POST to Ollama while holding one of the max_concurrent_generations slots.
+
+	Cancelling the caller closes the HTTP request, which makes Ollama stop generating.
+	"""
+	global _generation_slots
+	if _generation_slots is None:
+		cfg = get_config()
+		_generation_slots = FairSemaphore("generation", cfg.max_concurrent_generations, cfg.model_batch_max)
+	slots = _generation_slots
+	set_stage("waiting for a generation slot")
+	queued = time.monotonic()
+	# Grouped by model, so queued requests for the loaded model go first
+	await deadline.run(slots.acquire(payload["model"]), "waiting for a generation slot")
+	metrics.incr("generations_in_flight")
+	set_stage("generation")
+	started = time.monotonic()
+	record_stage("queue", started - queued)
+	try:
+		if _backend is not None:
+			return await _backend.generate(payload, deadline)
+		residency = get_residency()
+		await deadline.run(residency.prepare(payload["model"]), "model residency check")
+		data = await _post_generate(payload, deadline)
+		residency.observe(payload["model"], data)
+		return data
+	except asyncio.CancelledError:
+		metrics.incr("generations_cancelled")
+		raise
+	finally:
+		metrics.incr("generations_in_flight", -1)
+		get_usage().add(current_client.get(), "generation_seconds", time.monotonic() - started)
+		record_stage("generation", time.monotonic() - started)
+		slots.release()
+
+
+def _prefill_stats(data: dict) -> dict:
+	"""Prompt size, prompt-processing time and tokens generated, as Ollama reports them; also recorded as metrics"""
+	tokens = data.get("prompt_eval_count")
+	prefill_ms = data["prompt_eval_duration"] / 1e6 if data.get("prompt_eval_duration") else None
+	if tokens is not None:
+		metrics.incr("prompt_tokens", tokens)
+		get_usage().add(current_client.get(), "prompt_tokens", tokens)
+	if prefill_ms is not None:
+		metrics.incr("prefill_seconds", prefill_ms / 1000)
+		get_usage().add(current_client.get(), "prefill_seconds", prefill_ms / 1000)
+	if data.get("eval_count") is not None:
+		metrics.incr("completion_tokens", data["eval_count"])
+	return {
+		"prompt_tokens": tokens,
+		"prefill_ms": round(prefill_ms, 1) if prefill_ms is not None else None,
+		"completion_tokens": data.get("eval_count"),
+	}
+
+
+async def run_mcq_model(question: str, options: List[str], timeout_seconds: Optional[float] = None,
+						deadline: Optional[Deadline] = None, learn: bool = True, compact: bool = False) -> ModelResponse:
+	"""Run the deepseek-r1:70b-llama-distill-q4_K_M model for MCQ questions.
+
+	A near-duplicate in the question bank answers without calling the model;
+	with learn=True the model's answer is added to the bank (unverified).
+	compact=True (OCR text) collapses repeated fragments and caps the prompt
+	at prompt_token_budget.
+	"""
+	cfg = get_config()
+	deadline = deadline or Deadline(timeout_seconds or cfg.request_timeout_seconds)
+	if cfg.qbank_enabled:
+		match = get_bank().lookup(question, options, cfg.qbank_threshold)
+		hit = match is not None and (match.verified or cfg.qbank_trust_model_answers)
+		note_cache("qbank", hit)
+		if hit:
+			metrics.incr("qbank_hits")
+			return ModelResponse(
+				model_name="question-bank",
+				answer=match.answer,
+				explanation=match.explanation,
+				# similarity is 1.0 for an exact match
+				confidence=match.similarity * (1.0 if match.verified else 0.9),
+			)
+	if compact:
+		compacted = compact_mcq(question, options, cfg.prompt_token_budget,
+								estimate_tokens(_build_mcq_prompt("", [""] * len(options))))
+	else:
+		compacted = Compacted(question, options, 0)
+	prompt = _build_mcq_prompt(compacted.question, compacted.options)
+	gen_options = _gen_options()
+	key = _cache_key("mcq", cfg.model, prompt, gen_options)
+	if cfg.answer_cache_ttl > 0:
+		cached = get_store().cache_get("answer", key)
+		note_cache("answer", cached is not None)
+		if cached is not None:
+			return ModelResponse.model_validate(cached)
 	
 	payload = {
 		"model": cfg.model, 
 		"prompt": prompt, 
 		"stream": False, 
-		"options": OLLAMA_GEN_OPTIONS, 
-		"keep_alive": cfg.keep_alive
+		"options": gen_options, 
+		"keep_alive": keep_alive_for(cfg.model)
 	}
 	
-	async with httpx.AsyncClient(timeout=timeout_seconds) as client:
-		resp = await client.post(f"{OLLAMA_URL}/api/generate", json=payload)
-		resp.raise_for_status()
-		data = resp.json()
-		text = data.get("response", "").strip()
-		
-		parsed = _parse_mcq_response(text)
-		
-		return ModelResponse(
-			model_name=cfg.model,
-			answer=parsed["answer"],
-			explanation=parsed["explanation"],
-			confidence=parsed["confidence"],
-			raw_text=text,
-		)
-
-
-async def run_freeform_model(question: str, timeout_seconds: float = 30.0) -> ModelResponse:
+	data = await _generate(payload, deadline)
+	text = data.get("response", "").strip()
+	
+	parsed = _parse_mcq_response(text)
+	metrics.incr("prompt_tokens_saved", compacted.tokens_saved)
+	get_usage().add(current_client.get(), "prompt_tokens_saved", compacted.tokens_saved)
+	
+	response = ModelResponse(
+		model_name=cfg.model,
+		answer=parsed["answer"],
+		explanation=parsed["explanation"],
+		confidence=parsed["confidence"],
+		raw_text=text,
+		prompt_tokens_saved=compacted.tokens_saved,
+		**_prefill_stats(data),
+	)
+	if cfg.answer_cache_ttl > 0:
+		get_store().cache_set("answer", key, response.model_dump(), cfg.answer_cache_ttl)
+	if learn and cfg.qbank_enabled and parsed["answer_found"]:
+		get_bank().add(question, options, response.answer, response.explanation, verified=False, source=cfg.model)
+	return response
+
+
+async def run_freeform_model(question: str, timeout_seconds: Optional[float] = None,
+							 deadline: Optional[Deadline] = None) -> ModelResponse:
 	"""Run the deepseek-r1:70b-llama-distill-q4_K_M model for freeform questions"""
 	cfg = get_config()
+	deadline = deadline or Deadline(timeout_seconds or cfg.request_timeout_seconds)
 	prompt = _build_freeform_prompt(question)
+	gen_options = _gen_options()
+	key = _cache_key("freeform", cfg.model, question, prompt, gen_options)
+	if cfg.answer_cache_ttl > 0:
+		cached = get_store().cache_get("answer", key)
+		note_cache("answer", cached is not None)
+		if cached is not None:
+			return ModelResponse.model_validate(cached)
 	
 	payload = {
 		"model": cfg.model, 
 		"prompt": prompt, 
 		"stream": False, 
-		"options": OLLAMA_GEN_OPTIONS, 
-		"keep_alive": cfg.keep_alive
+		"options": gen_options, 
+		"keep_alive": keep_alive_for(cfg.model)
 	}
 	
-	async with httpx.AsyncClient(timeout=timeout_seconds) as client:
-		resp = await client.post(f"{OLLAMA_URL}/api/generate", json=payload)
-		resp.raise_for_status()
-		data = resp.json()
-		text = data.get("response", "").strip()
-		
-		parsed = _parse_freeform_response(text)
-		
-		return ModelResponse(
-			model_name=cfg.model,
-			answer=parsed["answer"],
-			explanation=parsed["explanation"],
-			confidence=parsed["confidence"],
-			raw_text=text,
-			thought_process=parsed["thought_process"],
-		)
-
-
-async def run_mcq_with_ocr(question: Optional[str], options: Optional[List[str]], timeout_seconds: float = 30.0) -> ModelResponse:
+	data = await _generate(payload, deadline)
+	text = data.get("response", "").strip()
+	
+	parsed = _parse_freeform_response(text)
+	
+	response = ModelResponse(
+		model_name=cfg.model,
+		answer=parsed["answer"],
+		explanation=parsed["explanation"],
+		confidence=parsed["confidence"],
+		raw_text=text,
+		thought_process=parsed["thought_process"],
+		**_prefill_stats(data),
+	)
+	if cfg.answer_cache_ttl > 0:
+		get_store().cache_set("answer", key, response.model_dump(), cfg.answer_cache_ttl)
+	return response
+
+
+async def run_mcq_with_ocr(question: Optional[str], options: Optional[List[str]], timeout_seconds: Optional[float] = None,
+						   deadline: Optional[Deadline] = None) -> ModelResponse:
 	"""Run MCQ model with OCR-extracted text"""
 	# If no question/options from OCR, use defaults
 	q = question or "Answer the question from the provided information."
 	opts = options or ["Option A", "Option B", "Option C", "Option D"]
 	
-	return await run_mcq_model(q, opts, timeout_seconds)
+	# Placeholder question/options must not end up in the question bank
+	return await run_mcq_model(q, opts, timeout_seconds, deadline=deadline, learn=bool(question and options),
+							   compact=True)
 
 
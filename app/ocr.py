@@ -1,21 +1,34 @@
-from typing import Optional, Tuple, List
+from typing import BinaryIO, Optional, Tuple, List
 import base64
 import io
+import threading
 
-import numpy as np
 from PIL import Image
-from paddleocr import PaddleOCR
-import cv2
 
+from app.config import get_config
+from app.ocr_engines import OCREngine, TextBox, create_engine
+from app.threads import ensure_thread_budget, ocr_threads
 
-_ocr_singleton: Optional[PaddleOCR] = None
+# numpy, OpenCV and the OCR runtime are imported inside the functions that
+# need them, so processes that never OCR (text-only profile, /config, /status)
+# skip loading the whole Paddle framework.
 
 
-def get_ocr() -> PaddleOCR:
-	global _ocr_singleton
-	if _ocr_singleton is None:
-		_ocr_singleton = PaddleOCR(lang='en', use_angle_cls=True, show_log=False)
-	return _ocr_singleton
+_engine: Optional[OCREngine] = None
+_engine_key: Optional[Tuple[str, str, int]] = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine() -> OCREngine:
+	"""The configured OCR engine, loaded once per process and rebuilt if the config changes"""
+	global _engine, _engine_key
+	cfg = get_config()
+	key = (cfg.ocr_engine, cfg.ocr_onnx_model_dir, ocr_threads())
+	with _engine_lock:  # OCR threads must not load it twice
+		if _engine is None or _engine_key != key:
+			_engine = create_engine(*key)
+			_engine_key = key
+		return _engine
 
 
 def decode_base64_image(image_base64: str) -> Image.Image:
@@ -23,16 +36,29 @@ def decode_base64_image(image_base64: str) -> Image.Image:
 	return Image.open(io.BytesIO(data)).convert('RGB')
 
 
+def decode_image_file(fp: BinaryIO, max_side: int) -> Image.Image:
+	"""Decode an image straight from a file, never larger than max_side pixels.
+
+	For JPEGs, draft() makes the decoder scale down while decoding, so the
+	full-resolution bitmap of a camera photo is never materialized.
+	"""
+	image = Image.open(fp)
+	image.draft('RGB', (max_side, max_side))
+	image = image.convert('RGB')
+	image.thumbnail((max_side, max_side))
+	return image
+
+
 def image_to_text_lines(image_base64: str) -> List[str]:
-	image = decode_base64_image(image_base64)
-	img = np.array(image)
-	ocr = get_ocr()
-	result = ocr.ocr(img, cls=True)
-	lines: List[str] = []
-	for page in result:
-		for _box, (text, _conf) in page:
-			lines.append(text)
-	return lines
+	return pil_image_to_text_lines(decode_base64_image(image_base64))
+
+
+def pil_image_to_text_lines(image: Image.Image) -> List[str]:
+	return [box.text for box in pil_image_to_text_boxes(image)]
+
+
+def pil_image_to_text_boxes(image: Image.Image) -> List[TextBox]:
+	return get_ocr_engine().recognize(image)
 
 
 def preprocess_remove_watermark(image_base64: str) -> str:
@@ -40,7 +66,18 @@ def preprocess_remove_watermark(image_base64: str) -> str:
 
 	Returns base64-encoded PNG of a 3-channel image suitable for OCR/VLM.
 	"""
-	image = decode_base64_image(image_base64)
+	clean = remove_watermark_image(decode_base64_image(image_base64))
+	# Encode to base64 PNG
+	buf = io.BytesIO()
+	clean.save(buf, format='PNG')
+	return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+def remove_watermark_image(image: Image.Image) -> Image.Image:
+	"""In-memory variant of preprocess_remove_watermark, without the base64/PNG round trip"""
+	ensure_thread_budget()
+	import numpy as np
+	import cv2
 	rgb = np.array(image)
 	gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
 	# Illumination normalization
@@ -65,10 +102,7 @@ def preprocess_remove_watermark(image_base64: str) -> str:
 	# Convert to black text on white background
 	clean = 255 - text_mask
 	clean_rgb = cv2.cvtColor(clean, cv2.COLOR_GRAY2RGB)
-	# Encode to base64 PNG
-	buf = io.BytesIO()
-	Image.fromarray(clean_rgb).save(buf, format='PNG')
-	return base64.b64encode(buf.getvalue()).decode('utf-8')
+	return Image.fromarray(clean_rgb)
 
 
 def ocr_quality_score(lines: List[str]) -> int:
@@ -0,0 +1,196 @@
+import math
+import os
+from typing import TYPE_CHECKING, List, NamedTuple, Protocol, Tuple
+
+from PIL import Image
+
+# Engines import their runtime (Paddle, ONNX Runtime, numpy, OpenCV) in
+# __init__, so only the configured one is ever loaded.
+if TYPE_CHECKING:
+	import numpy as np
+
+
+class TextBox(NamedTuple):
+	"""One recognized text region, its bounding box in image pixels and the recognizer's confidence"""
+	text: str
+	x0: float
+	y0: float
+	x1: float
+	y1: float
+	confidence: float = 1.0
+
+
+def _bounds(text: str, points, confidence: float) -> TextBox:
+	xs = [float(p[0]) for p in points]
+	ys = [float(p[1]) for p in points]
+	return TextBox(text, min(xs), min(ys), max(xs), max(ys), float(confidence))
+
+
+class OCREngine(Protocol):
+	"""Turns an RGB image into text boxes, top to bottom"""
+
+	name: str
+
+	def recognize(self, image: Image.Image) -> List[TextBox]:
+		...
+
+
+class PaddleEngine:
+	"""PaddleOCR with angle classification; loads the full Paddle framework"""
+
+	name = "paddle"
+
+	def __init__(self, threads: int = 0):
+		from paddleocr import PaddleOCR
+		kwargs = {"cpu_threads": threads} if threads > 0 else {}
+		self._ocr = PaddleOCR(lang='en', use_angle_cls=True, show_log=False, **kwargs)
+
+	def recognize(self, image: Image.Image) -> List[TextBox]:
+		import numpy as np
+		result = self._ocr.ocr(np.array(image), cls=True)
+		boxes: List[TextBox] = []
+		for page in result:
+			for points, (text, confidence) in page or ():
+				boxes.append(_bounds(text, points, confidence))
+		return boxes
+
+
+class OnnxEngine:
+	"""PP-OCR detection + recognition models exported to ONNX, run with ONNX Runtime on CPU.
+
+	model_dir holds det.onnx, rec.onnx and dict.txt (the recognizer's character
+	list, one per line), e.g. from paddle2onnx on the PP-OCRv4 English models.
+	Both sessions are created once and reused for every image.
+	"""
+
+	name = "onnx"
+
+	# Detection input is scaled so its longest side is at most this (multiple of 32)
+	DET_MAX_SIDE = 960
+	DET_THRESHOLD = 0.3
+	DET_BOX_THRESHOLD = 0.5
+	DET_UNCLIP_RATIO = 1.5
+	DET_MIN_SIZE = 3
+	REC_HEIGHT = 48
+	# A batch is as wide as its widest line at REC_HEIGHT (others are padded),
+	# at least the models' training width; only lines wider than ~33:1 are squashed
+	REC_MIN_WIDTH = 320
+	REC_MAX_WIDTH = 1600
+	REC_BATCH = 8
+
+	def __init__(self, model_dir: str, threads: int = 0):
+		try:
+			import onnxruntime as ort
+		except ImportError:
+			raise RuntimeError("ocr_engine 'onnx' needs the onnxruntime package (pip install onnxruntime)") from None
+		options = ort.SessionOptions()
+		if threads > 0:
+			options.intra_op_num_threads = threads
+		options.inter_op_num_threads = 1
+		options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+		options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+		providers = ["CPUExecutionProvider"]
+		self._det = ort.InferenceSession(os.path.join(model_dir, "det.onnx"), options, providers=providers)
+		self._rec = ort.InferenceSession(os.path.join(model_dir, "rec.onnx"), options, providers=providers)
+		with open(os.path.join(model_dir, "dict.txt"), encoding="utf-8") as f:
+			# Index 0 is the CTC blank; the exported English models also predict a space last
+			self._chars = [""] + [line.rstrip("\r\n") for line in f] + [" "]
+
+	def recognize(self, image: Image.Image) -> List[TextBox]:
+		import numpy as np
+		rgb = np.array(image)
+		boxes = self._detect(rgb)
+		crops = [self._crop(rgb, box) for box in boxes]
+		# Batch lines of similar shape together, so short ones are not padded to a long one's width
+		order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1] / max(crops[i].shape[0], 1))
+		lines: List[Tuple[str, float]] = [("", 0.0)] * len(crops)
+		for start in range(0, len(order), self.REC_BATCH):
+			batch = order[start:start + self.REC_BATCH]
+			for i, line in zip(batch, self._recognize_batch([crops[i] for i in batch])):
+				lines[i] = line
+		return [_bounds(text.strip(), box, confidence) for (text, confidence), box in zip(lines, boxes) if text.strip()]
+
+	def _detect(self, rgb: "np.ndarray") -> List["np.ndarray"]:
+		import numpy as np
+		import cv2
+		h, w = rgb.shape[:2]
+		scale = min(1.0, self.DET_MAX_SIDE / max(h, w))
+		dh = max(32, int(round(h * scale / 32)) * 32)
+		dw = max(32, int(round(w * scale / 32)) * 32)
+		resized = cv2.resize(rgb, (dw, dh)).astype(np.float32) / 255.0
+		resized = (resized - (0.485, 0.456, 0.406)) / (0.229, 0.224, 0.225)
+		blob = resized.transpose(2, 0, 1)[None].astype(np.float32)
+		prob = self._det.run(None, {self._det.get_inputs()[0].name: blob})[0][0, 0]
+
+		mask = (prob > self.DET_THRESHOLD).astype(np.uint8)
+		contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+		boxes = []
+		for contour in contours:
+			if len(contour) < 4:
+				continue
+			x, y, bw, bh = cv2.boundingRect(contour)
+			if prob[y:y + bh, x:x + bw][mask[y:y + bh, x:x + bw] > 0].mean() < self.DET_BOX_THRESHOLD:
+				continue
+			(cx, cy), (rw, rh), angle = cv2.minAreaRect(contour)
+			if min(rw, rh) < self.DET_MIN_SIZE:
+				continue
+			# DB shrinks text regions when training; grow the box back by area * ratio / perimeter
+			grow = rw * rh * self.DET_UNCLIP_RATIO / (2 * (rw + rh))
+			box = cv2.boxPoints(((cx, cy), (rw + 2 * grow, rh + 2 * grow), angle))
+			box[:, 0] = np.clip(box[:, 0] * w / dw, 0, w - 1)
+			box[:, 1] = np.clip(box[:, 1] * h / dh, 0, h - 1)
+			boxes.append(self._order_points(box))
+		# Reading order: top to bottom, then left to right within a line
+		boxes.sort(key=lambda b: (round(b[0][1] / 10), b[0][0]))
+		return boxes
+
+	@staticmethod
+	def _order_points(box: "np.ndarray") -> "np.ndarray":
+		import numpy as np
+		s = box.sum(axis=1)
+		d = np.diff(box, axis=1).ravel()
+		return np.array([box[s.argmin()], box[d.argmin()], box[s.argmax()], box[d.argmax()]], dtype=np.float32)
+
+	@staticmethod
+	def _crop(rgb: "np.ndarray", box: "np.ndarray") -> "np.ndarray":
+		import numpy as np
+		import cv2
+		width = int(max(np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[2] - box[3])))
+		height = int(max(np.linalg.norm(box[0] - box[3]), np.linalg.norm(box[1] - box[2])))
+		target = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+		crop = cv2.warpPerspective(rgb, cv2.getPerspectiveTransform(box, target), (max(width, 1), max(height, 1)),
+								   borderMode=cv2.BORDER_REPLICATE)
+		if crop.shape[0] > crop.shape[1] * 1.5:
+			crop = np.rot90(crop)  # vertical box: read it rotated
+		return crop
+
+	def _recognize_batch(self, crops: List["np.ndarray"]) -> List[Tuple[str, float]]:
+		import numpy as np
+		import cv2
+		if not crops:
+			return []
+		widths = [min(self.REC_MAX_WIDTH, max(1, math.ceil(self.REC_HEIGHT * c.shape[1] / max(c.shape[0], 1))))
+				  for c in crops]
+		batch_width = max(self.REC_MIN_WIDTH, max(widths))
+		blob = np.zeros((len(crops), 3, self.REC_HEIGHT, batch_width), dtype=np.float32)
+		for i, (crop, width) in enumerate(zip(crops, widths)):
+			resized = cv2.resize(crop, (width, self.REC_HEIGHT)).astype(np.float32) / 255.0
+			blob[i, :, :, :width] = ((resized - 0.5) / 0.5).transpose(2, 0, 1)
+		probs = self._rec.run(None, {self._rec.get_inputs()[0].name: blob})[0]
+		lines = []
+		for row, indices in zip(probs, probs.argmax(axis=2)):
+			# CTC greedy decoding: drop repeats, then blanks; confidence is the mean kept-character probability
+			kept = [j for j, k in enumerate(indices)
+					if k != 0 and (j == 0 or k != indices[j - 1]) and k < len(self._chars)]
+			text = "".join(self._chars[indices[j]] for j in kept)
+			confidence = float(np.mean([row[j, indices[j]] for j in kept])) if kept else 0.0
+			lines.append((text, confidence))
+		return lines
+
+
+def create_engine(name: str, model_dir: str, threads: int) -> OCREngine:
+	if name == "paddle":
+		return PaddleEngine(threads)
+	if name == "onnx":
+		return OnnxEngine(model_dir, threads)
+	raise ValueError(f"Unknown OCR engine: {name}")
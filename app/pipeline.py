@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional
+
+from app.schemas import MCQResponse, FreeformResponse
+from app.models import run_mcq_model, run_freeform_model, run_mcq_with_ocr
+from app.config import get_config
+from app.store import get_store
+from app import metrics
+from app.debug import set_stage
+from app.threads import pin_current_thread
+from app.watchdog import get_watchdog
+from app.fairness import FairSemaphore, current_client, get_usage
+from app.resilience import Deadline
+from app.ocr import decode_image_file, pil_image_to_text_boxes, remove_watermark_image
+from app.ocr_engines import TextBox
+from app.segment import QuestionSegment, split_questions
+from app.budget import clean_boxes, estimate_tokens
+from app import resultlog
+
+
+def _mcq_result(response) -> Dict:
+	return MCQResponse(
+		final_answer=response.answer,
+		explanation=response.explanation,
+		confidence=response.confidence,
+		model=response.model_name,
+		per_model=[response]
+	).model_dump()
+
+
+async def solve_text(question: str, options: List[str], deadline: Deadline, ocr: bool = False) -> Dict:
+	"""Answer a typed question; ocr=True for text parsed from a screenshot, which gets the OCR compaction"""
+	trace = resultlog.begin()
+	try:
+		if ocr:
+			response = await run_mcq_with_ocr(question, options, deadline=deadline)
+		else:
+			response = await run_mcq_model(question, options, deadline=deadline)
+	except Exception as e:
+		resultlog.log_result(resultlog.result_record(trace, "text", question, options, error=e))
+		raise
+	resultlog.log_result(resultlog.result_record(trace, "text", question, options, response))
+	return _mcq_result(response)
+
+
+def ocr_image(image: BinaryIO, digest: str, remove_watermark: bool = False) -> List[TextBox]:
+	"""OCR an uploaded image file (digest = its sha256), consulting the shared OCR cache first"""
+	cfg = get_config()
+	ocr_key = digest + (":wm" if remove_watermark else "")
+	cached = get_store().cache_get("ocr_boxes", ocr_key) if cfg.ocr_cache_ttl > 0 else None
+	resultlog.note_cache("ocr", cached is not None)
+	if cached is not None:
+		return [TextBox(*box) for box in cached]
+	image.seek(0)
+	decoded = decode_image_file(image, cfg.ocr_max_side)
+
+	# Preprocess image to remove watermarks if requested
+	if remove_watermark:
+		try:
+			decoded = remove_watermark_image(decoded)
+		except Exception:
+			pass
+
+	boxes = pil_image_to_text_boxes(decoded)
+	watchdog = get_watchdog()
+	if watchdog is not None:
+		watchdog.note_ocr()
+	if cfg.ocr_cache_ttl > 0:
+		get_store().cache_set("ocr_boxes", ocr_key, boxes, cfg.ocr_cache_ttl)
+	return boxes
+
+
+_ocr_executor: Optional[ThreadPoolExecutor] = None
+# Admission to the OCR threads, handed out fairly across clients
+_ocr_slots: Optional[FairSemaphore] = None
+
+
+async def ocr_image_async(image: BinaryIO, digest: str, remove_watermark: bool = False) -> List[TextBox]:
+	"""Run ocr_image off the event loop; cancelling drops the job if it has not started yet"""
+	global _ocr_executor, _ocr_slots
+	if _ocr_executor is None:
+		workers = get_config().ocr_workers
+		_ocr_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr",
+										   initializer=pin_current_thread)
+		_ocr_slots = FairSemaphore("ocr", workers)
+	loop = asyncio.get_running_loop()
+	try:
+		await _ocr_slots.acquire()
+		started = time.monotonic()
+		try:
+			# In the request's context, so the OCR cache flag lands in its result log record
+			return await loop.run_in_executor(_ocr_executor, contextvars.copy_context().run,
+											  ocr_image, image, digest, remove_watermark)
+		finally:
+			get_usage().add(current_client.get(), "ocr_seconds", time.monotonic() - started)
+			resultlog.record_stage("ocr", time.monotonic() - started)
+			_ocr_slots.release()
+	except asyncio.CancelledError:
+		metrics.incr("ocr_cancelled")
+		raise
+
+
+async def parse_image(image: BinaryIO, digest: str, remove_watermark: bool, deadline: Deadline) -> List[QuestionSegment]:
+	"""OCR a screenshot and split it into its questions, without answering them"""
+	cfg = get_config()
+	set_stage("OCR")
+	boxes = await deadline.run(ocr_image_async(image, digest, remove_watermark), "OCR")
+	kept = clean_boxes(boxes, cfg.ocr_min_confidence)
+	metrics.incr("ocr_tokens_dropped", sum(estimate_tokens(b.text) for b in boxes) - sum(estimate_tokens(b.text) for b in kept))
+	segments = split_questions(kept, cfg.max_questions_per_image)
+	if len(segments) > 1:
+		metrics.incr("multi_question_images")
+	return segments
+
+
+async def solve_image(image: BinaryIO, digest: str, remove_watermark: bool, deadline: Deadline) -> Dict:
+	"""OCR a screenshot and answer every question on it.
+
+	The top-level question/options/result describe the first question; all of
+	them are in "questions", in page order.
+	"""
+	cfg = get_config()
+	trace = resultlog.begin()
+	segments = await parse_image(image, digest, remove_watermark, deadline)
+	set_stage(f"generation ({len(segments)} questions)" if len(segments) > 1 else "generation")
+
+	# One model call per question, at most question_concurrency of them at once;
+	# OCR time is already spent from the deadline
+	slots = asyncio.Semaphore(cfg.question_concurrency)
+
+	async def solve(segment: QuestionSegment):
+		# Each question gets its own record, with the image's OCR time and cache flag
+		question_trace = resultlog.begin()
+		question_trace.update(started=trace["started"], timings=dict(trace["timings"]), cache=dict(trace["cache"]))
+		extra = {"image_sha256": digest, "number": segment.number}
+		try:
+			async with slots:
+				response = await run_mcq_with_ocr(segment.question, segment.options, deadline=deadline)
+		except Exception as e:
+			resultlog.log_result(resultlog.result_record(question_trace, "image", segment.question, segment.options,
+														 error=e, **extra))
+			raise
+		resultlog.log_result(resultlog.result_record(question_trace, "image", segment.question, segment.options,
+													 response, **extra))
+		return response
+
+	responses = await asyncio.gather(*(solve(s) for s in segments), return_exceptions=True)
+	for response in responses:
+		if isinstance(response, asyncio.CancelledError):
+			raise response
+	if all(isinstance(r, Exception) for r in responses):
+		raise responses[0]
+	questions = []
+	for segment, response in zip(segments, responses):
+		entry = {"number": segment.number, "question": segment.question, "options": segment.options}
+		if isinstance(response, Exception):
+			entry["error"] = f"{type(response).__name__}: {response}"
+		else:
+			entry["result"] = _mcq_result(response)
+		questions.append(entry)
+	first = questions[0]
+	return {
+		"question": first["question"],
+		"options": first["options"],
+		"result": first.get("result"),
+		"questions": questions,
+	}
+
+
+async def solve_freeform(question: str, deadline: Deadline) -> Dict:
+	trace = resultlog.begin()
+	try:
+		response = await run_freeform_model(question, deadline=deadline)
+	except Exception as e:
+		resultlog.log_result(resultlog.result_record(trace, "freeform", question, None, error=e))
+		raise
+	resultlog.log_result(resultlog.result_record(trace, "freeform", question, None, response))
+	return FreeformResponse(
+		final_answer=response.answer,
+		explanation=response.explanation,
+		thought_process=response.thought_process or "",
+		confidence=response.confidence,
+		model=response.model_name
+	).model_dump()
@@ -0,0 +1,260 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+BANK_PATH = os.environ.get("HELPERAI_QBANK", os.path.join("data", "question_bank.sqlite3"))
+
+# MinHash signature of NUM_HASHES values, banded for LSH into BANDS bands of
+# ROWS values; two questions become candidates if any band matches exactly.
+# With 8x4 a pair with Jaccard 0.7 is found with probability ~0.9, 0.8 with > 0.99.
+NUM_HASHES = 32
+BANDS = 8
+ROWS = NUM_HASHES // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+# New rows written by other workers are picked up at most this often (seconds)
+_REFRESH_INTERVAL = 2.0
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Words that flip what a question asks; a near-duplicate must have the same
+# ones, and the same numbers ("t" is what normalize leaves of "isn't", "can't")
+_NEGATIONS = frozenset((
+	"not", "no", "none", "never", "nor", "neither", "except", "least", "false",
+	"incorrect", "untrue", "cannot", "without", "t",
+))
+
+
+def normalize(text: str) -> str:
+	return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def critical_tokens(norm_text: str) -> Tuple[str, ...]:
+	"""Numbers and negation words of a normalized question, which must match exactly"""
+	return tuple(sorted(w for w in norm_text.split() if w in _NEGATIONS or any(c.isdigit() for c in w)))
+
+
+def option_key(options: List[str]) -> str:
+	"""Order-independent key of the normalized option set"""
+	return hashlib.sha1("\x1f".join(sorted(normalize(o) for o in options)).encode("utf-8")).hexdigest()
+
+
+def signature(norm_text: str) -> array:
+	# Words plus word pairs: pairs catch reordering, single words keep short
+	# questions similar after a one-word edit
+	words = norm_text.split()
+	shingles = words + [f"{a} {b}" for a, b in zip(words, words[1:])] or [""]
+	hashes = {zlib.crc32(s.encode("utf-8")) for s in shingles}
+	return array("Q", (min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS))
+
+
+class BankMatch(NamedTuple):
+	entry_id: int
+	answer: str  # letter in the caller's option order
+	explanation: str
+	verified: bool
+	similarity: float
+
+
+class QuestionBank:
+	"""Persistent bank of solved questions with a near-duplicate index.
+
+	Rows live in SQLite; an in-memory exact-match dict and MinHash LSH index
+	make lookups independent of bank size. Stored answers are kept as option
+	text, so a match still works when the options come in a different order.
+	A near-duplicate only matches if its numbers and negation words are the
+	same ("is prime" never answers "is NOT prime", "2x = 10" never "2x = 20").
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._lock = threading.Lock()
+		self._local = threading.local()
+		self._exact: Dict[Tuple[str, str], int] = {}
+		self._buckets: Dict[Tuple[int, int], List[int]] = {}
+		self._signatures: Dict[int, array] = {}
+		self._option_keys: Dict[int, str] = {}
+		self._critical: Dict[int, Tuple[str, ...]] = {}
+		self._max_id = 0
+		self._last_refresh = 0.0
+		directory = os.path.dirname(path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self._conn().executescript(
+			"""
+			CREATE TABLE IF NOT EXISTS questions (
+				id INTEGER PRIMARY KEY AUTOINCREMENT,
+				norm_question TEXT NOT NULL,
+				option_key TEXT NOT NULL,
+				question TEXT NOT NULL,
+				options TEXT NOT NULL,
+				answer_text TEXT NOT NULL,
+				explanation TEXT NOT NULL,
+				verified INTEGER NOT NULL,
+				source TEXT NOT NULL,
+				signature BLOB NOT NULL,
+				updated_at REAL NOT NULL,
+				UNIQUE (norm_question, option_key)
+			);
+			"""
+		)
+		self.refresh(force=True)
+
+	def _conn(self) -> sqlite3.Connection:
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+			conn.execute("PRAGMA journal_mode=WAL")
+			self._local.conn = conn
+		return conn
+
+	def __len__(self) -> int:
+		return len(self._signatures)
+
+	def _index(self, entry_id: int, norm_question: str, opt_key: str, sig: array) -> None:
+		self._exact[(norm_question, opt_key)] = entry_id
+		if entry_id in self._signatures:
+			return
+		self._signatures[entry_id] = sig
+		self._option_keys[entry_id] = opt_key
+		self._critical[entry_id] = critical_tokens(norm_question)
+		for band in range(BANDS):
+			key = (band, hash(tuple(sig[band * ROWS:(band + 1) * ROWS])))
+			self._buckets.setdefault(key, []).append(entry_id)
+
+	def refresh(self, force: bool = False) -> None:
+		"""Index rows added since the last refresh (e.g. by other workers)"""
+		now = time.monotonic()
+		if not force and now - self._last_refresh < _REFRESH_INTERVAL:
+			return
+		self._last_refresh = now
+		rows = self._conn().execute(
+			"SELECT id, norm_question, option_key, signature FROM questions WHERE id > ? ORDER BY id",
+			(self._max_id,),
+		).fetchall()
+		with self._lock:
+			for entry_id, norm_question, opt_key, blob in rows:
+				self._index(entry_id, norm_question, opt_key, array("Q", blob))
+				self._max_id = entry_id
+
+	def add(self, question: str, options: List[str], answer: str, explanation: str,
+			verified: bool, source: str) -> Optional[int]:
+		"""Store a solved question; answer is a letter into options.
+
+		An unverified answer never replaces a verified one.
+		"""
+		index = ord(answer.strip().upper()[:1] or "?") - ord("A")
+		if not 0 <= index < len(options):
+			return None
+		norm_question = normalize(question)
+		opt_key = option_key(options)
+		sig = signature(norm_question)
+		conn = self._conn()
+		conn.execute(
+			"""
+			INSERT INTO questions (norm_question, option_key, question, options, answer_text,
+				explanation, verified, source, signature, updated_at)
+			VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+			ON CONFLICT (norm_question, option_key) DO UPDATE SET
+				answer_text = excluded.answer_text,
+				explanation = excluded.explanation,
+				verified = excluded.verified,
+				source = excluded.source,
+				updated_at = excluded.updated_at
+			WHERE excluded.verified >= questions.verified
+			""",
+			(norm_question, opt_key, question, json.dumps(options), options[index], explanation,
+			 int(verified), source, sig.tobytes(), time.time()),
+		)
+		row = conn.execute(
+			"SELECT id FROM questions WHERE norm_question = ? AND option_key = ?", (norm_question, opt_key)
+		).fetchone()
+		with self._lock:
+			self._index(row[0], norm_question, opt_key, sig)
+		return row[0]
+
+	def lookup(self, question: str, options: List[str], threshold: float) -> Optional[BankMatch]:
+		self.refresh()
+		norm_question = normalize(question)
+		opt_key = option_key(options)
+		with self._lock:
+			entry_id = self._exact.get((norm_question, opt_key))
+			similarity = 1.0
+			if entry_id is None:
+				sig = signature(norm_question)
+				candidates = set()
+				for band in range(BANDS):
+					key = (band, hash(tuple(sig[band * ROWS:(band + 1) * ROWS])))
+					candidates.update(self._buckets.get(key, ()))
+				best = 0.0
+				critical = critical_tokens(norm_question)
+				for candidate in candidates:
+					if self._option_keys[candidate] != opt_key or self._critical[candidate] != critical:
+						continue
+					other = self._signatures[candidate]
+					score = sum(1 for x, y in zip(sig, other) if x == y) / NUM_HASHES
+					if score > best:
+						best, entry_id = score, candidate
+				similarity = best
+		if entry_id is None or similarity < threshold:
+			return None
+		row = self._conn().execute(
+			"SELECT answer_text, explanation, verified FROM questions WHERE id = ?", (entry_id,)
+		).fetchone()
+		normalized_options = [normalize(o) for o in options]
+		answer_norm = normalize(row[0])
+		if answer_norm not in normalized_options:
+			return None
+		letter = chr(ord("A") + normalized_options.index(answer_norm))
+		return BankMatch(entry_id, letter, row[1], bool(row[2]), similarity)
+
+
+_bank_singleton: Optional[QuestionBank] = None
+
+
+def get_bank() -> QuestionBank:
+	global _bank_singleton
+	if _bank_singleton is None:
+		_bank_singleton = QuestionBank(BANK_PATH)
+	return _bank_singleton
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Manage the question bank")
+	sub = parser.add_subparsers(dest="command", required=True)
+	imp = sub.add_parser("import", help="Import verified questions from JSONL "
+							"({question, options, answer, explanation})")
+	imp.add_argument("path")
+	sub.add_parser("stats")
+	args = parser.parse_args()
+
+	bank = get_bank()
+	if args.command == "import":
+		count = 0
+		with open(args.path, encoding="utf-8") as f:
+			for line in f:
+				if not line.strip():
+					continue
+				item = json.loads(line)
+				if bank.add(item["question"], item["options"], item["answer"],
+							item.get("explanation", ""), verified=True, source="import") is not None:
+					count += 1
+		print(f"Imported {count} questions into {bank.path}")
+	else:
+		print(f"{len(bank)} questions in {bank.path}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from app.config import get_config
+from app import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+# /api/ps is polled at most this often (seconds), model sizes from /api/tags less often
+PS_INTERVAL = 5.0
+TAGS_INTERVAL = 300.0
+# A generation whose load_duration is above this loaded the model from disk
+LOAD_THRESHOLD = 1.0
+# Recent generations the preloader looks at to guess the next model
+HISTORY = 100
+IDLE_CHECK_INTERVAL = 5.0
+
+
+def keep_alive_for(model: str) -> str:
+	"""keep_alive to send with a request for model: its model_keep_alive entry, else keep_alive"""
+	cfg = get_config()
+	return cfg.model_keep_alive.get(model, cfg.keep_alive)
+
+
+class ModelResidency:
+	"""Tracks which models the Ollama host has loaded and manages them under a memory budget.
+
+	Before a generation for a model that is not loaded, the least recently
+	used loaded models are unloaded until it fits in model_memory_budget_gb.
+	When the model queue has been idle for model_preload_idle_seconds, the
+	model most likely to be asked for next is loaded ahead of time if it fits.
+	Each worker keeps its own view, refreshed from Ollama's process list.
+	"""
+
+	def __init__(self, url: str):
+		self.url = url
+		self.resident: Dict[str, int] = {}  # loaded model -> bytes, from /api/ps
+		self.sizes: Dict[str, int] = {}  # installed model -> bytes on disk, from /api/tags
+		self.last_used: Dict[str, float] = {}
+		self.loads: Dict[str, Dict] = {}  # model -> {"count", "seconds", "last"}
+		self._history: Deque[str] = deque(maxlen=HISTORY)
+		self._ps_at = 0.0
+		self._tags_at = 0.0
+		self._busy_until = time.monotonic()
+		self._lock = asyncio.Lock()
+		self._preloader: Optional[asyncio.Task] = None
+
+	async def refresh(self, force: bool = False) -> None:
+		now = time.monotonic()
+		if not force and now - self._ps_at < PS_INTERVAL:
+			return
+		async with httpx.AsyncClient(timeout=5.0) as client:
+			resp = await client.get(f"{self.url}/api/ps")
+			resp.raise_for_status()
+			self.resident = {m["name"]: int(m.get("size") or 0) for m in resp.json().get("models", [])}
+			self._ps_at = now
+			if now - self._tags_at >= TAGS_INTERVAL:
+				resp = await client.get(f"{self.url}/api/tags")
+				resp.raise_for_status()
+				self.sizes = {m["name"]: int(m.get("size") or 0) for m in resp.json().get("models", [])}
+				self._tags_at = now
+		metrics.set_gauge("models_resident", len(self.resident))
+
+	def _budget(self) -> int:
+		return int(get_config().model_memory_budget_gb * 2**30)
+
+	def _size(self, model: str) -> int:
+		# Loaded size includes the KV cache; the file size is the best guess before loading
+		return self.resident.get(model) or self.sizes.get(model, 0)
+
+	def _fits(self, model: str, resident: Dict[str, int]) -> bool:
+		return sum(resident.values()) + self._size(model) <= self._budget()
+
+	async def prepare(self, model: str) -> None:
+		"""Make room for model before it is generated with, evicting least recently used models"""
+		self._history.append(model)
+		self.last_used[model] = time.time()
+		if self._budget() <= 0:
+			return
+		async with self._lock:
+			try:
+				await self.refresh()
+				if model in self.resident:
+					return
+				others = {m: size for m, size in self.resident.items() if m != model}
+				for victim in sorted(others, key=lambda m: self.last_used.get(m, 0.0)):
+					if self._fits(model, others):
+						break
+					await self._unload(victim)
+					del others[victim]
+			except httpx.HTTPError as e:
+				metrics.incr("residency_errors")
+				logger.warning("Model residency check failed: %s", e)
+
+	def observe(self, model: str, data: dict) -> None:
+		"""Record a finished generation: whether it had to load the model, and for how long"""
+		self._busy_until = time.monotonic()
+		load_seconds = (data.get("load_duration") or 0) / 1e9
+		if load_seconds >= LOAD_THRESHOLD:
+			self._record_load(model, load_seconds)
+		self.resident.setdefault(model, self.sizes.get(model, 0))
+		metrics.set_gauge("models_resident", len(self.resident))
+
+	def _record_load(self, model: str, seconds: float) -> None:
+		stats = self.loads.setdefault(model, {"count": 0, "seconds": 0.0, "last": None})
+		stats["count"] += 1
+		stats["seconds"] = round(stats["seconds"] + seconds, 1)
+		stats["last"] = time.time()
+		metrics.incr("model_loads")
+		metrics.incr("model_load_seconds", seconds)
+
+	async def _unload(self, model: str) -> None:
+		async with httpx.AsyncClient(timeout=30.0) as client:
+			resp = await client.post(f"{self.url}/api/generate", json={"model": model, "keep_alive": 0})
+			resp.raise_for_status()
+		self.resident.pop(model, None)
+		metrics.set_gauge("models_resident", len(self.resident))
+		metrics.incr("model_evictions")
+		logger.info("Unloaded %s to stay within the model memory budget", model)
+
+	def next_likely(self) -> Optional[str]:
+		"""The configured model if it is not loaded, else the most used recent model that is not"""
+		candidates: List[str] = [get_config().model]
+		candidates += [m for m, _n in Counter(self._history).most_common()]
+		for model in candidates:
+			if model not in self.resident:
+				return model
+		return None
+
+	async def preload_if_idle(self, busy: bool) -> Optional[str]:
+		"""Load the next likely model if generation has been idle long enough and it fits.
+
+		The lock is only held to pick the model: a generation arriving during a
+		long load must not wait on it in prepare().
+		"""
+		cfg = get_config()
+		if busy:
+			self._busy_until = time.monotonic()
+			return None
+		if (self._budget() <= 0 or cfg.model_preload_idle_seconds <= 0
+				or time.monotonic() - self._busy_until < cfg.model_preload_idle_seconds):
+			return None
+		async with self._lock:
+			await self.refresh(force=True)
+			model = self.next_likely()
+			if model is None or not self._fits(model, self.resident):
+				return None
+		started = time.monotonic()
+		async with httpx.AsyncClient(timeout=600.0) as client:
+			resp = await client.post(f"{self.url}/api/generate",
+									 json={"model": model, "keep_alive": keep_alive_for(model)})
+			resp.raise_for_status()
+		self._record_load(model, time.monotonic() - started)
+		metrics.incr("model_preloads")
+		self.resident.setdefault(model, self.sizes.get(model, 0))
+		metrics.set_gauge("models_resident", len(self.resident))
+		self._busy_until = time.monotonic()
+		return model
+
+	def start_preloader(self, busy: Callable[[], bool]) -> None:
+		"""Start the idle preloader; call from inside the running loop"""
+		if self._preloader is None:
+			self._preloader = asyncio.get_running_loop().create_task(self._run_preloader(busy), name="model-preloader")
+
+	async def _run_preloader(self, busy: Callable[[], bool]) -> None:
+		while True:
+			await asyncio.sleep(IDLE_CHECK_INTERVAL)
+			try:
+				model = await self.preload_if_idle(busy())
+				if model is not None:
+					logger.info("Preloaded %s while idle", model)
+			except Exception as e:
+				# Anything else escaping here would end the preloader for good
+				metrics.incr("residency_errors")
+				logger.warning("Model preload failed: %s: %s", type(e).__name__, e)
+
+	def snapshot(self) -> Dict:
+		return {
+			"budget_gb": get_config().model_memory_budget_gb,
+			"resident": {m: round(size / 2**30, 1) for m, size in self.resident.items()},
+			"last_used": dict(self.last_used),
+			"loads": {m: dict(stats) for m, stats in self.loads.items()},
+		}
+
+
+_residency: Optional[ModelResidency] = None
+
+
+def get_residency() -> ModelResidency:
+	global _residency
+	if _residency is None:
+		from app.models import OLLAMA_URL
+		_residency = ModelResidency(OLLAMA_URL)
+	return _residency
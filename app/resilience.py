@@ -0,0 +1,110 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional
+
+
+class DeadlineExceeded(Exception):
+	"""The request ran out of its time budget."""
+
+
+class BackendUnavailable(Exception):
+	"""The backend's circuit breaker is open; calls fail fast until it cools down."""
+
+
+class Deadline:
+	"""Absolute point in time by which a request must finish.
+
+	Created once at the HTTP layer and passed down, so time spent in OCR or
+	waiting for a slot is automatically taken out of the model's budget.
+	"""
+
+	def __init__(self, seconds: float):
+		self.expires_at = time.monotonic() + seconds
+
+	def remaining(self) -> float:
+		return max(0.0, self.expires_at - time.monotonic())
+
+	def expired(self) -> bool:
+		return self.remaining() <= 0.0
+
+	async def run(self, awaitable, stage: str):
+		"""Await with the remaining budget, raising DeadlineExceeded on timeout"""
+		if self.expired():
+			raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+		try:
+			return await asyncio.wait_for(awaitable, self.remaining())
+		except asyncio.TimeoutError:
+			raise DeadlineExceeded(f"Deadline exceeded during {stage}") from None
+
+
+def backoff_delay(attempt: int, base: float = 0.25, cap: float = 4.0) -> float:
+	"""Full-jitter exponential backoff for the given retry attempt (0-based)"""
+	return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+	"""Consecutive-failure circuit breaker.
+
+	After failure_threshold failures in a row the circuit opens and calls are
+	rejected for reset_seconds; then a single trial call is let through and its
+	outcome closes or re-opens the circuit.
+	"""
+
+	def __init__(self, failure_threshold: int, reset_seconds: float):
+		self.failure_threshold = failure_threshold
+		self.reset_seconds = reset_seconds
+		self.failures = 0
+		self.opened_at: Optional[float] = None
+		self._trial_in_flight = False
+
+	@property
+	def state(self) -> str:
+		if self.opened_at is None:
+			return "closed"
+		if time.monotonic() - self.opened_at >= self.reset_seconds:
+			return "half-open"
+		return "open"
+
+	def before_call(self) -> bool:
+		"""Raise if calls are being rejected; returns whether this call is the half-open trial"""
+		state = self.state
+		if state == "open" or (state == "half-open" and self._trial_in_flight):
+			raise BackendUnavailable("Model backend is unavailable; try again shortly")
+		if state == "half-open":
+			self._trial_in_flight = True
+			return True
+		return False
+
+	def end_trial(self) -> None:
+		"""Release the trial slot however the trial call ended, so it can never stay in flight"""
+		self._trial_in_flight = False
+
+	def record_success(self) -> None:
+		self.failures = 0
+		self.opened_at = None
+		self._trial_in_flight = False
+
+	def record_cancelled(self) -> None:
+		# An abandoned call says nothing about backend health
+		self._trial_in_flight = False
+
+	def record_failure(self) -> None:
+		self.failures += 1
+		self._trial_in_flight = False
+		if self.opened_at is not None or self.failures >= self.failure_threshold:
+			self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(backend: str, failure_threshold: int, reset_seconds: float) -> CircuitBreaker:
+	breaker = _breakers.get(backend)
+	if breaker is None:
+		breaker = _breakers[backend] = CircuitBreaker(failure_threshold, reset_seconds)
+	return breaker
+
+
+def breaker_states() -> Dict[str, str]:
+	return {backend: b.state for backend, b in _breakers.items()}
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import contextvars
+import glob
+import hashlib
+import json
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+try:
+	import fcntl
+except ImportError:  # Windows: a single worker, nothing to coordinate
+	fcntl = None
+
+from app.config import get_config
+from app import metrics
+from app.fairness import current_client
+
+
+RESULT_LOG_PATH = os.environ.get("HELPERAI_RESULT_LOG", os.path.join("data", "results.jsonl"))
+
+# Records wait at most this long (seconds) or until this many are queued
+FLUSH_INTERVAL = 1.0
+MAX_BATCH = 500
+# Beyond this many unwritten records new ones are dropped rather than held in memory
+MAX_PENDING = 10000
+
+# Timings and cache flags of the request being solved in the current task
+_trace: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("result_trace", default=None)
+
+
+def question_hash(question: Optional[str]) -> Optional[str]:
+	"""sha256 of the question, ignoring case and whitespace"""
+	if question is None:
+		return None
+	return hashlib.sha256(" ".join(question.lower().split()).encode("utf-8")).hexdigest()
+
+
+def begin() -> Dict:
+	"""Start collecting timings and cache flags for a request solved in this task"""
+	trace = {"started": time.monotonic(), "timings": {}, "cache": {}}
+	_trace.set(trace)
+	return trace
+
+
+def record_stage(stage: str, seconds: float) -> None:
+	"""Add time spent in a stage (e.g. "ocr", "generation") to the current request, if traced"""
+	trace = _trace.get()
+	if trace is not None:
+		key = f"{stage}_ms"
+		trace["timings"][key] = round(trace["timings"].get(key, 0.0) + seconds * 1000, 1)
+
+
+def note_cache(name: str, hit: bool) -> None:
+	trace = _trace.get()
+	if trace is not None:
+		trace["cache"][name] = hit
+
+
+def result_record(trace: Dict, kind: str, question: Optional[str], options: Optional[List[str]],
+				  response=None, error: Optional[BaseException] = None, **extra) -> Dict:
+	"""The log record of one solved question (response is a ModelResponse)"""
+	record = {
+		"ts": round(time.time(), 3),
+		"kind": kind,
+		"client": current_client.get(),
+		"question_sha256": question_hash(question),
+		"options": options,
+		**extra,
+		"timings": {**trace["timings"], "total_ms": round((time.monotonic() - trace["started"]) * 1000, 1)},
+		"cache": dict(trace["cache"]),
+	}
+	if get_config().result_log_questions:
+		record["question"] = question
+	if response is not None:
+		record.update(model=response.model_name, answer=response.answer, confidence=response.confidence)
+		if "generation_ms" in record["timings"]:  # the model ran (not a cache or bank answer)
+			record.update(prompt_tokens=response.prompt_tokens, completion_tokens=response.completion_tokens)
+			if response.prefill_ms is not None:
+				record["timings"]["prefill_ms"] = response.prefill_ms
+	if error is not None:
+		record["error"] = f"{type(error).__name__}: {error}"
+	return record
+
+
+class ResultLog:
+	"""Append-only JSONL log of solved requests, written by a background thread.
+
+	write() only enqueues, so the event loop never waits on the disk. The
+	thread writes whole batches with one append, and rotates the file to
+	.1, .2, ... once it passes max_bytes. Workers share the file: appends go
+	through O_APPEND and rotation happens under a lock file.
+	"""
+
+	def __init__(self, path: str, max_bytes: int, backups: int):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.backups = backups
+		self._queue: queue.Queue = queue.Queue(MAX_PENDING)
+		self._fd: Optional[int] = None
+		self._thread = threading.Thread(target=self._run, name="result-log", daemon=True)
+		self._thread.start()
+
+	def write(self, record: Dict) -> None:
+		try:
+			self._queue.put_nowait(record)
+		except queue.Full:
+			metrics.incr("result_log_dropped")
+
+	def close(self, timeout: float = 5.0) -> None:
+		"""Flush what is queued and stop the writer"""
+		self._queue.put(None)
+		self._thread.join(timeout)
+
+	def _run(self) -> None:
+		while True:
+			batch = [self._queue.get()]
+			flush_at = time.monotonic() + FLUSH_INTERVAL
+			while batch[-1] is not None and len(batch) < MAX_BATCH:
+				try:
+					batch.append(self._queue.get(timeout=max(0.0, flush_at - time.monotonic())))
+				except queue.Empty:
+					break
+			records = [r for r in batch if r is not None]
+			if records:
+				try:
+					self._append("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+					metrics.incr("result_log_records", len(records))
+				except Exception as e:
+					metrics.incr("result_log_dropped", len(records))
+					print(f"Result log write error: {e}")
+			if batch[-1] is None:
+				if self._fd is not None:
+					os.close(self._fd)
+				return
+
+	def _open(self) -> None:
+		if self._fd is not None:
+			os.close(self._fd)
+		os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+		self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+	def _append(self, data: bytes) -> None:
+		with open(self.path + ".lock", "a") as lock:
+			if fcntl is not None:
+				fcntl.flock(lock, fcntl.LOCK_EX)
+			# Another worker may have rotated the file since we opened it
+			try:
+				current = os.stat(self.path).st_ino
+			except FileNotFoundError:
+				current = None
+			if self._fd is None or current != os.fstat(self._fd).st_ino:
+				self._open()
+			os.write(self._fd, data)
+			if os.fstat(self._fd).st_size >= self.max_bytes:
+				self._rotate()
+
+	def _rotate(self) -> None:
+		for n in range(self.backups - 1, 0, -1):
+			if os.path.exists(f"{self.path}.{n}"):
+				os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+		if self.backups > 0:
+			os.replace(self.path, f"{self.path}.1")
+		else:
+			os.remove(self.path)
+		self._open()
+
+
+_log: Optional[ResultLog] = None
+_log_lock = threading.Lock()
+
+
+def get_result_log() -> Optional[ResultLog]:
+	"""The process's result log, or None if result_log is off"""
+	global _log
+	cfg = get_config()
+	if not cfg.result_log:
+		return None
+	with _log_lock:
+		if _log is None:
+			_log = ResultLog(RESULT_LOG_PATH, cfg.result_log_max_mb * 2**20, cfg.result_log_backups)
+	return _log
+
+
+def log_result(record: Dict) -> None:
+	log = get_result_log()
+	if log is not None:
+		log.write(record)
+
+
+def close_result_log() -> None:
+	"""Flush and stop the writer (at shutdown); a later record starts a new one"""
+	global _log
+	with _log_lock:
+		log, _log = _log, None
+	if log is not None:
+		log.close()
+
+
+def log_files(path: str = RESULT_LOG_PATH) -> List[str]:
+	"""The log and its rotated backups, oldest first"""
+	backups = [p for p in glob.glob(glob.escape(path) + ".*") if p.rsplit(".", 1)[1].isdigit()]
+	backups.sort(key=lambda p: int(p.rsplit(".", 1)[1]), reverse=True)
+	return backups + ([path] if os.path.exists(path) else [])
+
+
+def read_results(path: str = RESULT_LOG_PATH, since: float = 0.0) -> Iterator[Dict]:
+	"""Stream records from the log and its backups, oldest first, skipping lines cut off mid-write"""
+	for name in log_files(path):
+		with open(name, encoding="utf-8") as f:
+			for line in f:
+				try:
+					record = json.loads(line)
+				except json.JSONDecodeError:
+					continue
+				if record.get("ts", 0) >= since:
+					yield record
+
+
+def _stats(records: Iterator[Dict]) -> None:
+	count, errors = 0, 0
+	kinds: Counter = Counter()
+	hits: Dict[str, List[bool]] = {}
+	timings: Dict[str, List[float]] = {}
+	questions: Counter = Counter()
+	for record in records:
+		count += 1
+		errors += "error" in record
+		kinds[record["kind"]] += 1
+		if record.get("question_sha256"):
+			questions[record["question_sha256"]] += 1
+		for name, hit in record.get("cache", {}).items():
+			hits.setdefault(name, []).append(hit)
+		for name, ms in record.get("timings", {}).items():
+			timings.setdefault(name, []).append(ms)
+	print(f"{count} records ({dict(kinds)}), {errors} errors, {len(questions)} distinct questions")
+	for name, values in sorted(hits.items()):
+		print(f"  {name} cache hit rate {sum(values) / len(values):.1%} of {len(values)}")
+	for name, values in sorted(timings.items()):
+		ordered = sorted(values)
+		p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+		print(f"  {name:16s} p50 {statistics.median(ordered):9.1f}  p95 {p95:9.1f}")
+	repeated = [(h, n) for h, n in questions.most_common(10) if n > 1]
+	if repeated:
+		print("Most repeated questions:")
+		for digest, n in repeated:
+			print(f"  {n:5d}  {digest[:16]}")
+
+
+async def _warm(records: Iterator[Dict], top: int, min_count: int) -> None:
+	"""Answer the most asked MCQs with the current config, filling the shared answer cache"""
+	from app.models import run_mcq_model
+	counts: Counter = Counter()
+	latest: Dict = {}
+	for record in records:
+		if record["kind"] in ("text", "image") and record.get("question") and record.get("options"):
+			key = (record["question_sha256"], tuple(record["options"]))
+			counts[key] += 1
+			latest[key] = record
+	todo = [latest[key] for key, n in counts.most_common(top) if n >= min_count]
+	if not todo:
+		print("Nothing to warm (question text is only logged with result_log_questions on)")
+		return
+	for n, record in enumerate(todo, start=1):
+		try:
+			await run_mcq_model(record["question"], record["options"], learn=False, compact=record["kind"] == "image")
+			print(f"[{n}/{len(todo)}] {record['question_sha256'][:16]} warmed")
+		except Exception as e:
+			print(f"[{n}/{len(todo)}] {record['question_sha256'][:16]} failed: {type(e).__name__}: {e}")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Read the result log")
+	parser.add_argument("--path", default=RESULT_LOG_PATH)
+	parser.add_argument("--since", type=float, default=0.0, help="Only records from this Unix time on")
+	sub = parser.add_subparsers(dest="command", required=True)
+	sub.add_parser("dump", help="Print the records as JSONL, oldest first")
+	sub.add_parser("stats", help="Cache hit rates, stage timings and repeated questions")
+	warm = sub.add_parser("warm", help="Pre-fill the answer cache with the most asked MCQs")
+	warm.add_argument("--top", type=int, default=100)
+	warm.add_argument("--min-count", type=int, default=2)
+	args = parser.parse_args()
+
+	records = read_results(args.path, args.since)
+	if args.command == "dump":
+		for record in records:
+			print(json.dumps(record, ensure_ascii=False))
+	elif args.command == "stats":
+		_stats(records)
+	else:
+		asyncio.run(_warm(records, args.top, args.min_count))
+
+
+if __name__ == "__main__":
+	main()
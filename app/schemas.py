@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 from pydantic import BaseModel, Field
 
 
@@ -9,6 +9,11 @@ class MCQRequest(BaseModel):
 	)
 
 
+class BankEntryRequest(MCQRequest):
+	answer: str = Field(..., min_length=1, max_length=1, description="Correct option letter")
+	explanation: str = ""
+
+
 class FreeformRequest(BaseModel):
 	question: str = Field(..., description="Question text without options")
 
@@ -20,6 +25,11 @@ class ModelResponse(BaseModel):
 	confidence: float = 0.5
 	raw_text: Optional[str] = None
 	thought_process: Optional[str] = None  # For freeform questions
+	# Prompt size, prefill time and tokens generated by the model call (None when answered from a cache or the bank)
+	prompt_tokens: Optional[int] = None
+	prompt_tokens_saved: Optional[int] = None
+	prefill_ms: Optional[float] = None
+	completion_tokens: Optional[int] = None
 
 	# Allow field names starting with 'model_' (e.g., model_name)
 	model_config = {
@@ -42,3 +52,13 @@ class FreeformResponse(BaseModel):
 	confidence: float
 	model: str
 
+
+
+class JobStatus(BaseModel):
+	job_id: str
+	kind: str
+	status: str  # queued, running, done, failed, cancelled
+	result: Optional[Dict[str, Any]] = None
+	error: Optional[str] = None
+	created_at: float
+	updated_at: float
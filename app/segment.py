@@ -0,0 +1,95 @@
+import re
+import statistics
+from typing import List, NamedTuple, Optional
+
+from app.ocr import parse_mcq_from_lines
+from app.ocr_engines import TextBox
+
+
+# "12.", "12)", "Q12:", "Question 12 -" at the start of a line
+_NUMBER_RE = re.compile(r"^\s*(?:q(?:uestion)?\s*\.?\s*)?(\d{1,3})\s*[.):\-]\s*", re.IGNORECASE)
+
+
+class Line(NamedTuple):
+	text: str
+	x0: float
+	y0: float
+	y1: float
+
+
+class QuestionSegment(NamedTuple):
+	number: Optional[int]
+	question: Optional[str]
+	options: Optional[List[str]]
+
+
+def group_lines(boxes: List[TextBox]) -> List[Line]:
+	"""Merge OCR boxes into visual lines (boxes overlapping vertically), top to bottom"""
+	lines: List[List[TextBox]] = []
+	for box in sorted(boxes, key=lambda b: (b.y0, b.x0)):
+		if lines:
+			last = lines[-1]
+			top = min(b.y0 for b in last)
+			bottom = max(b.y1 for b in last)
+			overlap = min(bottom, box.y1) - max(top, box.y0)
+			if overlap > 0.5 * min(bottom - top, box.y1 - box.y0):
+				last.append(box)
+				continue
+		lines.append([box])
+	result = []
+	for line in lines:
+		line.sort(key=lambda b: b.x0)
+		result.append(Line(" ".join(b.text for b in line), line[0].x0,
+						   min(b.y0 for b in line), max(b.y1 for b in line)))
+	return result
+
+
+def _question_starts(lines: List[Line]) -> List[int]:
+	"""Indices of the lines that start numbered questions, or [] if the page holds just one.
+
+	A start is a numbered line at the left margin (options and wrapped text are
+	usually indented), and the numbers must run consecutively, so "1)" inside
+	an option list or a stray number in a sentence does not split a question.
+	"""
+	if len(lines) < 4:
+		return []
+	height = statistics.median(line.y1 - line.y0 for line in lines) or 1.0
+	margin = min(line.x0 for line in lines)
+	candidates = []
+	for i, line in enumerate(lines):
+		match = _NUMBER_RE.match(line.text)
+		if match and line.x0 <= margin + 1.5 * height:
+			candidates.append((i, int(match.group(1))))
+	# Longest run of candidates numbered n, n+1, n+2, ... in reading order
+	best: List[int] = []
+	for start in range(len(candidates)):
+		run = [candidates[start]]
+		for candidate in candidates[start + 1:]:
+			if candidate[1] == run[-1][1] + 1:
+				run.append(candidate)
+		if len(run) > len(best):
+			best = [i for i, _n in run]
+	return best if len(best) >= 2 else []
+
+
+def split_questions(boxes: List[TextBox], max_questions: int) -> List[QuestionSegment]:
+	"""Split one screenshot's OCR boxes into its questions, in page order.
+
+	Pages with a single question (or no recognizable numbering) come back as
+	one segment parsed exactly like before.
+	"""
+	lines = group_lines(boxes)
+	all_starts = _question_starts(lines)
+	starts = all_starts[:max_questions]
+	if not starts:
+		question, options = parse_mcq_from_lines([box.text for box in boxes])
+		return [QuestionSegment(None, question, options)]
+	segments = []
+	for k, start in enumerate(starts):
+		end = all_starts[k + 1] if k + 1 < len(all_starts) else len(lines)
+		texts = [line.text for line in lines[start:end]]
+		match = _NUMBER_RE.match(texts[0])
+		texts[0] = texts[0][match.end():]
+		question, options = parse_mcq_from_lines(texts)
+		segments.append(QuestionSegment(int(match.group(1)), question, options))
+	return segments
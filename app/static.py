@@ -0,0 +1,54 @@
+import gzip
+import hashlib
+from typing import Dict
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+	import brotli
+except ImportError:  # optional; gzip is always available
+	brotli = None
+
+
+class StaticAsset:
+	"""In-memory response body, precompressed once, served with strong ETags.
+
+	Each encoding gets its own ETag (as required for strong validators), and a
+	matching If-None-Match yields 304 without sending the body again.
+	"""
+
+	def __init__(self, body: bytes, media_type: str, cache_control: str = "no-cache"):
+		self.media_type = media_type
+		self.cache_control = cache_control
+		digest = hashlib.sha256(body).hexdigest()[:32]
+		self.variants: Dict[str, bytes] = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+		if brotli is not None:
+			self.variants["br"] = brotli.compress(body)
+		self.etags = {
+			enc: f'"{digest}"' if enc == "identity" else f'"{digest}-{enc}"'
+			for enc in self.variants
+		}
+
+	def _pick_encoding(self, accept_encoding: str) -> str:
+		accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+		for enc in ("br", "gzip"):
+			if enc in accepted and enc in self.variants:
+				return enc
+		return "identity"
+
+	def response(self, request: Request) -> Response:
+		encoding = self._pick_encoding(request.headers.get("accept-encoding", ""))
+		headers = {
+			"ETag": self.etags[encoding],
+			"Cache-Control": self.cache_control,
+			"Vary": "Accept-Encoding",
+		}
+		if_none_match = request.headers.get("if-none-match", "")
+		if if_none_match.strip() == "*" or any(
+			tag.strip() in self.etags.values() for tag in if_none_match.split(",")
+		):
+			return Response(status_code=304, headers=headers)
+		if encoding != "identity":
+			headers["Content-Encoding"] = encoding
+		return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
@@ -0,0 +1,275 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+STORE_PATH = os.environ.get(
+	"HELPERAI_STORE", os.path.join(tempfile.gettempdir(), "helperai_store.sqlite3")
+)
+
+# Expired cache rows are purged at most this often (seconds)
+_PURGE_INTERVAL = 60.0
+
+
+class SharedStore:
+	"""SQLite (WAL mode) store shared by every worker process on this host.
+
+	Holds the answer/OCR caches, the runtime config, async job state and
+	dedupe keys, the push-event log and per-worker stats and slot numbers so that all uvicorn
+	workers see the same data. One connection is kept per thread.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._local = threading.local()
+		self._last_purge = 0.0
+		self._conn().executescript(
+			"""
+			CREATE TABLE IF NOT EXISTS cache (
+				namespace TEXT NOT NULL,
+				key TEXT NOT NULL,
+				value TEXT NOT NULL,
+				expires_at REAL NOT NULL,
+				PRIMARY KEY (namespace, key)
+			);
+			CREATE TABLE IF NOT EXISTS config (
+				id INTEGER PRIMARY KEY CHECK (id = 1),
+				version INTEGER NOT NULL,
+				value TEXT NOT NULL
+			);
+			CREATE TABLE IF NOT EXISTS jobs (
+				job_id TEXT PRIMARY KEY,
+				kind TEXT NOT NULL,
+				status TEXT NOT NULL,
+				result TEXT,
+				error TEXT,
+				owner_pid INTEGER NOT NULL,
+				cancel_requested INTEGER NOT NULL DEFAULT 0,
+				created_at REAL NOT NULL,
+				updated_at REAL NOT NULL
+			);
+			CREATE TABLE IF NOT EXISTS job_keys (
+				key TEXT PRIMARY KEY,
+				job_id TEXT NOT NULL
+			);
+			CREATE TABLE IF NOT EXISTS events (
+				id INTEGER PRIMARY KEY AUTOINCREMENT,
+				session TEXT,
+				origin_pid INTEGER NOT NULL,
+				event TEXT NOT NULL,
+				data TEXT NOT NULL,
+				created_at REAL NOT NULL
+			);
+			CREATE TABLE IF NOT EXISTS worker_stats (
+				pid INTEGER PRIMARY KEY,
+				value TEXT NOT NULL,
+				updated_at REAL NOT NULL
+			);
+			CREATE TABLE IF NOT EXISTS worker_slots (
+				slot INTEGER PRIMARY KEY,
+				pid INTEGER NOT NULL
+			);
+			"""
+		)
+
+	def _conn(self) -> sqlite3.Connection:
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			self._local.conn = conn
+		return conn
+
+	def cache_get(self, namespace: str, key: str) -> Optional[Any]:
+		row = self._conn().execute(
+			"SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+			(namespace, key),
+		).fetchone()
+		if row is None or row[1] < time.time():
+			return None
+		return json.loads(row[0])
+
+	def cache_set(self, namespace: str, key: str, value: Any, ttl_seconds: float) -> None:
+		now = time.time()
+		conn = self._conn()
+		conn.execute(
+			"INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+			(namespace, key, json.dumps(value), now + ttl_seconds),
+		)
+		if now - self._last_purge > _PURGE_INTERVAL:
+			self._last_purge = now
+			conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+
+	def config_stamp(self) -> Optional[Tuple[int, int]]:
+		"""Changes whenever the config is saved; a stat() instead of a query, for get_config's hot path"""
+		try:
+			st = os.stat(self.path + ".config-version")
+		except FileNotFoundError:
+			return None
+		return st.st_mtime_ns, st.st_ino
+
+	def load_config(self, known_version: int) -> Optional[Tuple[int, Dict]]:
+		"""Return (version, values) if the stored config is newer than known_version."""
+		row = self._conn().execute("SELECT version, value FROM config WHERE id = 1").fetchone()
+		if row is None or row[0] <= known_version:
+			return None
+		return row[0], json.loads(row[1])
+
+	def save_config(self, values: Dict) -> int:
+		conn = self._conn()
+		conn.execute("BEGIN IMMEDIATE")
+		try:
+			row = conn.execute("SELECT version FROM config WHERE id = 1").fetchone()
+			version = (row[0] if row else 0) + 1
+			conn.execute(
+				"INSERT OR REPLACE INTO config (id, version, value) VALUES (1, ?, ?)",
+				(version, json.dumps(values)),
+			)
+			conn.execute("COMMIT")
+		except Exception:
+			conn.execute("ROLLBACK")
+			raise
+		# A new file (inode) per save, so readers notice even within one mtime tick
+		tmp = f"{self.path}.config-version.{os.getpid()}"
+		with open(tmp, "w") as f:
+			f.write(str(version))
+		os.replace(tmp, self.path + ".config-version")
+		return version
+
+	def worker_slot_claim(self, pid: int, alive: Callable[[int], bool]) -> int:
+		"""Lowest slot number not held by a live process; a process keeps its slot once claimed"""
+		conn = self._conn()
+		conn.execute("BEGIN IMMEDIATE")
+		try:
+			held = dict(conn.execute("SELECT slot, pid FROM worker_slots").fetchall())
+			slot = next((s for s, owner in held.items() if owner == pid), None)
+			if slot is None:
+				slot = 0
+				while slot in held and alive(held[slot]):
+					slot += 1
+				conn.execute("INSERT OR REPLACE INTO worker_slots (slot, pid) VALUES (?, ?)", (slot, pid))
+			conn.execute("COMMIT")
+		except Exception:
+			conn.execute("ROLLBACK")
+			raise
+		return slot
+
+	def worker_stats_set(self, pid: int, stats: Dict) -> None:
+		self._conn().execute(
+			"INSERT OR REPLACE INTO worker_stats (pid, value, updated_at) VALUES (?, ?, ?)",
+			(pid, json.dumps(stats), time.time()),
+		)
+
+	def worker_stats_all(self, max_age: float) -> Dict[int, Dict]:
+		"""Latest stats of every worker that reported within max_age seconds; older rows are dropped"""
+		conn = self._conn()
+		conn.execute("DELETE FROM worker_stats WHERE updated_at < ?", (time.time() - max_age,))
+		rows = conn.execute("SELECT pid, value FROM worker_stats ORDER BY pid").fetchall()
+		return {r[0]: json.loads(r[1]) for r in rows}
+
+	def job_create(self, job_id: str, kind: str) -> None:
+		now = time.time()
+		self._conn().execute(
+			"INSERT INTO jobs (job_id, kind, status, owner_pid, created_at, updated_at) "
+			"VALUES (?, ?, 'queued', ?, ?, ?)",
+			(job_id, kind, os.getpid(), now, now),
+		)
+
+	def job_update(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+		self._conn().execute(
+			"UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+			(status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+		)
+
+	def job_get(self, job_id: str) -> Optional[Dict]:
+		row = self._conn().execute(
+			"SELECT job_id, kind, status, result, error, owner_pid, cancel_requested, created_at, updated_at "
+			"FROM jobs WHERE job_id = ?",
+			(job_id,),
+		).fetchone()
+		if row is None:
+			return None
+		return {
+			"job_id": row[0],
+			"kind": row[1],
+			"status": row[2],
+			"result": json.loads(row[3]) if row[3] else None,
+			"error": row[4],
+			"owner_pid": row[5],
+			"cancel_requested": bool(row[6]),
+			"created_at": row[7],
+			"updated_at": row[8],
+		}
+
+	def job_request_cancel(self, job_id: str) -> None:
+		self._conn().execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+
+	def job_unfinished_owners(self) -> List[int]:
+		rows = self._conn().execute(
+			"SELECT DISTINCT owner_pid FROM jobs WHERE status IN ('queued', 'running')"
+		).fetchall()
+		return [r[0] for r in rows]
+
+	def job_fail_owned_by(self, owner_pid: int, error: str) -> None:
+		self._conn().execute(
+			"UPDATE jobs SET status = 'failed', error = ?, updated_at = ? "
+			"WHERE owner_pid = ? AND status IN ('queued', 'running')",
+			(error, time.time(), owner_pid),
+		)
+
+	def job_purge(self, older_than: float) -> None:
+		conn = self._conn()
+		conn.execute(
+			"DELETE FROM jobs WHERE updated_at < ? AND status NOT IN ('queued', 'running')",
+			(older_than,),
+		)
+		# Keys left behind by workers that died mid-job
+		conn.execute(
+			"DELETE FROM job_keys WHERE job_id NOT IN (SELECT job_id FROM jobs WHERE status IN ('queued', 'running'))"
+		)
+
+	def job_key_set(self, key: str, job_id: str) -> None:
+		self._conn().execute("INSERT OR REPLACE INTO job_keys (key, job_id) VALUES (?, ?)", (key, job_id))
+
+	def job_key_get(self, key: str) -> Optional[str]:
+		row = self._conn().execute("SELECT job_id FROM job_keys WHERE key = ?", (key,)).fetchone()
+		return row[0] if row else None
+
+	def job_key_delete(self, key: str, job_id: str) -> None:
+		"""Forget key, unless it has meanwhile been taken by another job"""
+		self._conn().execute("DELETE FROM job_keys WHERE key = ? AND job_id = ?", (key, job_id))
+
+	def event_append(self, session: Optional[str], origin_pid: int, event: str, data: Dict) -> None:
+		self._conn().execute(
+			"INSERT INTO events (session, origin_pid, event, data, created_at) VALUES (?, ?, ?, ?, ?)",
+			(session, origin_pid, event, json.dumps(data), time.time()),
+		)
+
+	def event_last_id(self) -> int:
+		row = self._conn().execute("SELECT MAX(id) FROM events").fetchone()
+		return row[0] or 0
+
+	def events_since(self, last_id: int) -> List[Tuple[int, Optional[str], int, str, Dict]]:
+		rows = self._conn().execute(
+			"SELECT id, session, origin_pid, event, data FROM events WHERE id > ? ORDER BY id",
+			(last_id,),
+		).fetchall()
+		return [(r[0], r[1], r[2], r[3], json.loads(r[4])) for r in rows]
+
+	def events_purge(self, older_than: float) -> None:
+		self._conn().execute("DELETE FROM events WHERE created_at < ?", (older_than,))
+
+
+_store_singleton: Optional[SharedStore] = None
+
+
+def get_store() -> SharedStore:
+	global _store_singleton
+	if _store_singleton is None:
+		_store_singleton = SharedStore(STORE_PATH)
+	return _store_singleton
@@ -0,0 +1,106 @@
+import os
+import threading
+from typing import Dict, List, Optional
+
+from app.config import get_config
+from app.store import get_store
+
+
+# Processes sharing this machine's cores: uvicorn workers (set by the launcher)
+# or batch OCR processes
+WORKERS_ENV = "HELPERAI_WORKERS"
+
+# Native thread pools sized from the environment when the library loads
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+					"NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+_lock = threading.Lock()
+_budget: Optional[Dict] = None
+
+
+def available_cores() -> int:
+	return len(usable_cores())
+
+
+def usable_cores() -> List[int]:
+	if hasattr(os, "sched_getaffinity"):
+		return sorted(os.sched_getaffinity(0))
+	return list(range(os.cpu_count() or 1))
+
+
+def _plan() -> Dict:
+	cfg = get_config()
+	cores = usable_cores()
+	processes = max(1, int(os.environ.get(WORKERS_ENV, "1")))
+	core_set = None
+	if cfg.pin_ocr_cores and hasattr(os, "sched_setaffinity"):
+		import psutil
+		slot = get_store().worker_slot_claim(os.getpid(), psutil.pid_exists) % processes
+		if processes <= len(cores):
+			share = len(cores) // processes
+			core_set = cores[slot * share:(slot + 1) * share]
+		else:
+			core_set = [cores[slot % len(cores)]]
+		process_cores = len(core_set)
+	else:
+		process_cores = max(1, len(cores) // processes)
+	return {
+		"cores": len(cores),
+		"processes": processes,
+		"ocr_workers": cfg.ocr_workers,
+		# Threads each concurrent OCR call may use inside Paddle/ONNX Runtime, OpenCV and BLAS
+		"threads_per_ocr": max(1, process_cores // max(1, cfg.ocr_workers)),
+		"core_set": core_set,
+	}
+
+
+def ensure_thread_budget() -> Dict:
+	"""Size the native thread pools of this process once, before they are created.
+
+	Call before numpy, OpenCV or an OCR runtime is first imported; environment
+	variables set after that have no effect on BLAS/OpenMP. Explicit values in
+	the environment are left alone.
+	"""
+	global _budget
+	with _lock:
+		if _budget is not None:
+			return _budget
+		plan = _plan()
+		if get_config().thread_budget:
+			for var in _THREAD_ENV_VARS:
+				os.environ.setdefault(var, str(plan["threads_per_ocr"]))
+			import cv2
+			cv2.setNumThreads(plan["threads_per_ocr"])
+			try:
+				from threadpoolctl import threadpool_limits
+			except ImportError:  # optional; only matters if BLAS was loaded before the env was set
+				pass
+			else:
+				threadpool_limits(plan["threads_per_ocr"])
+		_budget = plan
+		return plan
+
+
+def current_budget() -> Optional[Dict]:
+	"""The budget applied in this process, or None if it has not loaded OCR yet"""
+	return _budget
+
+
+def ocr_threads() -> int:
+	"""Intra-op threads for the OCR engine: ocr_threads if set, else the budget (0 = library default)"""
+	cfg = get_config()
+	if cfg.ocr_threads > 0:
+		return cfg.ocr_threads
+	if not cfg.thread_budget:
+		return 0
+	return ensure_thread_budget()["threads_per_ocr"]
+
+
+def pin_current_thread() -> None:
+	"""Thread/process initializer: restrict the caller to this process's core set, if pinning is on.
+
+	Native threads started later from it (OpenMP, ONNX Runtime) inherit the set.
+	"""
+	core_set = ensure_thread_budget()["core_set"]
+	if core_set:
+		os.sched_setaffinity(0, core_set)
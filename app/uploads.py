@@ -0,0 +1,105 @@
+import hashlib
+import tempfile
+from typing import BinaryIO, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from app.config import get_config
+
+
+# Uploads are copied in chunks of this size into a spooled file that stays in
+# memory up to SPOOL_MEMORY_BYTES and moves to disk beyond that.
+CHUNK_BYTES = 256 * 1024
+SPOOL_MEMORY_BYTES = 1024 * 1024
+# Room for multipart boundaries and form fields on top of max_upload_bytes
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+	pass
+
+
+async def _reject(send) -> None:
+	await send({
+		"type": "http.response.start",
+		"status": 413,
+		"headers": [(b"content-type", b"application/json"), (b"connection", b"close")],
+	})
+	await send({"type": "http.response.body", "body": b'{"error": "Upload too large"}'})
+
+
+class UploadLimitMiddleware:
+	"""ASGI middleware enforcing max_upload_bytes on request bodies while they stream in.
+
+	A too-large Content-Length is rejected before any of the body is read;
+	otherwise the body is counted as it arrives and the request is cut off
+	with 413 as soon as it passes the limit, before the form is fully buffered.
+	"""
+
+	def __init__(self, app):
+		self.app = app
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+			await self.app(scope, receive, send)
+			return
+		limit = get_config().max_upload_bytes + MULTIPART_OVERHEAD
+		length = dict(scope["headers"]).get(b"content-length", b"")
+		if length.isdigit() and int(length) > limit:
+			await _reject(send)
+			return
+
+		received = 0
+		exceeded = False
+		response_started = False
+
+		async def limited_receive():
+			nonlocal received, exceeded
+			message = await receive()
+			if message["type"] == "http.request":
+				received += len(message.get("body", b""))
+				if received > limit:
+					exceeded = True
+					raise UploadTooLarge()
+			return message
+
+		async def guarded_send(message):
+			nonlocal response_started
+			# Once over the limit, drop whatever error the app produced; we answer 413 below
+			if exceeded:
+				return
+			response_started = True
+			await send(message)
+
+		try:
+			await self.app(scope, limited_receive, guarded_send)
+		except UploadTooLarge:
+			pass
+		if exceeded and not response_started:
+			await _reject(send)
+
+
+async def spool_upload(upload: UploadFile) -> Tuple[BinaryIO, str]:
+	"""Copy an upload into our own spooled file, returning it with its sha256 hex digest.
+
+	The copy outlives the request (async jobs need that) and keeps at most
+	SPOOL_MEMORY_BYTES of the image in memory; the caller must close it.
+	"""
+	max_bytes = get_config().max_upload_bytes
+	if upload.size is not None and upload.size > max_bytes:
+		raise HTTPException(status_code=413, detail="Upload too large")
+	out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+	digest = hashlib.sha256()
+	size = 0
+	while True:
+		chunk = await upload.read(CHUNK_BYTES)
+		if not chunk:
+			break
+		size += len(chunk)
+		if size > max_bytes:
+			out.close()
+			raise HTTPException(status_code=413, detail="Upload too large")
+		digest.update(chunk)
+		out.write(chunk)
+	out.seek(0)
+	return out, digest.hexdigest()
@@ -0,0 +1,155 @@
+import logging
+import math
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import psutil
+
+from app.config import get_config
+from app.store import get_store
+from app import metrics
+from app.threads import WORKERS_ENV
+
+
+logger = logging.getLogger(__name__)
+
+
+SAMPLE_INTERVAL = 5.0
+# Slack on top of the time a draining worker's remaining work may take by its
+# deadlines, after which it exits even if work is still running
+DRAIN_GRACE_SECONDS = 30.0
+
+
+class MemoryWatchdog:
+	"""Samples this worker's memory from a background thread.
+
+	The sample is what /status serves, and is shared with the other workers
+	through the store; the other workers' samples are read back on the same
+	schedule. When RSS passes worker_max_rss_mb or the worker has run
+	worker_max_ocr_runs OCRs, it drains: new work is refused (503, so clients
+	retry on another worker), queued and running work finishes, then the
+	process stops itself and the uvicorn supervisor starts a fresh one.
+	"""
+
+	def __init__(self, busy: Callable[[], int], interval: float = SAMPLE_INTERVAL):
+		self.busy = busy
+		self.interval = interval
+		self.process = psutil.Process()
+		self.started_at = time.time()
+		self.peak_rss = 0
+		self.ocr_runs = 0
+		self.draining_since: Optional[float] = None
+		self.drain_reason: Optional[str] = None
+		self.drain_limit = 0.0
+		self._workers: Dict[int, Dict] = {}
+		self._stopping = False
+		self._snapshot: Dict = {}
+		self._lock = threading.Lock()
+		self.sample()
+
+	@property
+	def draining(self) -> bool:
+		return self.draining_since is not None
+
+	def note_ocr(self) -> None:
+		with self._lock:
+			self.ocr_runs += 1
+
+	def start(self) -> None:
+		threading.Thread(target=self._run, name="memory-watchdog", daemon=True).start()
+
+	def snapshot(self) -> Dict:
+		return self._snapshot
+
+	def workers(self) -> Dict[int, Dict]:
+		"""Every live worker's last sample, as of this worker's last sample"""
+		return self._workers
+
+	def sample(self) -> Dict:
+		rss = self.process.memory_info().rss
+		self.peak_rss = max(self.peak_rss, rss)
+		vm = psutil.virtual_memory()
+		worker = {
+			"pid": os.getpid(),
+			"rss_mb": round(rss / 2**20, 1),
+			"peak_rss_mb": round(self.peak_rss / 2**20, 1),
+			"ocr_runs": self.ocr_runs,
+			"uptime_seconds": round(time.time() - self.started_at),
+			"state": "draining" if self.draining else "serving",
+			"drain_reason": self.drain_reason,
+		}
+		self._snapshot = {
+			"sampled_at": time.time(),
+			"worker": worker,
+			"system": {
+				"total_gb": round(vm.total / (1024**3), 2),
+				"used_gb": round(vm.used / (1024**3), 2),
+				"available_gb": round(vm.available / (1024**3), 2),
+				"percent": vm.percent,
+			},
+		}
+		metrics.set_gauge("rss_mb", worker["rss_mb"])
+		metrics.set_gauge("peak_rss_mb", worker["peak_rss_mb"])
+		return self._snapshot
+
+	def _check(self) -> None:
+		cfg = get_config()
+		if self.draining:
+			if not self._stopping and (self.busy() == 0 or time.time() - self.draining_since > self.drain_limit):
+				# uvicorn shuts down gracefully on SIGTERM; the supervisor replaces the worker
+				self._stopping = True
+				os.kill(os.getpid(), signal.SIGTERM)
+			return
+		if int(os.environ.get(WORKERS_ENV, "1")) < 2:
+			return  # a lone uvicorn process has no supervisor to restart it
+		rss_mb = self._snapshot["worker"]["rss_mb"]
+		if cfg.worker_max_rss_mb > 0 and rss_mb > cfg.worker_max_rss_mb:
+			self.drain_reason = f"RSS {rss_mb:.0f} MB over {cfg.worker_max_rss_mb} MB"
+		elif cfg.worker_max_ocr_runs > 0 and self.ocr_runs >= cfg.worker_max_ocr_runs:
+			self.drain_reason = f"{self.ocr_runs} OCR runs"
+		else:
+			return
+		# No new work is admitted while draining, so what is left is done, one
+		# deadline per batch of job_concurrency, before this limit
+		timeout = max(cfg.job_timeout_seconds, cfg.request_timeout_seconds)
+		batches = max(1, math.ceil(self.busy() / max(cfg.job_concurrency, 1)))
+		self.drain_limit = timeout * batches + DRAIN_GRACE_SECONDS
+		self.draining_since = time.time()
+		metrics.incr("worker_recycles")
+		logger.warning("Worker %d recycling: %s", os.getpid(), self.drain_reason)
+
+	def _run(self) -> None:
+		while True:
+			try:
+				self.sample()
+				self._check()
+				get_store().worker_stats_set(os.getpid(), self._snapshot["worker"])
+				self._workers = all_workers()
+			except Exception as e:
+				logger.exception("Memory watchdog error: %s", e)
+			time.sleep(self.interval if not self.draining else 1.0)
+
+
+_watchdog: Optional[MemoryWatchdog] = None
+
+
+def start_watchdog(busy: Callable[[], int]) -> MemoryWatchdog:
+	"""Start sampling; busy() returns how many jobs and requests are still being worked on"""
+	global _watchdog
+	if _watchdog is None:
+		_watchdog = MemoryWatchdog(busy)
+		_watchdog.start()
+	return _watchdog
+
+
+def get_watchdog() -> Optional[MemoryWatchdog]:
+	return _watchdog
+
+
+def all_workers() -> Dict[int, Dict]:
+	"""Last sample of every live worker, including this one"""
+	stats = get_store().worker_stats_all(max_age=SAMPLE_INTERVAL * 3)
+	return {pid: worker for pid, worker in stats.items() if psutil.pid_exists(pid)}
@@ -0,0 +1,77 @@
+"""Benchmark the activity updater over a synthetic multi-year history.
+
+Runs the updater's log, stats and quote updates in a temporary directory,
+several times per simulated day, and prints the time per run as the history
+grows; it should stay flat. Checks at the end that the incrementally kept
+stats and totals match a rebuild from the events file.
+
+Usage: python benchmarks/bench_activity.py [--years 3] [--runs-per-day 8]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".github", "scripts"))
+
+import update_activity  # noqa: E402
+
+
+CONFIG = {"maintenance": {"cleanup_old_logs": True, "max_log_entries": 365}}
+
+
+def run_once(now: datetime) -> float:
+	start = time.perf_counter()
+	with contextlib.redirect_stdout(io.StringIO()):
+		update_activity.update_daily_log(now)
+		update_activity.update_stats(now)
+		update_activity.update_quote_file(now)
+		update_activity.cleanup_old_logs(CONFIG)
+	return time.perf_counter() - start
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--years", type=float, default=3.0)
+	parser.add_argument("--runs-per-day", type=int, default=8)
+	args = parser.parse_args()
+	random.seed(0)
+	os.chdir(tempfile.mkdtemp())
+	update_activity.ensure_directories()
+
+	days = int(args.years * 365)
+	start_day = datetime(2025, 1, 1, 8)
+	print(f"{days} days x {args.runs_per_day} runs")
+	print(f"  {'day':>5s} {'mean ms':>8s} {'p95 ms':>8s} {'events KB':>10s} {'quotes KB':>10s} {'logs':>5s}")
+	window = []
+	for day in range(days):
+		for run in range(args.runs_per_day):
+			now = start_day + timedelta(days=day, minutes=run * 90 + random.randint(0, 60))
+			window.append(run_once(now))
+		if (day + 1) % 90 == 0 or day + 1 == days:
+			ordered = sorted(window)
+			p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+			logs = len(os.listdir(update_activity.LOG_DIR)) - 1  # minus the index
+			print(f"  {day + 1:5d} {statistics.mean(window) * 1000:8.2f} {p95 * 1000:8.2f}"
+				  f" {os.path.getsize(update_activity.EVENTS_FILE) / 1024:10.1f}"
+				  f" {os.path.getsize(update_activity.QUOTES_FILE) / 1024:10.1f} {logs:5d}")
+			window = []
+
+	stats = update_activity.read_json(update_activity.STATS_FILE, None)
+	totals = update_activity.read_json(update_activity.TOTALS_FILE, None)
+	rebuilt_stats, rebuilt_totals = update_activity.rebuild_rollups(now)
+	totals.pop("compacted_bytes"), rebuilt_totals.pop("compacted_bytes")
+	assert stats == rebuilt_stats, "daily stats differ from a rebuild"
+	assert totals == rebuilt_totals, "totals differ from a rebuild"
+	assert totals["commits"] == days * args.runs_per_day
+	print(f"incremental rollups match a rebuild: {totals['commits']} commits over {totals['days']} days")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,56 @@
+"""Benchmark the server-push subscriber registry with thousands of idle subscribers.
+
+Usage: python benchmarks/bench_events.py [--subscribers 5000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HELPERAI_STORE", os.path.join(tempfile.mkdtemp(), "bench_store.sqlite3"))
+
+from app.events import EventHub  # noqa: E402
+
+
+async def run(subscribers: int, publishes: int) -> None:
+	hub = EventHub()
+	tracemalloc.start()
+	base, _ = tracemalloc.get_traced_memory()
+	start = time.perf_counter()
+	queues = [(f"s{i}", hub.subscribe(f"s{i}")) for i in range(subscribers)]
+	subscribe_s = time.perf_counter() - start
+	used, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	print(f"subscribe {subscribers}: {subscribe_s * 1000:.1f} ms, "
+		  f"~{(used - base) / subscribers:.0f} B per subscriber")
+
+	start = time.perf_counter()
+	for i in range(publishes):
+		hub.publish(f"s{i % subscribers}", "result", {"i": i})
+	per_publish = (time.perf_counter() - start) / publishes
+	print(f"targeted publish: {per_publish * 1e6:.1f} us each (includes shared-store append)")
+
+	start = time.perf_counter()
+	delivered = hub.publish(None, "status", {"config": {}})
+	print(f"broadcast to {delivered}: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+	start = time.perf_counter()
+	for session, queue in queues:
+		hub.unsubscribe(session, queue)
+	print(f"unsubscribe all: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--subscribers", type=int, default=5000)
+	parser.add_argument("--publishes", type=int, default=2000)
+	args = parser.parse_args()
+	asyncio.run(run(args.subscribers, args.publishes))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,100 @@
+"""Compare OCR engines: load time, resident memory and per-image latency.
+
+Each engine runs in a fresh process so load time and RSS are not shared.
+Usage: python benchmarks/bench_ocr.py [--engines paddle,onnx] [--images DIR] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def synthetic_images(count: int):
+	"""MCQ-like screenshots, for when no folder of real ones is given"""
+	from PIL import Image, ImageDraw
+	images = []
+	for n in range(count):
+		image = Image.new("RGB", (1000, 420), "white")
+		draw = ImageDraw.Draw(image)
+		draw.text((30, 30), f"Question {n + 1}: What is the output of the following program?", fill="black")
+		for i, letter in enumerate("ABCD"):
+			draw.text((50, 110 + i * 60), f"{letter}) option number {i + 1} for question {n + 1}", fill="black")
+		images.append(image)
+	return images
+
+
+def load_images(folder: str):
+	from PIL import Image
+	names = sorted(n for n in os.listdir(folder) if n.lower().endswith((".png", ".jpg", ".jpeg", ".webp")))
+	return [Image.open(os.path.join(folder, n)).convert("RGB") for n in names]
+
+
+def run_engine(args) -> None:
+	"""Child process: load one engine, OCR every image, print a JSON result"""
+	import psutil
+	from app.ocr_engines import create_engine
+	images = load_images(args.images) if args.images else synthetic_images(5)
+	proc = psutil.Process()
+	rss_before = proc.memory_info().rss
+	start = time.perf_counter()
+	engine = create_engine(args.child, args.model_dir, args.threads)
+	load_s = time.perf_counter() - start
+	start = time.perf_counter()
+	engine.recognize(images[0])  # first call pays for lazy initialization
+	first_s = time.perf_counter() - start
+	latencies = []
+	for _ in range(args.repeat):
+		for image in images:
+			start = time.perf_counter()
+			engine.recognize(image)
+			latencies.append(time.perf_counter() - start)
+	print(json.dumps({
+		"engine": args.child,
+		"load_s": load_s,
+		"first_s": first_s,
+		"rss_mb": proc.memory_info().rss / 2**20,
+		"rss_delta_mb": (proc.memory_info().rss - rss_before) / 2**20,
+		"median_ms": statistics.median(latencies) * 1000,
+		"p95_ms": sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000,
+	}))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--engines", default="paddle,onnx")
+	parser.add_argument("--images", help="Folder of screenshots (default: synthetic ones)")
+	parser.add_argument("--model-dir", default=os.path.join(ROOT, "models", "ocr"), help="ONNX det/rec models")
+	parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = runtime default)")
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--child", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		run_engine(args)
+		return
+
+	env = dict(os.environ)
+	env.setdefault("HELPERAI_STORE", os.path.join(tempfile.mkdtemp(), "bench_store.sqlite3"))
+	print(f"{'engine':8s} {'load s':>8s} {'1st ms':>8s} {'RSS MB':>8s} {'+RSS MB':>8s} {'p50 ms':>8s} {'p95 ms':>8s}")
+	for name in args.engines.split(","):
+		cmd = [sys.executable, os.path.abspath(__file__), "--child", name, "--model-dir", args.model_dir,
+			   "--threads", str(args.threads), "--repeat", str(args.repeat)]
+		if args.images:
+			cmd += ["--images", args.images]
+		proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+		if proc.returncode != 0:
+			print(f"{name:8s} failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+			continue
+		r = json.loads(proc.stdout.strip().splitlines()[-1])
+		print(f"{name:8s} {r['load_s']:8.2f} {r['first_s'] * 1000:8.0f} {r['rss_mb']:8.0f} {r['rss_delta_mb']:8.0f} "
+			  f"{r['median_ms']:8.0f} {r['p95_ms']:8.0f}")
+
+
+if __name__ == "__main__":
+	main()
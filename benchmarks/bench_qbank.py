@@ -0,0 +1,64 @@
+"""Benchmark question-bank lookups against a large synthetic bank.
+
+Usage: python benchmarks/bench_qbank.py [--entries 100000] [--lookups 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.qbank import QuestionBank  # noqa: E402
+
+WORDS = ("value output function loop array integer compute returns following program prime "
+		 "matrix derivative equation probability graph node sorted complexity worst case").split()
+
+
+def make_question(rng: random.Random) -> str:
+	return " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 25))) + f" {rng.randrange(10**6)}?"
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--entries", type=int, default=100000)
+	parser.add_argument("--lookups", type=int, default=2000)
+	args = parser.parse_args()
+
+	rng = random.Random(7)
+	bank = QuestionBank(os.path.join(tempfile.mkdtemp(), "bench_qbank.sqlite3"))
+	questions = []
+	start = time.perf_counter()
+	conn = bank._conn()
+	conn.execute("BEGIN")
+	for _ in range(args.entries):
+		q = make_question(rng)
+		opts = [str(rng.randrange(100)) for _ in range(4)]
+		questions.append((q, opts))
+		bank.add(q, opts, "B", "", verified=True, source="bench")
+	conn.execute("COMMIT")
+	print(f"inserted {args.entries}: {time.perf_counter() - start:.1f} s")
+
+	start = time.perf_counter()
+	reloaded = QuestionBank(bank.path)
+	print(f"reload index of {len(reloaded)}: {time.perf_counter() - start:.1f} s")
+
+	samples = rng.sample(questions, args.lookups)
+	for label, mutate in (
+		("exact", lambda q: q),
+		("near-duplicate", lambda q: q.replace(" the ", " a ").rstrip("?") + " please?"),
+		("miss", lambda q: make_question(rng)),
+	):
+		hits = 0
+		start = time.perf_counter()
+		for q, opts in samples:
+			if reloaded.lookup(mutate(q), list(reversed(opts)), 0.6) is not None:
+				hits += 1
+		per_lookup = (time.perf_counter() - start) / len(samples)
+		print(f"{label:15s} lookup: {per_lookup * 1e6:7.1f} us, hit rate {hits / len(samples):.2f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,73 @@
+"""Startup profile of the API process: import time breakdown and time to first response.
+
+Usage: python benchmarks/bench_startup.py [--profile full|text] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(env: dict, top: int) -> None:
+	"""Run `python -X importtime` on app.main and print the slowest modules"""
+	proc = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", "import app.main"],
+		cwd=ROOT, env=env, capture_output=True, text=True,
+	)
+	rows = []
+	for line in proc.stderr.splitlines():
+		if not line.startswith("import time:") or "cumulative" in line:
+			continue
+		_self_us, cumulative_us, name = line[len("import time:"):].split("|")
+		# Nesting is shown by extra indentation after the single separator space
+		rows.append((int(cumulative_us), name[1:]))
+	total = sum(us for us, name in rows if not name.startswith(" "))
+	print(f"import app.main: {total / 1000:.1f} ms total (top-level cumulative)")
+	for us, name in sorted(rows, reverse=True)[:top]:
+		print(f"  {us / 1000:8.1f} ms  {name.strip()}")
+	heavy = [name.strip() for _, name in rows if name.strip().split(".")[0] in ("paddleocr", "paddle", "cv2", "numpy")]
+	print(f"heavy OCR modules imported at startup: {len(heavy)}")
+
+
+def first_response(env: dict, port: int) -> None:
+	"""Start uvicorn and time until GET /config answers"""
+	start = time.perf_counter()
+	proc = subprocess.Popen(
+		[sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+		cwd=ROOT, env=env,
+	)
+	try:
+		while True:
+			try:
+				with urllib.request.urlopen(f"http://127.0.0.1:{port}/config", timeout=1) as resp:
+					resp.read()
+				break
+			except OSError:
+				if proc.poll() is not None:
+					raise SystemExit("uvicorn exited before answering")
+				time.sleep(0.02)
+		print(f"time to first response: {(time.perf_counter() - start) * 1000:.0f} ms")
+	finally:
+		proc.terminate()
+		proc.wait()
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--profile", choices=["full", "text"], default="full")
+	parser.add_argument("--top", type=int, default=15)
+	parser.add_argument("--port", type=int, default=8799)
+	args = parser.parse_args()
+	env = dict(os.environ, HELPERAI_PROFILE=args.profile)
+	env.setdefault("HELPERAI_STORE", os.path.join(tempfile.mkdtemp(), "bench_store.sqlite3"))
+	import_profile(env, args.top)
+	first_response(env, args.port)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,96 @@
+"""OCR throughput at 1/4/16 concurrent image requests, with and without the thread budget.
+
+Each run is a fresh process, since thread pools are sized when the libraries load.
+Usage: python benchmarks/bench_threads.py [--concurrency 1,4,16] [--images 48] [--preprocess-only] [--pin]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_upload(n: int) -> io.BytesIO:
+	"""A distinct MCQ-like screenshot as an uploaded PNG, so the OCR cache never hits"""
+	from PIL import Image, ImageDraw
+	image = Image.new("RGB", (1400, 900), (235, 235, 235))
+	draw = ImageDraw.Draw(image)
+	draw.text((40, 40), f"Question {n}: which of the following statements is true?", fill="black")
+	for i, letter in enumerate("ABCD"):
+		draw.text((60, 160 + i * 90), f"{letter}) statement {i} of question {n}", fill="black")
+	draw.text((500, 450), "WATERMARK", fill=(200, 200, 200))
+	buf = io.BytesIO()
+	image.save(buf, format="PNG")
+	buf.seek(0)
+	return buf
+
+
+async def run_child(args) -> None:
+	from app.config import update_config
+	update_config({"ocr_workers": args.child, "ocr_cache_ttl": 0, "thread_budget": args.budget,
+				   "pin_ocr_cores": args.pin})
+	from app import pipeline
+	from app.ocr import decode_image_file, remove_watermark_image
+	from app.threads import current_budget
+
+	if args.preprocess_only:
+		# Watermark removal only (OpenCV + NumPy), for machines without an OCR engine
+		def work(upload, _digest, _wm):
+			return remove_watermark_image(decode_image_file(upload, 2048))
+		pipeline.ocr_image = work
+	uploads = [make_upload(n) for n in range(args.images)]
+	slots = asyncio.Semaphore(args.child)
+
+	async def one(n: int) -> None:
+		async with slots:
+			await pipeline.ocr_image_async(uploads[n], f"bench-{n}", True)
+
+	await one(0)  # load the engine outside the timed part
+	start = time.perf_counter()
+	await asyncio.gather(*(one(n) for n in range(1, args.images)))
+	elapsed = time.perf_counter() - start
+	print(json.dumps({"images_per_s": (args.images - 1) / elapsed, "budget": current_budget()}))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--concurrency", default="1,4,16")
+	parser.add_argument("--images", type=int, default=48)
+	parser.add_argument("--preprocess-only", action="store_true", help="Skip the OCR engine")
+	parser.add_argument("--pin", action="store_true", help="Also pin OCR threads to cores")
+	parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+	parser.add_argument("--budget", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		asyncio.run(run_child(args))
+		return
+
+	print(f"{'concurrent':>10s} {'unbounded img/s':>16s} {'budgeted img/s':>15s}  threads/OCR call")
+	for concurrency in [int(c) for c in args.concurrency.split(",")]:
+		row = []
+		for budget in (False, True):
+			# A fresh store per run, so the config of one run does not leak into the next
+			env = dict(os.environ, HELPERAI_STORE=os.path.join(tempfile.mkdtemp(), "bench_store.sqlite3"))
+			for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+				env.pop(var, None)
+			cmd = [sys.executable, os.path.abspath(__file__), "--child", str(concurrency), "--images", str(args.images)]
+			cmd += ["--budget"] if budget else []
+			cmd += ["--preprocess-only"] if args.preprocess_only else []
+			cmd += ["--pin"] if args.pin else []
+			proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+			if proc.returncode != 0:
+				raise SystemExit(proc.stderr)
+			row.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+		print(f"{concurrency:10d} {row[0]['images_per_s']:16.1f} {row[1]['images_per_s']:15.1f}  "
+			  f"{row[1]['budget']['threads_per_ocr']}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,29 @@
+"""OCR cleanup keeps symbol-only option values and drops borders.
+
+Run with: python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.budget import clean_boxes  # noqa: E402
+from app.ocr_engines import TextBox  # noqa: E402
+from app.segment import split_questions  # noqa: E402
+
+
+def _boxes(texts):
+	"""One full-confidence box per line, top to bottom"""
+	return [TextBox(text, 0, i * 20, 50, i * 20 + 15, 0.99) for i, text in enumerate(texts)]
+
+
+def test_symbol_only_options_survive_cleanup():
+	boxes = clean_boxes(_boxes(["Q?", "A.", "&&", "B.", "||", "C.", "!", "D.", "&"]), 0.5)
+	[segment] = split_questions(boxes, 5)
+	assert segment.question == "Q?"
+	assert segment.options == ["&&", "||", "!", "&"]
+
+
+def test_borders_are_dropped():
+	boxes = clean_boxes(_boxes(["┌──────┐", "Which is larger?", "──────", "A. 2", "B. 3", "| | | |", "........"]), 0.5)
+	assert [box.text for box in boxes] == ["Which is larger?", "A. 2", "B. 3"]
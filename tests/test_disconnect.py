@@ -0,0 +1,65 @@
+"""A client disconnect cancels the in-flight generation and frees its slot.
+
+Run with: python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.mkdtemp()
+os.environ["HELPERAI_STORE"] = os.path.join(_tmp, "store.sqlite3")
+os.environ["HELPERAI_RESULT_LOG"] = os.path.join(_tmp, "results.jsonl")
+
+from starlette.requests import Request  # noqa: E402
+
+from app import main, metrics, models  # noqa: E402
+from app.config import update_config  # noqa: E402
+from app.pipeline import solve_text  # noqa: E402
+from app.resilience import Deadline  # noqa: E402
+
+
+async def _hanging_backend():
+	"""A model backend that accepts the request and never answers; returns (server, url, connections)"""
+	connections = []
+
+	async def handle(reader, writer):
+		connections.append(writer)
+		await reader.read()  # returns once the client closes the connection
+		writer.close()
+
+	server = await asyncio.start_server(handle, "127.0.0.1", 0)
+	host, port = server.sockets[0].getsockname()[:2]
+	return server, f"http://{host}:{port}", connections
+
+
+def _request(receive) -> Request:
+	scope = {"type": "http", "method": "POST", "path": "/api/answer_text", "headers": [], "client": ("127.0.0.1", 1234)}
+	return Request(scope, receive)
+
+
+def test_disconnect_cancels_generation_and_frees_slot(monkeypatch):
+	update_config({"answer_cache_ttl": 0, "qbank_enabled": False, "result_log": False})
+	models.set_generation_concurrency(1)
+	slots = models._generation_slots
+
+	async def scenario():
+		server, url, connections = await _hanging_backend()
+		monkeypatch.setattr(models, "OLLAMA_URL", url)
+		messages: asyncio.Queue = asyncio.Queue()
+		cancelled_before = metrics.snapshot().get("generations_cancelled", 0)
+		async with server:
+			handler = asyncio.ensure_future(main._until_disconnect(
+				_request(messages.get), "text", solve_text("Which is even?", ["1", "2"], Deadline(30))))
+			while not connections:  # the generation is waiting on the backend
+				await asyncio.sleep(0.01)
+			assert slots._in_use == 1
+			await messages.put({"type": "http.disconnect"})
+			response = await asyncio.wait_for(handler, 5)
+		return response, metrics.snapshot().get("generations_cancelled", 0) - cancelled_before
+
+	response, cancelled = asyncio.run(scenario())
+	assert response.status_code == 499
+	assert slots._in_use == 0
+	assert cancelled == 1